@@ -0,0 +1,39 @@
+#!/bin/bash
+#
+# Times window exercises over bike_rides and bike_rides_bucketed.
+#
+# Each script runs unchanged and then with only the table name replaced,
+# so both runs compute the same query. The bucket files are sorted by
+# (start_station, start_time): the default scripts order their windows
+# by start_time; scripts ordering by another column (ex_10 orders by
+# duration) only get the clustering by station, not the sort.
+#
+# Usage: ./bench_bucketed.sh [repeat] [ex_script ...]
+#   ./bench_bucketed.sh 3 ex_05_row_num.sh ex_06_top_by_grp.sh
+
+REPEAT=${1:-3}
+shift
+SCRIPTS=${@:-ex_05_row_num.sh ex_06_top_by_grp.sh}
+cd "$(dirname "$0")"
+
+run_timed() {
+  local start=$(date +%s.%N)
+  bash -c "$1" > /dev/null 2>&1
+  local code=$?
+  local end=$(date +%s.%N)
+  if [ $code -ne 0 ]; then
+    echo "FAILED"
+  else
+    awk "BEGIN { printf \"%.2f\", $end - $start }"
+  fi
+}
+
+printf "%-32s %-20s %s\n" "script" "table" "seconds"
+for script in $SCRIPTS; do
+  original=$(cat "$script")
+  bucketed=$(sed -e 's/\bbike_rides\b/bike_rides_bucketed/g' "$script")
+  for run in $(seq "$REPEAT"); do
+    printf "%-32s %-20s %s\n" "$script" "bike_rides" "$(run_timed "$original")"
+    printf "%-32s %-20s %s\n" "$script" "bike_rides_bucketed" "$(run_timed "$bucketed")"
+  done
+done
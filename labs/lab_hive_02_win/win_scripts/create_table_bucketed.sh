@@ -0,0 +1,49 @@
+#!/bin/bash
+#
+# Builds bike_rides_bucketed from the external bike_rides table.
+#
+# Rows are hashed into buckets by start_station and every bucket file is
+# sorted by (start_station, start_time), the layout of the
+# PARTITION BY start_station ORDER BY start_time windows of the lab.
+# Hive 2.0 and later always honour the bucketing and sorting on insert
+# (the hive.enforce.bucketing/sorting settings were removed).
+#
+# Usage: ./create_table_bucketed.sh [number_of_buckets]
+
+BUCKETS=${1:-16}
+
+hive <<EOF
+
+DROP TABLE IF EXISTS bike_rides_bucketed;
+
+CREATE TABLE bike_rides_bucketed (
+  duration INT,
+  start_time STRING,
+  end_time STRING,
+  start_station_number INT,
+  start_station STRING,
+  end_station_number INT,
+  end_station STRING,
+  bike_number STRING,
+  member_type STRING
+)
+CLUSTERED BY (start_station)
+SORTED BY (start_station, start_time) INTO ${BUCKETS} BUCKETS
+STORED AS ORC
+;
+
+INSERT OVERWRITE TABLE bike_rides_bucketed
+SELECT
+  CAST(duration AS INT),
+  start_time,
+  end_time,
+  CAST(start_station_number AS INT),
+  start_station,
+  CAST(end_station_number AS INT),
+  end_station,
+  bike_number,
+  member_type
+FROM bike_rides
+;
+
+EOF
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+"""
+ETL Bench - Micro-benchmarks for the ETL library hot paths.
+Version : {version}
+
+Description:
+    Times the python side of the ETL libraries (template rendering,
+    query submission, command line parsing) and complete ETLNasaJob
+    runs against the fake hive/hdfs executables found in fake_bin.
+
+    It has 2 commands:
+        run             -> Runs the benchmarks and saves a json baseline.
+        compare         -> Compares two baselines and fails on regression.
+
+
+Usage:
+  bench_etl.py run [--output=OUT] [--repeat=N]
+  bench_etl.py compare --baseline=BASE --current=CUR [--threshold=TH]
+
+
+Options:
+  -h --help                Shows this help.
+  --output=OUT             Json file to save the results [default: baselines/current.json].
+  --repeat=N               Number of timing rounds per benchmark [default: 5].
+  --baseline=BASE          Json file with the reference results.
+  --current=CUR            Json file with the new results.
+  --threshold=TH           Allowed slow down ratio before failing [default: 0.20].
+
+Examples:
+
+  python bench/bench_etl.py run --output=baselines/master.json
+
+  python bench/bench_etl.py compare --baseline=baselines/master.json
+                                    --current=baselines/current.json
+
+"""
+from __future__ import print_function
+
+import io
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.abspath(os.path.dirname(os.path.abspath(__file__)))
+ETL_DIR = os.path.dirname(BENCH_DIR)
+for lib_path in (os.path.join(ETL_DIR, 'libs'), ETL_DIR):
+    if lib_path not in sys.path:
+        sys.path.insert(0, lib_path)
+
+# pylint: disable=wrong-import-position
+from libs.cli_utils import EXIT_CODE_FAILURE, EXIT_CODE_SUCCESS
+from libs.cli_utils import write_info, write_error, write_plain
+from libs.cli_utils import docopt_parse, adjust_indent_data
+from libs.cli_utils import load_json_configuration
+from libs.hive_utils import Template, resolve_template, submit_hive_query
+from libs.reader_utils import iter_lines, iter_range_lines
+import job_nasa
+
+PROG_VERSION = '1.0.0'
+FAKE_BIN_DIR = os.path.join(BENCH_DIR, 'fake_bin')
+JOB_ARGS = ['job_nasa.py', '{command}', '--cfg_file={cfg_file}',
+            '--dt_date=0702']
+BENCH_LOG_LINE = ('199.72.81.55 - - [02/Jul/1995:00:00:{0:02d} -0400] '
+                  '"GET /history/apollo/{0}.html HTTP/1.0" 200 6245\n')
+BENCH_LOG_LINES = 2000
+# Absolute config path written by prepare_job_environment.
+JOB_CONFIG = []
+
+
+class QuietOutput(object):
+    """Context manager that silences stderr while timing."""
+
+    def __init__(self):
+        self.saved = None
+        self.devnull = None
+
+    def __enter__(self):
+        self.saved = sys.stderr
+        self.devnull = open(os.devnull, 'w')
+        sys.stderr = self.devnull
+        return self
+
+    def __exit__(self, *args):
+        sys.stderr = self.saved
+        self.devnull.close()
+
+
+class FakeArgv(object):
+    """Context manager replacing sys.argv for docopt based code."""
+
+    def __init__(self, argv):
+        self.argv = argv
+        self.saved = None
+
+    def __enter__(self):
+        self.saved = sys.argv
+        sys.argv = self.argv
+        return self
+
+    def __exit__(self, *args):
+        sys.argv = self.saved
+
+
+def bench_path(file_name):
+    """Resolves relative result files against the bench directory."""
+    if os.path.isabs(file_name):
+        return file_name
+    return os.path.join(BENCH_DIR, file_name)
+
+
+def time_callable(func, number, repeat):
+    """
+    Times func returning the per call durations in micro seconds.
+    :param func: callable without arguments.
+    :param number: calls per round.
+    :param repeat: number of rounds.
+    """
+    rounds = []
+    for _ in range(repeat):
+        start = time.time()
+        for _ in range(number):
+            func()
+        rounds.append((time.time() - start) * 1e6 / number)
+    rounds.sort()
+    return {
+        'calls': number * repeat,
+        'min_us': round(rounds[0], 3),
+        'median_us': round(rounds[len(rounds) // 2], 3),
+        'max_us': round(rounds[-1], 3),
+    }
+
+
+def prepare_job_environment(dates=('0702',), log_lines=BENCH_LOG_LINES):
+    """Writes small nasa logs and a config keeping all local state with them.
+
+    Parameters
+    ----------
+    dates: the MMDD dates of the generated nasa_<date> files.
+    log_lines: lines per generated file.
+    Returns the absolute path of the benchmark configuration file.
+    """
+    work_dir = tempfile.mkdtemp(prefix='bench_etl_')
+    for dt_date in dates:
+        with open(os.path.join(work_dir, 'nasa_' + dt_date), 'w') as handle:
+            for idx in range(log_lines):
+                handle.write(BENCH_LOG_LINE.format(idx % 60))
+    config = load_json_configuration(
+        os.path.join(ETL_DIR, job_nasa.CFG_DIR, 'config.json'))
+    config['local_locations'] = {'nasa_logs': work_dir}
+    # Every local dir, state file and database of the job moves into the
+    # work dir so a benchmark never touches the state of real runs.
+    for name, section in config.items():
+        if isinstance(section, dict):
+            for key, value in section.items():
+                if key in ('local_dir', 'dir'):
+                    section[key] = os.path.join(work_dir, name)
+                elif key.endswith('_file') and value:
+                    section[key] = os.path.join(
+                        work_dir, name, os.path.basename(value))
+    cfg_file = os.path.join(work_dir, 'config.json')
+    with open(cfg_file, 'w') as handle:
+        json.dump(config, handle)
+    return cfg_file
+
+
+def job_argv(command):
+    """Returns the argv used to run the nasa job."""
+    return [arg.format(command=command, cfg_file=JOB_CONFIG[0])
+            for arg in JOB_ARGS]
+
+
+def run_job(command):
+    """Runs a full ETLNasaJob with the given command."""
+    with FakeArgv(job_argv(command)):
+        code = job_nasa.ETLNasaJob().execute()
+    if code != EXIT_CODE_SUCCESS:
+        raise RuntimeError('ETLNasaJob {0} failed'.format(command))
+
+
+def build_benchmarks():
+    """Returns the list of (name, callable, calls per round)."""
+    query_tpl = """
+          SET mapred.job.name={job_name};
+
+          INSERT OVERWRITE TABLE nasa_daily
+          PARTITION(dt_date = "{dt_date}")
+            SELECT host, request_time, page_url, error_code, page_size
+            FROM nasa_raw_etl
+            ;
+    """
+    ctx = {'job_name': 'Insert data into nasa_daily',
+           'dt_date': '1995-07-02'}
+    template = Template(query_tpl)
+    query = template.render(ctx)
+    indented = ['    line {0}'.format(idx) for idx in range(200)]
+    job_doc = job_nasa.__doc__
+
+    def parse_args():
+        """Parses the job command line."""
+        with FakeArgv(job_argv('dry_run')):
+            docopt_parse(job_doc, job_nasa.PROG_VERSION)
+
+    log_file = os.path.join(os.path.dirname(JOB_CONFIG[0]), 'nasa_0702')
+
+    def read_range_lines():
+        """Reads the log through the parallel reader range function."""
+        for _ in iter_range_lines(log_file, 0, os.path.getsize(log_file)):
+            pass
+
+    def read_iter_lines():
+        """Reads the log through iter_lines (sequential ingest path)."""
+        for _ in iter_lines(log_file):
+            pass
+
+    def read_text_lines():
+        """Reads the log with buffered text iteration (reference)."""
+        with io.open(log_file, encoding='utf-8', errors='replace') as handle:
+            for _ in handle:
+                pass
+
+    return [
+        ('template_render', lambda: template.render(ctx), 2000),
+        ('resolve_template', lambda: resolve_template(query_tpl, ctx), 2000),
+        ('submit_hive_query_dry',
+         lambda: submit_hive_query(query, dry_run=True), 200),
+        ('submit_hive_query', lambda: submit_hive_query(query), 10),
+        ('docopt_parse', parse_args, 100),
+        ('adjust_indent_data', lambda: adjust_indent_data(indented), 1000),
+        ('read_range_lines', read_range_lines, 200),
+        ('read_text_lines', read_text_lines, 200),
+        ('read_iter_lines', read_iter_lines, 200),
+        ('etl_nasa_dry_run', lambda: run_job('dry_run'), 2),
+        ('etl_nasa_run', lambda: run_job('run'), 2),
+    ]
+
+
+def run_benchmarks(output_file, repeat):
+    """Runs all benchmarks and saves them as a json baseline."""
+    os.environ['PATH'] = FAKE_BIN_DIR + os.pathsep + os.environ['PATH']
+    JOB_CONFIG.append(prepare_job_environment())
+    results = dict()
+    for name, func, number in build_benchmarks():
+        with QuietOutput():
+            results[name] = time_callable(func, number, repeat)
+        write_info('{0:<24} {1:>12.1f} us/call'.format(
+            name, results[name]['median_us']))
+    shutil.rmtree(os.path.dirname(JOB_CONFIG.pop()))
+    baseline = {
+        'meta': {
+            'version': PROG_VERSION,
+            'python': platform.python_version(),
+            'host': platform.node(),
+            'created': time.strftime('%Y-%m-%d %H:%M:%S'),
+        },
+        'results': results,
+    }
+    output_file = bench_path(output_file)
+    output_dir = os.path.dirname(output_file)
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    with open(output_file, 'w') as handle:
+        json.dump(baseline, handle, indent=2, sort_keys=True)
+    write_info('Saved {0}'.format(output_file))
+    return EXIT_CODE_SUCCESS
+
+
+def compare_baselines(baseline_file, current_file, threshold):
+    """Fails when any benchmark is slower than baseline * (1 + threshold)."""
+    baseline = load_json_configuration(bench_path(baseline_file))['results']
+    current = load_json_configuration(bench_path(current_file))['results']
+    regressions = []
+    for name in sorted(baseline):
+        if name not in current:
+            write_plain('{0:<24} missing from current run\n'.format(name))
+            continue
+        ratio = current[name]['median_us'] / max(
+            baseline[name]['median_us'], 1e-9)
+        flag = ''
+        if ratio > 1.0 + threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        write_plain('{0:<24} {1:>12.1f} -> {2:>12.1f} us  x{3:.2f}{4}\n'.format(
+            name, baseline[name]['median_us'], current[name]['median_us'],
+            ratio, flag))
+    if regressions:
+        write_error('Regressions: {0}'.format(', '.join(regressions)))
+        return EXIT_CODE_FAILURE
+    write_info('No regressions above {0:.0%}'.format(threshold))
+    return EXIT_CODE_SUCCESS
+
+
+def main():
+    """Parses the command line and dispatches the command."""
+    _, arguments = docopt_parse(__doc__, PROG_VERSION)
+    if arguments['run']:
+        return run_benchmarks(arguments['--output'],
+                              int(arguments['--repeat']))
+    if arguments['compare']:
+        return compare_baselines(arguments['--baseline'],
+                                 arguments['--current'],
+                                 float(arguments['--threshold']))
+    return EXIT_CODE_FAILURE
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,245 @@
+#!/usr/bin/env python
+"""
+ETL Load Test - End-to-end ETLNasaJob runs on the emulated mini-cluster.
+Version : {version}
+
+Description:
+    Runs 'job_nasa.py run' for several dates at once with the hive and
+    hdfs executables of bench/minicluster first on the PATH. The
+    mini-cluster keeps its hdfs files and metastore in a temporary
+    directory and can inject latency and failures into every command.
+
+    Each run is reported with its wall time, the time spent inside the
+    cluster commands (real work plus injected latency) and the remaining
+    orchestration overhead of the job itself.
+
+
+Usage:
+  load_test.py [--runs=N] [--concurrency=C] [--lines=L] [--latency=LAT]
+               [--fail_rate=R] [--seed=S] [--queue] [--output=OUT] [--keep]
+
+
+Options:
+  -h --help                Shows this help.
+  --runs=N                 Number of job runs (one date each) [default: 8].
+  --concurrency=C          Runs started at the same time [default: 4].
+  --lines=L                Log lines per generated input file [default: 2000].
+  --latency=LAT            Injected seconds per command, "0.5" or "0.2:1.5" [default: 0].
+  --fail_rate=R            Probability that a cluster command fails [default: 0].
+  --seed=S                 Seed of the injected latency and failures.
+  --queue                  Enable the job run queue.
+  --output=OUT             Json file to save the results.
+  --keep                   Keep the temporary cluster directory.
+
+Examples:
+
+  python bench/load_test.py --runs=16 --concurrency=8 --latency=0.5:2
+
+  python bench/load_test.py --runs=20 --fail_rate=0.02 --seed=7 --output=baselines/load.json
+
+"""
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from datetime import date, timedelta
+
+BENCH_DIR = os.path.abspath(os.path.dirname(os.path.abspath(__file__)))
+ETL_DIR = os.path.dirname(BENCH_DIR)
+for lib_path in (os.path.join(ETL_DIR, 'libs'), ETL_DIR, BENCH_DIR):
+    if lib_path not in sys.path:
+        sys.path.insert(0, lib_path)
+
+# pylint: disable=wrong-import-position
+from libs.cli_utils import EXIT_CODE_FAILURE, EXIT_CODE_SUCCESS
+from libs.cli_utils import write_info, write_error, write_plain
+from libs.cli_utils import docopt_parse, load_json_configuration
+from libs.history_utils import percentile
+from bench_etl import prepare_job_environment, bench_path
+
+PROG_VERSION = '1.0.0'
+CLUSTER_BIN_DIR = os.path.join(BENCH_DIR, 'minicluster', 'bin')
+FIRST_DATE = date(1995, 7, 1)
+
+
+def run_dates(runs):
+    """Returns the MMDD dates of the runs starting on 1995-07-01."""
+    return [(FIRST_DATE + timedelta(days=idx)).strftime('%m%d')
+            for idx in range(runs)]
+
+
+def cluster_environment(work_dir, arguments):
+    """Returns the environment of the job processes."""
+    env = dict(os.environ)
+    env['PATH'] = CLUSTER_BIN_DIR + os.pathsep + env['PATH']
+    env['PYTHONPATH'] = os.pathsep.join(
+        [os.path.join(ETL_DIR, 'libs'), ETL_DIR] +
+        [x for x in [env.get('PYTHONPATH')] if x])
+    env['MINICLUSTER_ROOT'] = os.path.join(work_dir, 'minicluster')
+    env['MINICLUSTER_LATENCY'] = arguments['--latency']
+    env['MINICLUSTER_FAIL_RATE'] = arguments['--fail_rate']
+    if arguments['--seed']:
+        env['MINICLUSTER_SEED'] = arguments['--seed']
+    return env
+
+
+def prepare_cluster(cfg_file, env, use_queue):
+    """Adjusts the job config and creates the tables and hdfs dirs."""
+    config = load_json_configuration(cfg_file)
+    config.setdefault('run_queue', {})['enabled'] = bool(use_queue)
+    config.setdefault('webhdfs', {})['enabled'] = False
+    with open(cfg_file, 'w') as handle:
+        json.dump(config, handle)
+    # The warm up commands must not draw injected failures.
+    setup_env = dict(env, MINICLUSTER_LATENCY='0', MINICLUSTER_FAIL_RATE='0',
+                     MINICLUSTER_TAG='setup')
+    for command in (['bash', os.path.join(ETL_DIR, 'reset_data.sh')],
+                    ['hdfs', 'dfs', '-mkdir', '-p',
+                     config['hdfs_locations']['temp_load']]):
+        with open(os.devnull, 'w') as devnull:
+            code = subprocess.call(command, env=setup_env, cwd=ETL_DIR,
+                                   stdout=devnull, stderr=devnull)
+        if code != EXIT_CODE_SUCCESS:
+            write_error('Cluster setup failed: {0}'.format(' '.join(command)))
+            return code
+    return EXIT_CODE_SUCCESS
+
+
+def start_run(dt_date, cfg_file, env, log_dir):
+    """Starts one job process and returns its run dictionary."""
+    log_file = open(os.path.join(log_dir, 'run_{0}.log'.format(dt_date)), 'w')
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ETL_DIR, 'job_nasa.py'), 'run',
+         '--cfg_file=' + cfg_file, '--dt_date=' + dt_date],
+        env=dict(env, MINICLUSTER_TAG=dt_date), cwd=ETL_DIR,
+        stdout=log_file, stderr=subprocess.STDOUT)
+    return {'dt_date': dt_date, 'process': process, 'log': log_file,
+            'start': time.time()}
+
+
+def run_all(dates, concurrency, cfg_file, env, log_dir):
+    """Runs the jobs keeping at most concurrency of them alive."""
+    pending, running, finished = list(dates), [], []
+    while pending or running:
+        while pending and len(running) < concurrency:
+            running.append(start_run(pending.pop(0), cfg_file, env, log_dir))
+        time.sleep(0.05)
+        for run in list(running):
+            code = run['process'].poll()
+            if code is None:
+                continue
+            run['log'].close()
+            finished.append({'dt_date': run['dt_date'], 'exit_code': code,
+                             'wall': time.time() - run['start']})
+            running.remove(run)
+    return sorted(finished, key=lambda x: x['dt_date'])
+
+
+def read_command_log(cluster_dir):
+    """Returns {tag: [(tool, duration, latency, exit code)]}."""
+    commands = dict()
+    log_file = os.path.join(cluster_dir, 'commands.log')
+    if not os.path.exists(log_file):
+        return commands
+    with open(log_file) as handle:
+        for line in handle:
+            tag, tool, _, duration, latency, code = line.rstrip('\n').split(
+                '\t')
+            commands.setdefault(tag, []).append(
+                (tool, float(duration), float(latency), int(code)))
+    return commands
+
+
+def summarize(runs, commands):
+    """Adds the cluster time and the orchestration overhead to the runs."""
+    for run in runs:
+        entries = commands.get(run['dt_date'], [])
+        run['commands'] = len(entries)
+        run['failed_commands'] = len([x for x in entries if x[3]])
+        run['cluster'] = sum(x[1] for x in entries)
+        run['injected'] = sum(x[2] for x in entries)
+        run['overhead'] = run['wall'] - run['cluster']
+    return runs
+
+
+def report(runs, elapsed):
+    """Prints the per run table and the totals."""
+    write_plain('{0:<6} {1:>5} {2:>9} {3:>9} {4:>9} {5:>9} {6:>5}\n'.format(
+        'date', 'exit', 'wall', 'cluster', 'injected', 'overhead', 'cmds'))
+    for run in runs:
+        write_plain('{0:<6} {1:>5} {2:>8.2f}s {3:>8.2f}s {4:>8.2f}s '
+                    '{5:>8.2f}s {6:>5}\n'.format(
+                        run['dt_date'], run['exit_code'], run['wall'],
+                        run['cluster'], run['injected'], run['overhead'],
+                        run['commands']))
+    walls = sorted(x['wall'] for x in runs)
+    overheads = sorted(x['overhead'] for x in runs)
+    failed = [x for x in runs if x['exit_code'] != EXIT_CODE_SUCCESS]
+    summary = {
+        'runs': len(runs),
+        'failed_runs': len(failed),
+        'elapsed': elapsed,
+        'throughput_runs_per_min': 60.0 * len(runs) / max(elapsed, 1e-9),
+        'wall_p50': percentile(walls, 0.50),
+        'wall_p90': percentile(walls, 0.90),
+        'overhead_p50': percentile(overheads, 0.50),
+        'overhead_p90': percentile(overheads, 0.90),
+    }
+    write_plain('Runs: {0} ({1} failed) in {2:.2f}s, {3:.1f} runs/min\n'
+                .format(summary['runs'], summary['failed_runs'], elapsed,
+                        summary['throughput_runs_per_min']))
+    write_plain('Wall p50/p90: {0:.2f}s / {1:.2f}s  Overhead p50/p90: '
+                '{2:.2f}s / {3:.2f}s\n'.format(
+                    summary['wall_p50'], summary['wall_p90'],
+                    summary['overhead_p50'], summary['overhead_p90']))
+    return summary
+
+
+def main():
+    """Prepares the mini-cluster, runs the jobs and reports."""
+    _, arguments = docopt_parse(__doc__, PROG_VERSION)
+    dates = run_dates(int(arguments['--runs']))
+    cfg_file = prepare_job_environment(dates, int(arguments['--lines']))
+    work_dir = os.path.dirname(cfg_file)
+    env = cluster_environment(work_dir, arguments)
+    try:
+        code = prepare_cluster(cfg_file, env, arguments['--queue'])
+        if code != EXIT_CODE_SUCCESS:
+            return code
+        write_info('Running {0} jobs, {1} at a time (cluster {2})'.format(
+            len(dates), arguments['--concurrency'], env['MINICLUSTER_ROOT']))
+        start = time.time()
+        runs = run_all(dates, int(arguments['--concurrency']), cfg_file, env,
+                       work_dir)
+        elapsed = time.time() - start
+        runs = summarize(runs, read_command_log(env['MINICLUSTER_ROOT']))
+        summary = report(runs, elapsed)
+        if arguments['--output']:
+            output_file = bench_path(arguments['--output'])
+            output_dir = os.path.dirname(output_file)
+            if not os.path.exists(output_dir):
+                os.makedirs(output_dir)
+            with open(output_file, 'w') as handle:
+                json.dump({'arguments': dict(
+                    (x, y) for x, y in arguments.items() if x != '--help'),
+                           'summary': summary, 'runs': runs}, handle,
+                          indent=2, sort_keys=True)
+            write_info('Saved {0}'.format(output_file))
+    finally:
+        if arguments['--keep']:
+            write_info('Kept {0}'.format(work_dir))
+        else:
+            shutil.rmtree(work_dir)
+    if summary['failed_runs']:
+        write_error('{0} of {1} runs failed'.format(summary['failed_runs'],
+                                                    summary['runs']))
+        return EXIT_CODE_FAILURE
+    return EXIT_CODE_SUCCESS
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,1294 @@
+"""
+Hermetic mini-cluster used by the load tests.
+
+The 'hive' and 'hdfs' executables of this directory emulate the cluster
+on the local machine: hdfs paths live under $MINICLUSTER_ROOT/hdfs and
+the Hive metastore is a sqlite database. The HQL subset covers the
+statements of the ETL templates:
+
+  SET, USE, DROP TABLE, CREATE [EXTERNAL] TABLE (... | LIKE t),
+  SHOW PARTITIONS, SHOW TABLES, DESCRIBE FORMATTED,
+  INSERT OVERWRITE TABLE ... [PARTITION(..)] SELECT ... FROM t [WHERE ..]
+  [GROUP BY ..] with count, sum, min and max aggregates, column references, literals, regexp_extract, cast, split, upper,
+  lower, trim, substr, concat, coalesce, if(a = b, ..), unix_timestamp
+  and from_unixtime (UTC), RegexSerDe source tables ('input.regex'),
+  LOAD DATA [LOCAL] INPATH, ANALYZE TABLE ... COMPUTE STATISTICS [FOR
+  COLUMNS] and ALTER TABLE ... CONCATENATE / SET TBLPROPERTIES / RENAME TO.
+
+Other statements are skipped with a warning (MINICLUSTER_STRICT=1 makes
+them fail). Like the Hive CLI, every statement prints "Time taken" and
+INSERT prints the MapReduce stage counters on stderr.
+
+Environment:
+
+  MINICLUSTER_ROOT       State directory [default: /tmp/minicluster].
+  MINICLUSTER_LATENCY    Seconds added to every command, "0.5" or a
+                         uniform range "0.2:1.5" (JVM start emulation).
+  MINICLUSTER_FAIL_RATE  Probability (0-1) that a command fails.
+  MINICLUSTER_SEED       Seed of the latency and failure draws.
+  MINICLUSTER_STRICT     Fail on statements that are not emulated.
+  MINICLUSTER_TAG        Label of the commands in the log (the job run).
+
+Every command is appended to $MINICLUSTER_ROOT/commands.log as tag,
+tool, start, duration, injected latency and exit code (tab separated).
+"""
+from __future__ import print_function
+
+import glob
+import gzip
+import json
+import os
+import random
+import re
+import shutil
+import sqlite3
+import sys
+import time
+from calendar import timegm
+
+DEFAULT_ROOT = '/tmp/minicluster'
+WAREHOUSE = '/user/hive/warehouse'
+HIVE_NULL = '\\N'
+DEFAULT_DELIMITER = '\x01'
+TEXT_INPUT_FORMAT = 'org.apache.hadoop.mapred.TextInputFormat'
+INPUT_FORMATS = {
+    'TEXTFILE': TEXT_INPUT_FORMAT,
+    'ORC': 'org.apache.hadoop.hive.ql.io.orc.OrcInputFormat',
+    'RCFILE': 'org.apache.hadoop.hive.ql.io.RCFileInputFormat',
+    'SEQUENCEFILE': 'org.apache.hadoop.mapred.SequenceFileInputFormat',
+}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS tables (
+        name TEXT PRIMARY KEY,
+        columns TEXT,
+        partition_columns TEXT,
+        location TEXT,
+        external INTEGER,
+        delimiter TEXT,
+        input_format TEXT,
+        params TEXT,
+        input_regex TEXT);
+    CREATE TABLE IF NOT EXISTS partitions (
+        table_name TEXT,
+        spec TEXT,
+        location TEXT,
+        params TEXT,
+        PRIMARY KEY (table_name, spec));
+"""
+
+
+class HiveError(Exception):
+    """A statement failed like a Hive 'FAILED:' error."""
+    pass
+
+
+class InjectedFailure(Exception):
+    """Failure drawn from MINICLUSTER_FAIL_RATE."""
+    pass
+
+
+def cluster_root():
+    """Returns the state directory of the mini-cluster."""
+    return os.environ.get('MINICLUSTER_ROOT', DEFAULT_ROOT)
+
+
+def hdfs_local(path):
+    """Maps an hdfs path or URI to the local emulated filesystem."""
+    path = re.sub(r'^hdfs://[^/]*', '', path)
+    return os.path.join(cluster_root(), 'hdfs', path.lstrip('/'))
+
+
+def hdfs_path(local_path):
+    """Maps a local emulated path back to its hdfs path."""
+    base = os.path.join(cluster_root(), 'hdfs')
+    return '/' + os.path.relpath(local_path, base).replace(
+        os.sep, '/').lstrip('.')
+
+
+def expand_braces(pattern):
+    """Expands {a,b} alternatives like the hdfs globs."""
+    match = re.search(r'\{([^{}]*)\}', pattern)
+    if not match:
+        return [pattern]
+    results = []
+    for option in match.group(1).split(','):
+        results.extend(expand_braces(
+            pattern[:match.start()] + option + pattern[match.end():]))
+    return results
+
+
+def hdfs_glob(pattern):
+    """Returns the sorted local paths matching an hdfs glob."""
+    paths = []
+    for expanded in expand_braces(pattern):
+        paths.extend(glob.glob(hdfs_local(expanded)))
+    return sorted(set(paths))
+
+
+def parse_latency(value):
+    """Returns (low, high) seconds from '0.5' or '0.2:1.5'."""
+    if not value:
+        return 0.0, 0.0
+    parts = [float(x) for x in value.split(':', 1)]
+    return parts[0], parts[-1]
+
+
+def run_command(tool, func, args):
+    """Runs a tool command with latency/failure injection and logging."""
+    seed = os.environ.get('MINICLUSTER_SEED')
+    rng = random.Random(int(seed) + os.getpid() if seed else None)
+    low, high = parse_latency(os.environ.get('MINICLUSTER_LATENCY'))
+    latency = rng.uniform(low, high)
+    start = time.time()
+    time.sleep(latency)
+    try:
+        if rng.random() < float(os.environ.get('MINICLUSTER_FAIL_RATE') or 0):
+            raise InjectedFailure('injected failure')
+        code = func(args)
+    except InjectedFailure as error:
+        sys.stderr.write('FAILED: {0} ({1})\n'.format(error, tool))
+        code = 2
+    log_dir = cluster_root()
+    if not os.path.exists(log_dir):
+        os.makedirs(log_dir)
+    with open(os.path.join(log_dir, 'commands.log'), 'a') as handle:
+        handle.write('{0}\t{1}\t{2:.6f}\t{3:.6f}\t{4:.6f}\t{5}\n'.format(
+            os.environ.get('MINICLUSTER_TAG', '-'), tool, start,
+            time.time() - start, latency, code))
+    return code
+
+
+# ---- Metastore ----
+
+
+class Metastore(object):
+    """Tables and partitions kept in sqlite."""
+
+    def __init__(self):
+        root = cluster_root()
+        if not os.path.exists(root):
+            os.makedirs(root)
+        self.connection = sqlite3.connect(
+            os.path.join(root, 'metastore.db'), timeout=60)
+        self.connection.executescript(SCHEMA)
+
+    def get_table(self, name):
+        """Returns the table dictionary or None."""
+        row = self.connection.execute(
+            'SELECT name, columns, partition_columns, location, external, '
+            'delimiter, input_format, params, input_regex FROM tables '
+            'WHERE name = ?',
+            (name,)).fetchone()
+        if row is None:
+            return None
+        return {
+            'name': row[0],
+            'columns': json.loads(row[1]),
+            'partition_columns': json.loads(row[2]),
+            'location': row[3],
+            'external': bool(row[4]),
+            'delimiter': row[5],
+            'input_format': row[6],
+            'params': json.loads(row[7]),
+            'input_regex': row[8],
+        }
+
+    def table(self, name):
+        """Returns the table dictionary or raises HiveError."""
+        table = self.get_table(name)
+        if table is None:
+            raise HiveError('SemanticException [Error 10001]: Table not '
+                            'found {0}'.format(name))
+        return table
+
+    def save_table(self, table):
+        """Inserts or replaces a table."""
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO tables VALUES '
+                '(?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (table['name'], json.dumps(table['columns']),
+                 json.dumps(table['partition_columns']), table['location'],
+                 int(table['external']), table['delimiter'],
+                 table['input_format'], json.dumps(table['params']),
+                 table.get('input_regex')))
+
+    def drop_table(self, name):
+        """Removes a table and its partitions."""
+        with self.connection:
+            self.connection.execute('DELETE FROM tables WHERE name = ?',
+                                    (name,))
+            self.connection.execute(
+                'DELETE FROM partitions WHERE table_name = ?', (name,))
+
+    def table_names(self):
+        """Returns the sorted table names."""
+        return [x[0] for x in self.connection.execute(
+            'SELECT name FROM tables ORDER BY name')]
+
+    def partitions(self, name):
+        """Returns [(spec, location, params)] of a table."""
+        return [(x[0], x[1], json.loads(x[2])) for x in
+                self.connection.execute(
+                    'SELECT spec, location, params FROM partitions '
+                    'WHERE table_name = ? ORDER BY spec', (name,))]
+
+    def get_partition(self, name, spec):
+        """Returns (location, params) of a partition or None."""
+        row = self.connection.execute(
+            'SELECT location, params FROM partitions '
+            'WHERE table_name = ? AND spec = ?', (name, spec)).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def save_partition(self, name, spec, location, params):
+        """Inserts or replaces a partition."""
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO partitions VALUES (?, ?, ?, ?)',
+                (name, spec, location, json.dumps(params)))
+
+
+# ---- HQL parsing ----
+
+
+def strip_comments(text):
+    """Removes the '--' comment lines."""
+    return '\n'.join(x for x in text.split('\n')
+                     if not x.strip().startswith('--'))
+
+
+def split_top_level(text, separator):
+    """Splits on separator outside quotes and parentheses."""
+    parts, current, depth, quote = [], [], 0, None
+    idx = 0
+    while idx < len(text):
+        char = text[idx]
+        if quote:
+            current.append(char)
+            if char == '\\' and idx + 1 < len(text):
+                current.append(text[idx + 1])
+                idx += 1
+            elif char == quote:
+                quote = None
+        elif char in '\'"`':
+            quote = char
+            current.append(char)
+        elif char == '(':
+            depth += 1
+            current.append(char)
+        elif char == ')':
+            depth -= 1
+            current.append(char)
+        elif char == separator and depth == 0:
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+        idx += 1
+    parts.append(''.join(current))
+    return parts
+
+
+def split_statements(text):
+    """Returns the non empty statements of an HQL script."""
+    return [x.strip() for x in split_top_level(strip_comments(text), ';')
+            if x.strip()]
+
+
+def unquote_literal(literal):
+    """Returns the value of a Hive string literal ('..' or "..")."""
+    body = literal[1:-1]
+    escapes = {'n': '\n', 't': '\t', 'r': '\r', '0': '\0'}
+    result, idx = [], 0
+    while idx < len(body):
+        char = body[idx]
+        if char == '\\' and idx + 1 < len(body):
+            idx += 1
+            char = escapes.get(body[idx], body[idx])
+        result.append(char)
+        idx += 1
+    return ''.join(result)
+
+
+def matching_paren(text, start):
+    """Returns the index of the parenthesis closing text[start]."""
+    depth = 0
+    for idx in range(start, len(text)):
+        if text[idx] == '(':
+            depth += 1
+        elif text[idx] == ')':
+            depth -= 1
+            if depth == 0:
+                return idx
+    raise HiveError('ParseException: unbalanced parentheses')
+
+
+def parse_columns(text):
+    """Returns [[name, type]] of a column definition list."""
+    columns = []
+    for item in split_top_level(text, ','):
+        parts = item.strip().split(None, 2)
+        if len(parts) >= 2:
+            columns.append([parts[0].strip('`').lower(), parts[1].lower()])
+    return columns
+
+
+def parse_partition_spec(text):
+    """Returns [(key, value)] of 'k="v", k2=v2' (dynamic keys are None)."""
+    pairs = []
+    for item in split_top_level(text or '', ','):
+        if not item.strip():
+            continue
+        key, _, value = item.partition('=')
+        value = value.strip()
+        if value[:1] in '\'"' and value:
+            value = unquote_literal(value)
+        pairs.append((key.strip().lower(), value or None))
+    return pairs
+
+
+def spec_name(pairs):
+    """Returns the 'k=v/k2=v2' partition name."""
+    return '/'.join('{0}={1}'.format(key, value) for key, value in pairs)
+
+
+def table_name(name):
+    """Drops the default database prefix and backquotes."""
+    name = name.strip('`').lower()
+    if name.startswith('default.'):
+        name = name[len('default.'):]
+    return name
+
+
+# ---- Expressions ----
+
+
+FUNCTION_RE = re.compile(r'^(\w+)\s*\((.*)\)$', re.S)
+CAST_RE = re.compile(r'^(.*)\s+AS\s+(\w+)$', re.I | re.S)
+ALIAS_RE = re.compile(r'^(.*?)\s+(?:AS\s+)?`?(\w+)`?$', re.I | re.S)
+
+
+def java_regex(pattern):
+    """Adapts the few Java regex differences used in the labs."""
+    return pattern.replace('\\p{Alpha}', '[A-Za-z]')
+
+
+def regexp_extract(value, pattern, index=1):
+    """Hive regexp_extract: '' when the pattern does not match."""
+    if value is None:
+        return None
+    match = re.search(java_regex(pattern), value)
+    if not match:
+        return ''
+    return match.group(int(index)) or ''
+
+
+# Java SimpleDateFormat tokens of the lab date formats.
+DATE_TOKENS = [('yyyy', '%Y'), ('MMM', '%b'), ('MM', '%m'), ('dd', '%d'),
+               ('HH', '%H'), ('mm', '%M'), ('ss', '%S')]
+HIVE_TIMESTAMP = 'yyyy-MM-dd HH:mm:ss'
+
+
+def strftime_format(java_format):
+    """Converts a SimpleDateFormat pattern to a strptime one."""
+    for token, directive in DATE_TOKENS:
+        java_format = java_format.replace(token, directive)
+    return java_format
+
+
+def unix_timestamp(value, java_format=HIVE_TIMESTAMP):
+    """Hive unix_timestamp(value, format): NULL when it does not parse."""
+    if value is None:
+        return None
+    try:
+        parsed = time.strptime(value, strftime_format(java_format))
+    except ValueError:
+        return None
+    return str(timegm(parsed))
+
+
+def from_unixtime(value, java_format=HIVE_TIMESTAMP):
+    """Hive from_unixtime(seconds [, format])."""
+    if value is None:
+        return None
+    return time.strftime(strftime_format(java_format),
+                         time.gmtime(int(value)))
+
+
+def to_type(value, hive_type):
+    """Hive cast of a string value (NULL when invalid)."""
+    if value is None:
+        return None
+    hive_type = hive_type.lower()
+    try:
+        if hive_type in ('int', 'bigint', 'smallint', 'tinyint'):
+            return str(int(float(value)))
+        if hive_type in ('double', 'float', 'decimal'):
+            return repr(float(value))
+    except ValueError:
+        return None
+    return value
+
+
+def compile_expression(text):
+    """Returns func(row) evaluating a select expression on a row dict."""
+    text = text.strip()
+    sides = split_top_level(text, '=')
+    if len(sides) == 2 and sides[0][-1:] not in '!<>':
+        left, right = [compile_expression(x) for x in sides]
+
+        def equals(row):
+            """Hive '=': NULL when a side is NULL."""
+            values = left(row), right(row)
+            return None if None in values else values[0] == values[1]
+        return equals
+    if text[:1] in '\'"' and text[-1:] == text[:1]:
+        literal = unquote_literal(text)
+        return lambda row: literal
+    if re.match(r'^-?\d+(\.\d+)?$', text):
+        return lambda row: text
+    if text.upper() == 'NULL':
+        return lambda row: None
+    match = FUNCTION_RE.match(text)
+    if match and matching_paren(text, text.index('(')) == len(text) - 1:
+        name = match.group(1).lower()
+        if name == 'cast':
+            cast = CAST_RE.match(match.group(2).strip())
+            if not cast:
+                raise HiveError('ParseException: bad cast {0}'.format(text))
+            inner = compile_expression(cast.group(1))
+            hive_type = cast.group(2)
+            return lambda row: to_type(inner(row), hive_type)
+        args = [compile_expression(x)
+                for x in split_top_level(match.group(2), ',')]
+        functions = {
+            'regexp_extract': lambda values: regexp_extract(*values),
+            'upper': lambda values: (values[0].upper()
+                                     if values[0] is not None else None),
+            'lower': lambda values: (values[0].lower()
+                                     if values[0] is not None else None),
+            'trim': lambda values: (values[0].strip()
+                                    if values[0] is not None else None),
+            'substr': lambda values: (
+                values[0][int(values[1]) - 1:
+                          int(values[1]) - 1 + int(values[2])]
+                if len(values) > 2 else values[0][int(values[1]) - 1:]),
+            'concat': lambda values: (None if None in values
+                                      else ''.join(values)),
+            'split': lambda values: (None if values[0] is None else
+                                     '\x02'.join(re.split(values[1],
+                                                          values[0]))),
+            'coalesce': lambda values: next(
+                (x for x in values if x is not None), None),
+            'if': lambda values: values[1] if values[0] else values[2],
+            'unix_timestamp': lambda values: unix_timestamp(*values),
+            'from_unixtime': lambda values: from_unixtime(*values),
+        }
+        functions['substring'] = functions['substr']
+        if name not in functions:
+            raise HiveError('SemanticException Invalid function {0}'.format(
+                name))
+        function = functions[name]
+        return lambda row: function([x(row) for x in args])
+    column = text.strip('`').lower()
+    if not re.match(r'^[\w.]+$', column):
+        raise HiveError('ParseException: cannot emulate {0}'.format(text))
+    column = column.split('.')[-1]
+
+    def column_value(row):
+        """Returns the column value of the row."""
+        if column not in row:
+            raise HiveError('SemanticException Invalid column reference '
+                            '{0}'.format(column))
+        return row[column]
+    return column_value
+
+
+def select_items(select_list):
+    """Returns the expressions of a select list (aliases are dropped)."""
+    items = []
+    for item in split_top_level(select_list, ','):
+        match = ALIAS_RE.match(item.strip())
+        items.append(match.group(1) if match else item)
+    return items
+
+
+def compile_select(select_list):
+    """Returns the [func(row)] of a select list (aliases are dropped)."""
+    return [compile_expression(x) for x in select_items(select_list)]
+
+
+AGGREGATES = ('count', 'sum', 'min', 'max')
+
+
+def aggregate_item(text):
+    """Returns (aggregate, func(row)) of 'count(*)' like items or None."""
+    text = text.strip()
+    match = FUNCTION_RE.match(text)
+    if (not match or match.group(1).lower() not in AGGREGATES or
+            matching_paren(text, text.index('(')) != len(text) - 1):
+        return None
+    argument = match.group(2).strip()
+    if argument == '*':
+        return match.group(1).lower(), lambda row: '1'
+    return match.group(1).lower(), compile_expression(argument)
+
+
+def number(value):
+    """Returns the int or float of a string value."""
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def group_rows(select_list, group_by, rows):
+    """Yields the output rows of an aggregate select."""
+    items = [aggregate_item(x) or (None, compile_expression(x))
+             for x in select_items(select_list)]
+    keys = [compile_expression(x)
+            for x in split_top_level(group_by or '', ',') if x.strip()]
+    groups = dict()
+    order = []
+    for row in rows:
+        key = tuple(x(row) for x in keys)
+        state = groups.get(key)
+        if state is None:
+            state = groups[key] = [0 if x[0] == 'count' else None
+                                   for x in items]
+            order.append(key)
+        for idx, (aggregate, func) in enumerate(items):
+            value = func(row)
+            if aggregate is None:
+                state[idx] = value
+            elif value is None:
+                continue
+            elif aggregate == 'count':
+                state[idx] += 1
+            elif aggregate == 'sum':
+                state[idx] = (state[idx] or 0) + number(value)
+            elif state[idx] is None:
+                state[idx] = value
+            elif aggregate == 'min':
+                state[idx] = min(state[idx], value, key=number)
+            else:
+                state[idx] = max(state[idx], value, key=number)
+    if not keys and not order:
+        # A global aggregate returns one row even without input rows.
+        order.append(())
+        groups[()] = [0 if x[0] == 'count' else None for x in items]
+    for key in order:
+        yield [None if x is None else str(x) for x in groups[key]]
+
+
+def compile_where(where):
+    """Returns func(row) for 'col = literal [AND ...]' conditions."""
+    if not where:
+        return lambda row: True
+    conditions = []
+    for condition in re.split(r'\s+AND\s+', where.strip(), flags=re.I):
+        left, _, right = condition.partition('=')
+        conditions.append((compile_expression(left),
+                           compile_expression(right)))
+    return lambda row: all(x(row) == y(row) for x, y in conditions)
+
+
+# ---- Table data ----
+
+
+def open_data_file(local_file):
+    """Opens a text or gzip data file."""
+    if local_file.endswith('.gz'):
+        return gzip.open(local_file, 'rt')
+    return open(local_file)
+
+
+def data_files(local_dir):
+    """Returns the data files of a directory (Hive skips '_' and '.')."""
+    if not os.path.isdir(local_dir):
+        return []
+    return [os.path.join(local_dir, x) for x in sorted(os.listdir(local_dir))
+            if not x.startswith(('_', '.')) and
+            os.path.isfile(os.path.join(local_dir, x))]
+
+
+def table_directories(metastore, table):
+    """Yields (partition pairs, local dir) of the table data."""
+    if not table['partition_columns']:
+        yield [], hdfs_local(table['location'])
+        return
+    for spec, location, _ in metastore.partitions(table['name']):
+        yield [tuple(x.split('=', 1)) for x in spec.split('/')], \
+            hdfs_local(location)
+
+
+def split_line(line, table, pattern):
+    """Returns the column values of a line (RegexSerDe or delimited)."""
+    if pattern is None:
+        return line.split(table['delimiter'])
+    match = pattern.match(line)
+    if not match:
+        return [None] * len(table['columns'])
+    return list(match.groups())
+
+
+def read_rows(metastore, table):
+    """Yields the rows of a table as {column: value} dictionaries."""
+    names = [x[0] for x in table['columns']]
+    pattern = None
+    if table.get('input_regex'):
+        # RegexSerDe matches the whole line (Matcher.matches()).
+        pattern = re.compile('(?:{0})\\Z'.format(
+            java_regex(table['input_regex'])))
+    for pairs, local_dir in table_directories(metastore, table):
+        for local_file in data_files(local_dir):
+            with open_data_file(local_file) as handle:
+                for line in handle:
+                    values = split_line(line.rstrip('\n'), table, pattern)
+                    row = dict()
+                    for idx, name in enumerate(names):
+                        value = values[idx] if idx < len(values) else None
+                        row[name] = None if value == HIVE_NULL else value
+                    row.update(pairs)
+                    yield row
+
+
+def write_rows(local_dir, rows, delimiter):
+    """Replaces the data of a directory and returns the rows written."""
+    if os.path.isdir(local_dir):
+        shutil.rmtree(local_dir)
+    os.makedirs(local_dir)
+    count = 0
+    with open(os.path.join(local_dir, '000000_0'), 'w') as handle:
+        for row in rows:
+            handle.write(delimiter.join(
+                HIVE_NULL if x is None else x for x in row) + '\n')
+            count += 1
+    return count
+
+
+def directory_stats(local_dir):
+    """Returns (numFiles, totalSize) of the data files."""
+    files = data_files(local_dir)
+    return len(files), sum(os.path.getsize(x) for x in files)
+
+
+# ---- Hive statements ----
+
+
+class HiveSession(object):
+    """Executes HQL statements against the metastore."""
+
+    def __init__(self, output=None):
+        self.metastore = Metastore()
+        self.settings = dict()
+        self.output = output or sys.stdout
+        self.strict = os.environ.get('MINICLUSTER_STRICT') == '1'
+        self.handlers = [
+            (r'^SET\s+([\w.\-]+)\s*=\s*(.*)$', self.do_set),
+            (r'^SET\s+[\w.\-]+$', self.do_nothing),
+            (r'^USE\s+\w+$', self.do_nothing),
+            (r'^DROP\s+TABLE\s+(IF\s+EXISTS\s+)?([\w.`]+)$', self.do_drop),
+            (r'^CREATE\s+(EXTERNAL\s+)?TABLE\s+(IF\s+NOT\s+EXISTS\s+)?'
+             r'([\w.`]+)\s+LIKE\s+([\w.`]+)$', self.do_create_like),
+            (r'^CREATE\s+(EXTERNAL\s+)?TABLE\s+(IF\s+NOT\s+EXISTS\s+)?'
+             r'([\w.`]+)\s*(\(.*)$', self.do_create),
+            (r'^SHOW\s+PARTITIONS\s+([\w.`]+)$', self.do_show_partitions),
+            (r'^SHOW\s+TABLES$', self.do_show_tables),
+            (r'^DESCRIBE\s+FORMATTED\s+([\w.`]+)\s*'
+             r'(?:PARTITION\s*\((.*)\))?$', self.do_describe),
+            (r'^INSERT\s+OVERWRITE\s+TABLE\s+([\w.`]+)\s*'
+             r'(?:PARTITION\s*\((.*?)\))?\s*SELECT\s+(.*?)\s+FROM\s+'
+             r'([\w.`]+)(?:\s+\w+)?(?:\s+WHERE\s+(.*?))?'
+             r'(?:\s+GROUP\s+BY\s+(.*))?$', self.do_insert),
+            (r'^LOAD\s+DATA\s+(LOCAL\s+)?INPATH\s+(\'[^\']*\'|"[^"]*")\s+'
+             r'(OVERWRITE\s+)?INTO\s+TABLE\s+([\w.`]+)\s*'
+             r'(?:PARTITION\s*\((.*)\))?$', self.do_load),
+            (r'^ANALYZE\s+TABLE\s+([\w.`]+)\s*(?:PARTITION\s*\((.*?)\))?\s*'
+             r'COMPUTE\s+STATISTICS(\s+FOR\s+COLUMNS)?.*$', self.do_analyze),
+            (r'^ALTER\s+TABLE\s+([\w.`]+)\s*(?:PARTITION\s*\((.*?)\))?\s*'
+             r'CONCATENATE$', self.do_concatenate),
+            (r'^ALTER\s+TABLE\s+([\w.`]+)\s+SET\s+TBLPROPERTIES\s*'
+             r'\((.*)\)$', self.do_set_properties),
+            (r'^ALTER\s+TABLE\s+([\w.`]+)\s+RENAME\s+TO\s+([\w.`]+)$',
+             self.do_rename),
+        ]
+        self.handlers = [(re.compile(x, re.I | re.S), y)
+                         for x, y in self.handlers]
+
+    def write(self, line):
+        """Writes one result line."""
+        self.output.write(line + '\n')
+
+    def execute_script(self, text):
+        """Runs every statement, stops at the first failure."""
+        for statement in split_statements(text):
+            started = time.time()
+            try:
+                self.execute(statement)
+            except HiveError as error:
+                sys.stderr.write('FAILED: {0}\n'.format(error))
+                return 1
+            sys.stderr.write('OK\nTime taken: {0:.3f} seconds\n'.format(
+                time.time() - started))
+        return 0
+
+    def execute(self, statement):
+        """Dispatches one statement to its handler."""
+        for pattern, handler in self.handlers:
+            match = pattern.match(statement)
+            if match:
+                return handler(*match.groups())
+        message = 'not emulated: {0}'.format(
+            ' '.join(statement.split())[:80])
+        if self.strict:
+            raise HiveError(message)
+        sys.stderr.write('WARN minicluster {0}\n'.format(message))
+        return None
+
+    def do_nothing(self, *args):
+        """Accepted statements without effect."""
+        return None
+
+    def do_set(self, key, value):
+        """SET key=value."""
+        self.settings[key] = value.strip()
+
+    def do_drop(self, _, name):
+        """DROP TABLE [IF EXISTS] name."""
+        name = table_name(name)
+        table = self.metastore.get_table(name)
+        if table is None:
+            return
+        if not table['external']:
+            local_dir = hdfs_local(table['location'])
+            if os.path.isdir(local_dir):
+                shutil.rmtree(local_dir)
+        self.metastore.drop_table(name)
+
+    def do_create_like(self, external, if_not_exists, name, source):
+        """CREATE TABLE name LIKE source."""
+        name, source = table_name(name), table_name(source)
+        if self.metastore.get_table(name):
+            if if_not_exists:
+                return
+            raise HiveError('AlreadyExistsException Table {0} already '
+                            'exists'.format(name))
+        table = dict(self.metastore.table(source))
+        table.update(name=name, external=bool(external), params={},
+                     location='{0}/{1}'.format(WAREHOUSE, name))
+        self.metastore.save_table(table)
+
+    def do_create(self, external, if_not_exists, name, rest):
+        """CREATE [EXTERNAL] TABLE name (columns) ... ."""
+        name = table_name(name)
+        if self.metastore.get_table(name):
+            if if_not_exists:
+                return
+            raise HiveError('AlreadyExistsException Table {0} already '
+                            'exists'.format(name))
+        end = matching_paren(rest, 0)
+        columns = parse_columns(rest[1:end])
+        tail = rest[end + 1:]
+        partition_columns = []
+        match = re.search(r'PARTITIONED\s+BY\s*\(', tail, re.I)
+        if match:
+            start = match.end() - 1
+            close = matching_paren(tail, start)
+            partition_columns = parse_columns(tail[start + 1:close])
+        delimiter = DEFAULT_DELIMITER
+        match = re.search(r'FIELDS\s+TERMINATED\s+BY\s+(\'(?:\\.|[^\'])*\'|'
+                          r'"(?:\\.|[^"])*")', tail, re.I)
+        if match:
+            delimiter = unquote_literal(match.group(1))
+        stored = re.search(r'STORED\s+AS\s+(\w+)', tail, re.I)
+        input_format = INPUT_FORMATS.get(
+            stored.group(1).upper() if stored else 'TEXTFILE',
+            TEXT_INPUT_FORMAT)
+        input_regex = None
+        match = re.search(r'[\'"]input\.regex[\'"]\s*=\s*(\'(?:\\.|[^\'])*\'|'
+                          r'"(?:\\.|[^"])*")', tail, re.I)
+        if match:
+            input_regex = unquote_literal(match.group(1))
+        location = '{0}/{1}'.format(WAREHOUSE, name)
+        match = re.search(r'LOCATION\s+(\'[^\']*\'|"[^"]*")', tail, re.I)
+        if match:
+            location = unquote_literal(match.group(1))
+        params = dict()
+        match = re.search(r'TBLPROPERTIES\s*\(', tail, re.I)
+        if match:
+            start = match.end() - 1
+            for key, value in parse_partition_spec(
+                    tail[start + 1:matching_paren(tail, start)]):
+                params[unquote_literal(key) if key[:1] in '\'"'
+                       else key] = value
+        self.metastore.save_table({
+            'name': name, 'columns': columns,
+            'partition_columns': partition_columns, 'location': location,
+            'external': bool(external), 'delimiter': delimiter,
+            'input_format': input_format, 'params': params,
+            'input_regex': input_regex})
+        local_dir = hdfs_local(location)
+        if not os.path.isdir(local_dir):
+            os.makedirs(local_dir)
+
+    def do_show_partitions(self, name):
+        """SHOW PARTITIONS name."""
+        table = self.metastore.table(table_name(name))
+        if not table['partition_columns']:
+            raise HiveError('SemanticException Table {0} is not a '
+                            'partitioned table'.format(table['name']))
+        for spec, _, _ in self.metastore.partitions(table['name']):
+            self.write(spec)
+
+    def do_show_tables(self):
+        """SHOW TABLES."""
+        for name in self.metastore.table_names():
+            self.write(name)
+
+    def do_describe(self, name, spec):
+        """DESCRIBE FORMATTED name [PARTITION(..)]."""
+        table = self.metastore.table(table_name(name))
+        location, params = table['location'], table['params']
+        if spec:
+            partition = self.metastore.get_partition(
+                table['name'], spec_name(parse_partition_spec(spec)))
+            if partition is None:
+                raise HiveError('SemanticException Partition not found')
+            location, params = partition
+        self.write('# col_name            \tdata_type           \tcomment')
+        self.write('\t \t ')
+        for column, hive_type in table['columns']:
+            self.write('{0:<20}\t{1:<20}\t'.format(column, hive_type))
+        self.write('\t \t ')
+        if table['partition_columns']:
+            self.write('# Partition Information\t \t ')
+            self.write('# col_name            \tdata_type           \t'
+                       'comment')
+            self.write('\t \t ')
+            for column, hive_type in table['partition_columns']:
+                self.write('{0:<20}\t{1:<20}\t'.format(column, hive_type))
+            self.write('\t \t ')
+        self.write('# Detailed Table Information\t \t ')
+        self.write('Database:           \tdefault             \t ')
+        self.write('Location:           \thdfs://minicluster{0}\t '.format(
+            location))
+        self.write('Table Type:         \t{0}\t '.format(
+            'EXTERNAL_TABLE' if table['external'] else 'MANAGED_TABLE'))
+        self.write('Table Parameters:\t \t ')
+        for key in sorted(params):
+            value = params[key]
+            if not isinstance(value, str):
+                value = json.dumps(value, separators=(',', ':')).replace(
+                    '"', '\\"')
+            self.write('\t{0:<20}\t{1}'.format(key, value))
+        self.write('\t \t ')
+        self.write('# Storage Information\t \t ')
+        self.write('InputFormat:        \t{0}\t '.format(
+            table['input_format']))
+
+    def target_directory(self, table, spec):
+        """Returns (partition name, hdfs dir) of an insert or load."""
+        pairs = parse_partition_spec(spec)
+        if [x[0] for x in pairs] != [
+                x[0] for x in table['partition_columns']]:
+            raise HiveError('SemanticException Partition spec {0} does not '
+                            'match {1}'.format(spec, table['name']))
+        if any(x[1] is None for x in pairs):
+            raise HiveError('SemanticException dynamic partitions are not '
+                            'emulated')
+        if not pairs:
+            return None, table['location']
+        name = spec_name(pairs)
+        return name, '{0}/{1}'.format(table['location'].rstrip('/'), name)
+
+    def store_partition(self, table, name, location, params):
+        """Registers a written partition or updates the table params."""
+        if name is None:
+            table['params'].update(params)
+            self.metastore.save_table(table)
+        else:
+            self.metastore.save_partition(table['name'], name, location,
+                                          params)
+
+    def do_insert(self, name, spec, select_list, source, where, group_by):
+        """INSERT OVERWRITE TABLE name [PARTITION(..)] SELECT .. FROM t."""
+        table = self.metastore.table(table_name(name))
+        source_table = self.metastore.table(table_name(source))
+        partition, location = self.target_directory(table, spec)
+        items = select_items(select_list)
+        if len(items) != len(table['columns']):
+            raise HiveError('SemanticException Table insclause-0 has {0} '
+                            'columns, but query has {1} columns'.format(
+                                len(table['columns']), len(items)))
+        condition = compile_where(where)
+        source_rows = (row for row in read_rows(self.metastore, source_table)
+                       if condition(row))
+        if group_by or any(aggregate_item(x) for x in items):
+            rows = group_rows(select_list, group_by, source_rows)
+        else:
+            expressions = compile_select(select_list)
+            rows = ([x(row) for x in expressions] for row in source_rows)
+        if source_table['name'] == table['name']:
+            # Hive stages the output; the target directory is replaced
+            # only once every source row was read.
+            rows = list(rows)
+        source_files, read_bytes = 0, 0
+        for _, source_dir in table_directories(self.metastore,
+                                               source_table):
+            files, size = directory_stats(source_dir)
+            source_files += files
+            read_bytes += size
+        cpu_started = time.time()
+        local_dir = hdfs_local(location)
+        count = write_rows(local_dir, rows, table['delimiter'])
+        num_files, total_size = directory_stats(local_dir)
+        cpu_seconds = time.time() - cpu_started
+        sys.stderr.write(
+            'MapReduce Jobs Launched: \n'
+            'Stage-Stage-1: Map: {0}   Cumulative CPU: {1:.2f} sec   '
+            'HDFS Read: {2} HDFS Write: {3} SUCCESS\n'
+            'Total MapReduce CPU Time Spent: {4} seconds {5} msec\n'.format(
+                max(source_files, 1), cpu_seconds, read_bytes, total_size,
+                int(cpu_seconds), int(cpu_seconds * 1000) % 1000))
+        self.store_partition(table, partition, location, {
+            'COLUMN_STATS_ACCURATE': {'BASIC_STATS': 'true'},
+            'numRows': str(count), 'numFiles': str(num_files),
+            'totalSize': str(total_size)})
+        sys.stderr.write('Loading data to table default.{0}{1}\n'.format(
+            table['name'], ' partition ({0})'.format(partition)
+            if partition else ''))
+
+    def do_load(self, local, path, overwrite, name, spec):
+        """LOAD DATA [LOCAL] INPATH 'path' [OVERWRITE] INTO TABLE name."""
+        table = self.metastore.table(table_name(name))
+        partition, location = self.target_directory(table, spec)
+        path = unquote_literal(path)
+        source = path if local else hdfs_local(path)
+        if not os.path.exists(source):
+            raise HiveError('SemanticException Invalid path {0}: No files '
+                            'matching path'.format(path))
+        local_dir = hdfs_local(location)
+        if overwrite and os.path.isdir(local_dir):
+            shutil.rmtree(local_dir)
+        if not os.path.isdir(local_dir):
+            os.makedirs(local_dir)
+        sources = data_files(source) if os.path.isdir(source) else [source]
+        for source_file in sources:
+            if local:
+                shutil.copy(source_file, local_dir)
+            else:
+                shutil.move(source_file, local_dir)
+        num_files, total_size = directory_stats(local_dir)
+        self.store_partition(table, partition, location, {
+            'numFiles': str(num_files), 'totalSize': str(total_size)})
+
+    def do_analyze(self, name, spec, for_columns):
+        """ANALYZE TABLE name [PARTITION(..)] COMPUTE STATISTICS."""
+        table = self.metastore.table(table_name(name))
+        if spec:
+            targets = [self.target_directory(table, spec)]
+        elif table['partition_columns']:
+            targets = [(x[0], x[1]) for x in
+                       self.metastore.partitions(table['name'])]
+        else:
+            targets = [(None, table['location'])]
+        for partition, location in targets:
+            local_dir = hdfs_local(location)
+            rows = 0
+            for local_file in data_files(local_dir):
+                with open_data_file(local_file) as handle:
+                    rows += sum(1 for _ in handle)
+            num_files, total_size = directory_stats(local_dir)
+            accurate = {'BASIC_STATS': 'true'}
+            if for_columns:
+                accurate['COLUMN_STATS'] = dict(
+                    (x[0], 'true') for x in table['columns'])
+            self.store_partition(table, partition, location, {
+                'COLUMN_STATS_ACCURATE': accurate, 'numRows': str(rows),
+                'numFiles': str(num_files), 'totalSize': str(total_size)})
+
+    def do_concatenate(self, name, spec):
+        """ALTER TABLE name [PARTITION(..)] CONCATENATE."""
+        table = self.metastore.table(table_name(name))
+        partition, location = self.target_directory(table, spec)
+        local_dir = hdfs_local(location)
+        lines = []
+        for local_file in data_files(local_dir):
+            with open_data_file(local_file) as handle:
+                lines.extend(handle.read().splitlines())
+        for local_file in data_files(local_dir):
+            os.remove(local_file)
+        with open(os.path.join(local_dir, '000000_0'), 'w') as handle:
+            for line in lines:
+                handle.write(line + '\n')
+        num_files, total_size = directory_stats(local_dir)
+        self.store_partition(table, partition, location, {
+            'numFiles': str(num_files), 'totalSize': str(total_size)})
+
+    def do_set_properties(self, name, properties):
+        """ALTER TABLE name SET TBLPROPERTIES (...)."""
+        table = self.metastore.table(table_name(name))
+        for key, value in parse_partition_spec(properties):
+            table['params'][unquote_literal(key) if key[:1] in '\'"'
+                            else key] = value
+        self.metastore.save_table(table)
+
+
+    def do_rename(self, name, new_name):
+        """ALTER TABLE name RENAME TO new_name (managed data moves)."""
+        table = self.metastore.table(table_name(name))
+        new_name = table_name(new_name)
+        if self.metastore.get_table(new_name):
+            raise HiveError('AlreadyExistsException Table {0} already '
+                            'exists'.format(new_name))
+        old_location = table['location'].rstrip('/')
+        partitions = self.metastore.partitions(table['name'])
+        self.metastore.drop_table(table['name'])
+        if not table['external']:
+            location = '{0}/{1}'.format(WAREHOUSE, new_name)
+            if os.path.isdir(hdfs_local(old_location)):
+                shutil.move(hdfs_local(old_location), hdfs_local(location))
+            table['location'] = location
+        table['name'] = new_name
+        self.metastore.save_table(table)
+        for spec, location, params in partitions:
+            if location.startswith(old_location + '/'):
+                location = table['location'] + location[len(old_location):]
+            self.metastore.save_partition(new_name, spec, location, params)
+
+
+def hive_main(args):
+    """hive -f file | hive -e 'query' | hive < script."""
+    if len(args) > 1 and args[0] == '-f':
+        with open(args[1]) as handle:
+            text = handle.read()
+    elif len(args) > 1 and args[0] == '-e':
+        text = args[1]
+    else:
+        text = sys.stdin.read()
+    return HiveSession().execute_script(text)
+
+
+# ---- hdfs dfs ----
+
+
+def permission_string(local_path):
+    """Returns the 'drwxr-xr-x' like mode of a path."""
+    if os.path.isdir(local_path):
+        return 'drwxr-xr-x'
+    return '-rw-r--r--'
+
+
+def ls_line(local_path):
+    """Formats one 'hdfs dfs -ls' line."""
+    stat = os.stat(local_path)
+    is_dir = os.path.isdir(local_path)
+    return '{0} {1:>3} hdfs supergroup {2:>10} {3} {4}'.format(
+        permission_string(local_path), '-' if is_dir else 1,
+        0 if is_dir else stat.st_size,
+        time.strftime('%Y-%m-%d %H:%M', time.localtime(stat.st_mtime)),
+        hdfs_path(local_path))
+
+
+def tree_counts(local_path):
+    """Returns (dirs, files, bytes) below a path like -count."""
+    if not os.path.isdir(local_path):
+        return 0, 1, os.path.getsize(local_path)
+    dirs, files, size = 1, 0, 0
+    for current, sub_dirs, names in os.walk(local_path):
+        dirs += len(sub_dirs)
+        files += len(names)
+        size += sum(os.path.getsize(os.path.join(current, x))
+                    for x in names)
+    return dirs, files, size
+
+
+def split_flags(args):
+    """Returns (flags, operands) of a dfs sub command."""
+    flags = [x for x in args if x.startswith('-') and len(x) > 1]
+    return flags, [x for x in args if x not in flags]
+
+
+def missing(command, path):
+    """Prints the hdfs 'No such file' error and returns 1."""
+    sys.stderr.write("{0}: `{1}': No such file or directory\n".format(
+        command, path))
+    return 1
+
+
+def dfs_ls(args):
+    """-ls [-d] [-R] path..."""
+    flags, paths = split_flags(args)
+    code = 0
+    for pattern in paths or ['/user/hdfs']:
+        matches = hdfs_glob(pattern)
+        if not matches:
+            code = missing('ls', pattern)
+            continue
+        for local_path in matches:
+            if os.path.isdir(local_path) and '-R' in flags:
+                for current, sub_dirs, names in os.walk(local_path):
+                    sub_dirs.sort()
+                    for name in sorted(sub_dirs + names):
+                        print(ls_line(os.path.join(current, name)))
+            elif os.path.isdir(local_path) and '-d' not in flags:
+                entries = [os.path.join(local_path, x)
+                           for x in sorted(os.listdir(local_path))]
+                print('Found {0} items'.format(len(entries)))
+                for entry in entries:
+                    print(ls_line(entry))
+            else:
+                print(ls_line(local_path))
+    return code
+
+
+def dfs_mkdir(args):
+    """-mkdir [-p] path..."""
+    flags, paths = split_flags(args)
+    for path in paths:
+        local_path = hdfs_local(path)
+        if os.path.isdir(local_path):
+            if '-p' not in flags:
+                sys.stderr.write("mkdir: `{0}': File exists\n".format(path))
+                return 1
+            continue
+        if '-p' not in flags and not os.path.isdir(
+                os.path.dirname(local_path.rstrip('/'))):
+            return missing('mkdir', os.path.dirname(path.rstrip('/')))
+        os.makedirs(local_path)
+    return 0
+
+
+def dfs_put(args):
+    """-put [-f] local... dest."""
+    flags, operands = split_flags(args)
+    if len(operands) < 2:
+        sys.stderr.write('-put: Not enough arguments\n')
+        return 1
+    sources, target = operands[:-1], hdfs_local(operands[-1])
+    if len(sources) > 1 or operands[-1].endswith('/'):
+        if not os.path.isdir(target):
+            return missing('put', operands[-1])
+    for source in sources:
+        if not os.path.exists(source):
+            return missing('put', source)
+        destination = target
+        if os.path.isdir(target):
+            destination = os.path.join(target, os.path.basename(source))
+        elif not os.path.isdir(os.path.dirname(target)):
+            return missing('put', operands[-1])
+        if os.path.exists(destination) and '-f' not in flags:
+            sys.stderr.write("put: `{0}': File exists\n".format(
+                hdfs_path(destination)))
+            return 1
+        shutil.copy(source, destination)
+    return 0
+
+
+def dfs_cat(args):
+    """-cat pattern..."""
+    _, patterns = split_flags(args)
+    code = 0
+    for pattern in patterns:
+        matches = [x for x in hdfs_glob(pattern) if os.path.isfile(x)]
+        if not matches:
+            code = missing('cat', pattern)
+        for local_file in matches:
+            with open(local_file) as handle:
+                shutil.copyfileobj(handle, sys.stdout)
+    return code
+
+
+def dfs_count(args):
+    """-count pattern..."""
+    _, patterns = split_flags(args)
+    code = 0
+    for pattern in patterns:
+        matches = hdfs_glob(pattern)
+        if not matches:
+            code = missing('count', pattern)
+        for local_path in matches:
+            dirs, files, size = tree_counts(local_path)
+            print('{0:>12} {1:>12} {2:>18} {3}'.format(
+                dirs, files, size, hdfs_path(local_path)))
+    return code
+
+
+def dfs_du(args):
+    """-du [-s] path..."""
+    flags, patterns = split_flags(args)
+    code = 0
+    for pattern in patterns:
+        matches = hdfs_glob(pattern)
+        if not matches:
+            code = missing('du', pattern)
+        for local_path in matches:
+            if '-s' in flags or not os.path.isdir(local_path):
+                entries = [local_path]
+            else:
+                entries = [os.path.join(local_path, x)
+                           for x in sorted(os.listdir(local_path))]
+            for entry in entries:
+                size = tree_counts(entry)[2]
+                print('{0}  {1}  {2}'.format(size, size, hdfs_path(entry)))
+    return code
+
+
+def dfs_rm(args):
+    """-rm [-r] [-f] [-skipTrash] pattern..."""
+    flags, patterns = split_flags(args)
+    recursive = '-r' in flags or '-R' in flags
+    for pattern in patterns:
+        matches = hdfs_glob(pattern)
+        if not matches and '-f' not in flags:
+            return missing('rm', pattern)
+        for local_path in matches:
+            if os.path.isdir(local_path):
+                if not recursive:
+                    sys.stderr.write('rm: `{0}\': Is a directory\n'.format(
+                        pattern))
+                    return 1
+                shutil.rmtree(local_path)
+            else:
+                os.remove(local_path)
+    return 0
+
+
+def dfs_test(args):
+    """-test -e|-d|-f path."""
+    flags, paths = split_flags(args)
+    if not paths:
+        return 1
+    local_path = hdfs_local(paths[0])
+    checks = {'-e': os.path.exists, '-d': os.path.isdir,
+              '-f': os.path.isfile}
+    check = checks.get(flags[0] if flags else '-e', os.path.exists)
+    return 0 if check(local_path) else 1
+
+
+DFS_COMMANDS = {
+    '-ls': dfs_ls,
+    '-mkdir': dfs_mkdir,
+    '-put': dfs_put,
+    '-copyFromLocal': dfs_put,
+    '-cat': dfs_cat,
+    '-text': dfs_cat,
+    '-count': dfs_count,
+    '-du': dfs_du,
+    '-rm': dfs_rm,
+    '-test': dfs_test,
+}
+
+
+def hdfs_main(args):
+    """hdfs dfs -<command> args..."""
+    if len(args) < 2 or args[0] != 'dfs' or args[1] not in DFS_COMMANDS:
+        sys.stderr.write('minicluster hdfs supports dfs {0}\n'.format(
+            ' '.join(sorted(DFS_COMMANDS))))
+        return 1
+    return DFS_COMMANDS[args[1]](args[2:])
+
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+"""
+Local WebHDFS stand-in server backed by a directory.
+
+Implements the operations used by libs.webhdfs_utils (LISTSTATUS,
+GETFILESTATUS, MKDIRS, two step CREATE with a 307 redirect, OPEN and
+DELETE) with HTTP/1.1 keep-alive so the client can be tested and timed
+without a cluster.
+
+Usage:
+  python bench/webhdfs_server.py ROOT_DIR [PORT]
+
+  then set "webhdfs": {"enabled": true, "url": "http://127.0.0.1:PORT"}.
+"""
+from __future__ import print_function
+
+import json
+import os
+import shutil
+import sys
+
+try:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs, unquote, urlparse
+except ImportError:  # Python 2
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urllib import unquote
+    from urlparse import parse_qs, urlparse
+
+WEBHDFS_PREFIX = '/webhdfs/v1'
+DEFAULT_PORT = 50070
+
+
+def file_status(local_path, name):
+    """Returns the WebHDFS FileStatus of a local path."""
+    stat = os.stat(local_path)
+    is_dir = os.path.isdir(local_path)
+    return {
+        'pathSuffix': name,
+        'type': 'DIRECTORY' if is_dir else 'FILE',
+        'length': 0 if is_dir else stat.st_size,
+        'owner': 'hdfs',
+        'group': 'supergroup',
+        'permission': '755' if is_dir else '644',
+        'replication': 0 if is_dir else 1,
+        'modificationTime': int(stat.st_mtime * 1000),
+        'accessTime': int(stat.st_atime * 1000),
+        'blockSize': 0 if is_dir else 134217728,
+    }
+
+
+class WebHdfsHandler(BaseHTTPRequestHandler):
+    """Serves WebHDFS requests from server.root_dir."""
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        """Keeps the benchmark output clean."""
+        pass
+
+    def _send(self, status, data=None, headers=None):
+        """Sends a json (or raw bytes) response with its length."""
+        if data is None:
+            body = b''
+        elif isinstance(data, bytes):
+            body = data
+        else:
+            body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _error(self, status, exception, message):
+        """Sends a RemoteException like the namenode."""
+        self._send(status, {'RemoteException': {
+            'exception': exception, 'message': message}})
+
+    def _parse(self):
+        """Returns (hdfs path, local path, query) of the request."""
+        url = urlparse(self.path)
+        hdfs_path = unquote(url.path[len(WEBHDFS_PREFIX):]) or '/'
+        local_path = os.path.join(self.server.root_dir,
+                                  hdfs_path.lstrip('/'))
+        query = dict((x, y[0]) for x, y in parse_qs(url.query).items())
+        return hdfs_path, local_path, query
+
+    def _read_body(self):
+        """Reads the request body."""
+        length = int(self.headers.get('Content-Length') or 0)
+        return self.rfile.read(length) if length else b''
+
+    def do_GET(self):
+        """LISTSTATUS, GETFILESTATUS and OPEN."""
+        hdfs_path, local_path, query = self._parse()
+        operation = query.get('op', '').upper()
+        if not os.path.exists(local_path):
+            self._error(404, 'FileNotFoundException',
+                        'File {0} does not exist.'.format(hdfs_path))
+        elif operation == 'LISTSTATUS':
+            if os.path.isdir(local_path):
+                statuses = [file_status(os.path.join(local_path, x), x)
+                            for x in sorted(os.listdir(local_path))]
+            else:
+                statuses = [file_status(local_path, '')]
+            self._send(200, {'FileStatuses': {'FileStatus': statuses}})
+        elif operation == 'GETFILESTATUS':
+            self._send(200, {'FileStatus': file_status(local_path, '')})
+        elif operation == 'OPEN':
+            with open(local_path, 'rb') as handle:
+                self._send(200, handle.read())
+        else:
+            self._error(400, 'IllegalArgumentException',
+                        'Invalid value for webhdfs parameter "op"')
+
+    def do_PUT(self):
+        """MKDIRS and the namenode/datanode steps of CREATE."""
+        hdfs_path, local_path, query = self._parse()
+        operation = query.get('op', '').upper()
+        body = self._read_body()
+        if operation == 'MKDIRS':
+            if not os.path.isdir(local_path):
+                os.makedirs(local_path)
+            self._send(200, {'boolean': True})
+        elif operation == 'CREATE' and 'datanode' not in query:
+            if (os.path.exists(local_path) and
+                    query.get('overwrite', 'false') != 'true'):
+                self._error(403, 'FileAlreadyExistsException',
+                            '{0} already exists'.format(hdfs_path))
+                return
+            location = 'http://{0}:{1}{2}&datanode=true'.format(
+                self.server.server_address[0], self.server.server_address[1],
+                self.path)
+            self._send(307, headers={'Location': location})
+        elif operation == 'CREATE':
+            parent = os.path.dirname(local_path)
+            if not os.path.isdir(parent):
+                os.makedirs(parent)
+            with open(local_path, 'wb') as handle:
+                handle.write(body)
+            self._send(201, headers={'Location': 'hdfs://' + hdfs_path})
+        else:
+            self._error(400, 'IllegalArgumentException',
+                        'Invalid value for webhdfs parameter "op"')
+
+    def do_DELETE(self):
+        """DELETE (recursive)."""
+        _, local_path, _ = self._parse()
+        deleted = os.path.exists(local_path)
+        if os.path.isdir(local_path):
+            shutil.rmtree(local_path)
+        elif deleted:
+            os.remove(local_path)
+        self._send(200, {'boolean': deleted})
+
+
+class WebHdfsServer(ThreadingMixIn, HTTPServer):
+    """Threaded stand-in server."""
+
+    daemon_threads = True
+
+    def __init__(self, root_dir, port=DEFAULT_PORT):
+        HTTPServer.__init__(self, ('127.0.0.1', port), WebHdfsHandler)
+        self.root_dir = root_dir
+
+
+def main(args):
+    """Serves ROOT_DIR until interrupted."""
+    if not args:
+        print(__doc__)
+        return 1
+    port = int(args[1]) if len(args) > 1 else DEFAULT_PORT
+    server = WebHdfsServer(args[0], port)
+    print('WebHDFS stand-in serving {0} on port {1}'.format(
+        args[0], server.server_address[1]))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
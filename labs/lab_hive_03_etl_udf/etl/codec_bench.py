@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+"""
+Codec Bench - Compression codec selection for the nasa_daily output.
+Version : {version}
+
+Description:
+    Measures on a sample of real or generated nasa logs, for each stdlib
+    codec (gzip levels 1/6/9, bz2, lzma): the compression ratio, the
+    compression throughput and the decompress + parse (scan) throughput.
+
+    --output saves the recommended codec as json with a "set" list the
+    ETL injects before the step 5 load (see "codec_settings_file" in
+    etc/config.json).
+
+    nasa_daily feeds the rollup, session and summary stages, and a gzip
+    file is read by a single mapper whatever its size. Gzip is therefore
+    only recommended with --allow_unsplittable (output files known to
+    stay below the split size).
+
+
+Usage:
+  codec_bench.py file --file=F [options]
+  codec_bench.py generated [options]
+
+
+Options:
+  -h --help                Shows this help.
+  --file=F                 Local nasa log (plain, .gz or .bz2) to sample.
+  --sample_mb=N            Sample size in MB [default: 16].
+  --repeat=N               Timing rounds, the fastest is kept [default: 3].
+  --objective=OBJ          scan, storage or balanced [default: balanced].
+  --seed=N                 Seed of the generated sample [default: 0].
+  --allow_unsplittable     Also recommend gzip (not splittable).
+  --output=OUT             Json file to save the recommended settings.
+
+Examples:
+
+  python codec_bench.py file --file=/shared/lab_c2/data/data_nasa/nasa_0701
+
+  python codec_bench.py generated --sample_mb=64 --objective=scan --output=etc/codec.json
+
+"""
+from __future__ import print_function
+
+import json
+import os
+import sys
+
+from libs.cli_utils import EXIT_CODE_FAILURE, EXIT_CODE_SUCCESS
+from libs.cli_utils import docopt_parse, write_info, write_plain, write_error
+from libs.codec_utils import OBJECTIVES, MB, codec_settings
+from libs.codec_utils import generated_sample, measure_codecs
+from libs.codec_utils import recommend_codec, sample_file
+
+PROG_VERSION = '1.0.0'
+
+
+def main():
+    """Measures the codecs and prints the recommendation."""
+    _, arguments = docopt_parse(__doc__, PROG_VERSION)
+    objective = arguments['--objective']
+    if objective not in OBJECTIVES:
+        write_error('--objective must be one of {0}'.format(
+            ', '.join(OBJECTIVES)))
+        return EXIT_CODE_FAILURE
+    max_bytes = int(float(arguments['--sample_mb']) * MB)
+    if arguments['file']:
+        if not os.path.exists(arguments['--file']):
+            write_error('File not found: {0}'.format(arguments['--file']))
+            return EXIT_CODE_FAILURE
+        data = sample_file(arguments['--file'], max_bytes)
+    else:
+        data = generated_sample(max_bytes, int(arguments['--seed']))
+    write_info('Sample: {0:.1f} MB'.format(len(data) / MB))
+    results = measure_codecs(data, int(arguments['--repeat']))
+    write_plain('{0:<10} {1:>7} {2:>12} {3:>14} {4:>10} {5:>6}\n'.format(
+        'codec', 'ratio', 'compress', 'decompress', 'scan', 'split'))
+    for result in results:
+        if result['codec'] == 'none':
+            speeds = '{0:>12} {1:>14}'.format('-', '-')
+        else:
+            speeds = '{0:>7.1f} MB/s {1:>9.1f} MB/s'.format(
+                result['compress_mb_s'], result['decompress_mb_s'])
+        write_plain('{0:<10} {1:>7.2f} {2} {3:>5.1f} MB/s {4:>6}\n'.format(
+            result['codec'], result['ratio'], speeds, result['scan_mb_s'],
+            'yes' if result['splittable'] else 'no'))
+    best = recommend_codec(results, objective,
+                           arguments['--allow_unsplittable'])
+    if not best['splittable']:
+        write_info('{0} is not splittable, keep the nasa_daily files below '
+                   'the split size'.format(best['codec']))
+    settings = codec_settings(best)
+    write_plain('Recommended for {0}: {1}\n'.format(objective, best['codec']))
+    for line in settings:
+        write_plain('  {0}\n'.format(line))
+    if arguments['--output']:
+        with open(arguments['--output'], 'w') as handle:
+            json.dump({'objective': objective, 'codec': best['codec'],
+                       'results': results, 'set': settings}, handle,
+                      indent=2)
+        write_info('Saved {0}'.format(arguments['--output']))
+    return EXIT_CODE_SUCCESS
+
+
+if __name__ == '__main__':
+    sys.exit(main())
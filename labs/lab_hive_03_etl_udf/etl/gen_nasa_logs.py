@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+"""
+Gen Nasa Logs - Synthetic nasa access logs for scale tests.
+Version : {version}
+
+Description:
+    Writes one nasa_MMDD file per day in the format of the lab_hive_01_2
+    instructions, with Zipf skewed hosts and urls, 404 / 304 rates and a
+    fraction of malformed lines. The chunks of lines are built by a pool
+    of processes and written in order, so the files only depend on the
+    seed and the options (not on --processes).
+
+    Point "nasa_logs" of the job configuration at --output_dir to run
+    job_nasa.py over 10x or 100x the real volume.
+
+
+Usage:
+  gen_nasa_logs.py --output_dir=D [options]
+
+
+Options:
+  -h --help                Shows this help.
+  --output_dir=D           Directory of the nasa_MMDD files.
+  --start=MMDD             First day [default: 0701].
+  --days=N                 Number of days [default: 1].
+  --size_mb=N              Size of every file in MB [default: 64].
+  --lines=N                Lines of every file (overrides --size_mb).
+  --hosts=N                Distinct hosts [default: 20000].
+  --urls=N                 Distinct urls [default: 4000].
+  --host_skew=S            Zipf exponent of the hosts [default: 1.1].
+  --url_skew=S             Zipf exponent of the urls [default: 1.3].
+  --error_rate=R           Fraction of 404 lines [default: 0.01].
+  --not_modified_rate=R    Fraction of 304 lines [default: 0.08].
+  --malformed_rate=R       Fraction of malformed lines [default: 0.0001].
+  --seed=N                 Seed of the generator [default: 0].
+  --processes=N            Generating processes (default: the cpus).
+  --chunk_lines=N          Lines per process task [default: 50000].
+
+Examples:
+
+  python gen_nasa_logs.py --output_dir=/tmp/nasa_10x --size_mb=2000
+
+  python gen_nasa_logs.py --output_dir=/tmp/nasa --days=7 --lines=1000000 --malformed_rate=0.01
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+from libs.cli_utils import EXIT_CODE_FAILURE, EXIT_CODE_SUCCESS
+from libs.cli_utils import docopt_parse, write_info, write_error
+from libs.loggen_utils import YEAR, estimate_lines, generate_days
+
+PROG_VERSION = '1.0.0'
+MB = 1024.0 * 1024.0
+
+
+def day_range(start, days):
+    """Returns the MMDD of days consecutive days from start.
+
+    The days must stay in YEAR: the files are named nasa_MMDD, so a range
+    crossing the new year would write the same file twice.
+    """
+    try:
+        first = date(YEAR, int(start[:2]), int(start[2:4]))
+    except (ValueError, IndexError):
+        raise ValueError('--start {0} is not a MMDD day of {1}'.format(
+            start, YEAR))
+    last_days = (date(YEAR, 12, 31) - first).days + 1
+    if not 1 <= days <= last_days:
+        raise ValueError('--days must be between 1 and {0} from {1}'.format(
+            last_days, start))
+    return [(first + timedelta(days=x)).strftime('%m%d')
+            for x in range(days)]
+
+
+def main():
+    """Generates the files and prints the throughput."""
+    _, arguments = docopt_parse(__doc__, PROG_VERSION)
+    try:
+        days = day_range(arguments['--start'], int(arguments['--days']))
+        options = {
+            'seed': int(arguments['--seed']),
+            'hosts': int(arguments['--hosts']),
+            'urls': int(arguments['--urls']),
+            'host_skew': float(arguments['--host_skew']),
+            'url_skew': float(arguments['--url_skew']),
+            'error_rate': float(arguments['--error_rate']),
+            'not_modified_rate': float(arguments['--not_modified_rate']),
+            'malformed_rate': float(arguments['--malformed_rate']),
+            'chunk_lines': int(arguments['--chunk_lines']),
+        }
+        processes = int(arguments['--processes'] or 0) or None
+    except ValueError as error:
+        write_error('Invalid option: {0}'.format(error))
+        return EXIT_CODE_FAILURE
+    if options['error_rate'] + options['not_modified_rate'] + \
+            options['malformed_rate'] > 1:
+        write_error('The error, not modified and malformed rates exceed 1')
+        return EXIT_CODE_FAILURE
+    if arguments['--lines']:
+        lines_per_day = int(arguments['--lines'])
+    else:
+        lines_per_day = estimate_lines(
+            options, float(arguments['--size_mb']) * MB)
+    output_dir = arguments['--output_dir']
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    write_info('Generating {0} day(s) of {1} lines in {2}'.format(
+        len(days), lines_per_day, output_dir))
+    started = time.time()
+    total_bytes, handle, current = 0, None, None
+    try:
+        for mmdd, data in generate_days(days, lines_per_day, options,
+                                        processes):
+            if mmdd != current:
+                if handle is not None:
+                    handle.close()
+                current = mmdd
+                handle = open(os.path.join(
+                    output_dir, 'nasa_{0}'.format(mmdd)), 'wb')
+            handle.write(data)
+            total_bytes += len(data)
+    finally:
+        if handle is not None:
+            handle.close()
+    elapsed = max(time.time() - started, 1e-9)
+    write_info('Wrote {0} lines, {1:.1f} MB in {2:.1f} s ({3:.1f} MB/s)'.format(
+        lines_per_day * len(days), total_bytes / MB, elapsed,
+        total_bytes / MB / elapsed))
+    return EXIT_CODE_SUCCESS
+
+
+if __name__ == '__main__':
+    sys.exit(main())
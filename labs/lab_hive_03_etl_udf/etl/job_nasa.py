@@ -10,11 +10,27 @@ Description:
     It has 3 commands:
         run             -> Runs the job step by step.
         dry_run         -> Print the commands to be executed in sequence.
+        compact         -> Merge small files of a table partitions.
+        distinct        -> Approximate distinct counts from HLL sketches.
+        lookup          -> Days a host/page_url was seen (bloom filters).
+        validate        -> Counts malformed lines of the local input file.
+        history         -> Step duration trends of the previous runs.
+        rebuild_summaries -> Recreates the summary tables from nasa_daily.
+        verify_raw      -> Compares the legacy and RegexSerDe raw tables.
+        migrate         -> Converts nasa_daily into the typed ORC table.
 
 
 Usage:
-  job_nasa.py run --cfg_file=CF [--dt_date=DT]
-  job_nasa.py dry_run --cfg_file=file [--dt_date=DT]
+  job_nasa.py run --cfg_file=CF [--dt_date=DT] [--sample=FRACTION]
+  job_nasa.py dry_run --cfg_file=file [--dt_date=DT] [--sample=FRACTION]
+  job_nasa.py compact --cfg_file=CF [--table=TB] [--report_only]
+  job_nasa.py distinct --cfg_file=CF --column=COL --from_date=FD [--to_date=TD]
+  job_nasa.py lookup --cfg_file=CF --from_date=FD [--to_date=TD] [--host=H] [--page_url=U]
+  job_nasa.py validate --cfg_file=CF [--dt_date=DT] [--processes=N]
+  job_nasa.py history --cfg_file=CF [--step=S] [--since=DT] [--sigma=N]
+  job_nasa.py rebuild_summaries --cfg_file=CF [--view=V]
+  job_nasa.py verify_raw --cfg_file=CF [--dt_date=DT] [--repeat=N]
+  job_nasa.py migrate --cfg_file=CF [--swap]
   job_nasa.py describe
   job_nasa.py test
 
@@ -23,10 +39,42 @@ Options:
   -h --help                Shows this help.
   -c --cfg_file=CF         Defines the configuration file to be used.
   --dt_date=DT             Date to be processed.
+  --sample=FRACTION        Load a deterministic sample of the input (0-1]
+                           into nasa_daily_sample instead of nasa_daily.
+  --table=TB               Table to compact [default: nasa_daily].
+  --report_only            Only report partitions with small files.
+  --column=COL             Column of the distinct count (host, page_url).
+  --from_date=FD           First dt_date of the range (1995-07-01).
+  --to_date=TD             Last dt_date of the range (defaults to from_date).
+  --host=H                 Host to look up.
+  --page_url=U             Page url to look up.
+  --processes=N            Worker processes (defaults to the cpu count).
+  --step=S                 Only report this step.
+  --since=DT               Only report runs since this date (2018-07-01).
+  --sigma=N                Flag runs slower than mean + N std [default: 3].
+  --view=V                 Only rebuild this summary table.
+  --repeat=N               Timed loads per raw table, the fastest is kept
+                           [default: 1].
+  --swap                   Rename the typed table to nasa_daily once every
+                           partition is converted.
 
 Commands:
   run                      Runs the etl calling the programs.
   dry_run                  Shows the code to be executed.
+  compact                  Rewrites partitions made of small files.
+  distinct                 Merges per partition sketches to count uniques.
+  lookup                   Queries only the partitions whose bloom filter
+                           may contain the host and/or page_url.
+  validate                 Parses the local input file in parallel.
+  history                  Percentiles, slow runs and duration versus input
+                           size correlation per step.
+  rebuild_summaries        Recomputes every partition of the summary tables
+                           after a view definition was added or changed.
+  verify_raw               Loads the staged date through the former '"'
+                           split raw table and the RegexSerDe one, then
+                           compares the rows and the load times.
+  migrate                  Converts the nasa_daily text partitions one by
+                           one into the typed ORC table (resumable).
   describe                 Describe the job steps.
 
 Examples:
@@ -35,20 +83,57 @@ Examples:
 
   To execute the etl dry run.
 
+  python job_nasa.py run --cfg_file=config.json --dt_date=0702 --sample=0.01
+
+  To load 1% of the day into nasa_daily_sample.
+
 """
 from __future__ import print_function
 
 import json
 import os
+import shutil
 import sys
+import tempfile
 import time
+from collections import Counter
 from datetime import datetime
 
 from libs.cli_utils import EXIT_CODE_FAILURE, EXIT_CODE_SUCCESS
 from libs.cli_utils import add_to_path, write_plain, write_info
+from libs.cli_utils import write_txt_file, write_error
 from libs.cli_utils import docopt_parse, evaluate_date
+from libs.cli_utils import load_json_configuration, evaluate_relative_date
 from libs.cli_utils import get_this_file_path, execute_shell_command
 from libs.hive_utils import resolve_template, hive_query_template
+from libs.hive_utils import submit_hive_query, hive_string
+from libs.hive_utils import HiveCounterCapture
+from libs.hive_utils import analyze_table, partition_stats_current
+from libs.hive_utils import describe_formatted, parse_describe_columns
+from libs.hive_utils import parse_describe_value
+from libs.hdfs_utils import hdfs_file_counts, partition_pairs_from_path
+from libs.hdfs_utils import partition_spec_from_path, hdfs_cat
+from libs.hdfs_utils import hdfs_du
+from libs.nasa_utils import DailyRollups, LineSampler, read_nasa_records
+from libs.nasa_utils import write_tsv, validate_nasa_file
+from libs.nasa_utils import NASA_SERDE_REGEX
+from libs.history_utils import RunHistory
+from libs.summary_utils import definition_hash, load_summary_state
+from libs.summary_utils import save_summary_state, summary_update_hql
+from libs.summary_utils import summary_rebuild_hql, summary_backfill_hql
+from libs.summary_utils import HASH_PROPERTY
+from libs.storage_utils import TYPED_COLUMNS, typed_select
+from libs.storage_utils import typed_table_hql, migrate_partition_hql
+from libs.storage_utils import rename_table_hql, load_migration_state
+from libs.storage_utils import has_typed_columns
+from libs.storage_utils import save_migration_state
+from libs.session_utils import SESSION_COLUMNS, Sessionizer
+from libs.queue_utils import RunQueue
+from libs.webhdfs_utils import make_hdfs_client
+from libs.tuning_utils import compute_tuning_settings, settings_to_hql
+from libs.sketch_utils import ColumnSketches, merge_sketch_lines
+from libs.sketch_utils import HostUrlBloom, bloom_candidate_dates
+from libs.sketch_utils import host_url_key
 
 # General constants
 PROG_VERSION = '1.0.1'
@@ -59,6 +144,65 @@ ERROR = "ERROR"
 WARN = "WARN"
 EXEC = "EXEC"
 LOCAL_DIR = '/shared/lab_c2/data/data_nasa/'
+# Hive ignores files starting with "_" when reading a partition.
+SKETCH_FILE = '_hll_sketches.tsv'
+BLOOM_FILE = '_bloom_host_url.tsv'
+# Partition files written by the job that a partition rewrite deletes.
+SIDECAR_FILES = (SKETCH_FILE, BLOOM_FILE)
+STEPS_READING_INPUT = ['local_ingest_pass', 'step_02_load_hdfs_file',
+                       'step_05_load_into_nasa_daily']
+# Keys the bloom filter is allocated for (about 8 MB at 1%), it is folded
+# down to the distinct keys of the day before being stored.
+BLOOM_MAX_KEYS = 4000000
+# Staging table parsed once per line by the RegexSerDe (step 03).
+RAW_TABLE_TPL = """
+          DROP TABLE IF EXISTS {raw_table};
+          CREATE EXTERNAL TABLE {raw_table} (
+            host STRING,
+            request_time STRING,
+            method STRING,
+            url STRING,
+            status STRING,
+            size STRING)
+          ROW FORMAT SERDE 'org.apache.hadoop.hive.serde2.RegexSerDe'
+          WITH SERDEPROPERTIES ('input.regex' = {input_regex})
+          LOCATION "{hdfs_path}"
+          ;
+"""
+DAILY_SELECT = """host,
+              request_time,
+              IF(method = 'GET', url, '') as page_url,
+              COALESCE(status, '') as error_code,
+              COALESCE(size, '') as page_size"""
+# Former '"' split staging table, kept for the verify_raw comparison.
+LEGACY_RAW_TABLE_TPL = """
+          DROP TABLE IF EXISTS {raw_table};
+          CREATE EXTERNAL TABLE {raw_table} (
+            FLD_1 STRING,
+            GET_URL STRING,
+            FLD_2 STRING)
+          ROW FORMAT DELIMITED
+          FIELDS TERMINATED BY "\\""
+          LOCATION "{hdfs_path}"
+          ;
+"""
+LEGACY_DAILY_SELECT = """regexp_extract(FLD_1, '(.*?) (.*?)', 1) as host,
+              regexp_extract(FLD_1, '(.*?)\\\\[(.*?) ', 2) as request_time,
+              regexp_extract(GET_URL, 'GET (.*?) (.*?)', 1) as page_url,
+              regexp_extract(FLD_2, '([0-9].*) ([0-9].*)', 1) as error_code,
+              regexp_extract(FLD_2, '([0-9].*) ([0-9].*)', 2) as page_size"""
+
+
+def format_seconds(value):
+    """Formats a duration in seconds for the reports."""
+    if value is None:
+        return '-'
+    return '{0:.2f}s'.format(value)
+
+
+def format_mb(value):
+    """Formats a byte count in MB for the reports."""
+    return '{0:.1f}MB'.format(value / 1048576.0)
 
 
 class ETLNasaJob(object):
@@ -75,6 +219,21 @@ class ETLNasaJob(object):
         self.config = None
         self.etl_prefix_name = 'Nasa ETL'
         self.dry_run = self.arguments.get('dry_run', False)
+        self.ingest_results = dict()
+        self.step_counters = dict()
+        self.hdfs_client = None
+        self.tuning_settings = []
+        self.sample_fraction = None
+        if self.arguments.get('--sample'):
+            try:
+                self.sample_fraction = float(self.arguments['--sample'])
+            except ValueError:
+                self.sample_fraction = -1.0
+        self.raw_table = 'nasa_raw_etl'
+        self.daily_table = 'nasa_daily'
+        if self.sample_fraction:
+            self.raw_table = 'nasa_raw_etl_sample'
+            self.daily_table = 'nasa_daily_sample'
 
     def get_date(self):
         """Capture the date from command line"""
@@ -83,6 +242,32 @@ class ETLNasaJob(object):
             the_date = 'today'
         return evaluate_date(the_date)
 
+    def get_partition_date(self):
+        """Returns the nasa_daily partition value for the processed date."""
+        month_day = self.get_date()
+        return '1995-' + month_day[0:2] + '-' + month_day[2:4]
+
+    def get_local_file(self):
+        """Returns the local nasa log file for the processed date."""
+        local_dir = self.config.get('local_locations', {}).get(
+            'nasa_logs', LOCAL_DIR)
+        return os.path.join(local_dir, 'nasa_' + self.get_date())
+
+    def get_sample_file(self):
+        """Returns the local file holding the sampled input."""
+        sample_dir = self.config.get('sample', {}).get(
+            'local_dir', '/tmp/nasa_sample')
+        # Same name as the input so reruns replace the staged sample.
+        return os.path.join(sample_dir, 'nasa_' + self.get_date())
+
+    def get_raw_table(self):
+        """Returns the staging table of the processed date.
+
+        One table per date so concurrent runs never remap each other's
+        staging location between step 03 and step 05.
+        """
+        return '{0}_{1}'.format(self.raw_table, self.get_date())
+
     def get_staging_dir_for_date(self):
         """Capture the date from command line"""
         the_date = self.arguments.get('--dt_date', None)
@@ -91,8 +276,19 @@ class ETLNasaJob(object):
         temp_load = self.get_temp_root_path()
         return temp_load + '/' + evaluate_date(the_date)
 
+    def get_partition_location(self, dt_date=None, table=None):
+        """Returns the hdfs directory of a daily table partition."""
+        warehouse = self.config['hdfs_locations']['warehouse'].rstrip('/')
+        return '{0}/{1}/dt_date={2}'.format(
+            warehouse, table or self.daily_table,
+            dt_date or self.get_partition_date())
+
     def get_temp_root_path(self):
         """Returns the root location for the base of staging area."""
+        if self.sample_fraction:
+            return self.config['hdfs_locations'].get(
+                'temp_load_sample',
+                self.config['hdfs_locations']['temp_load'] + '_sample')
         return self.config['hdfs_locations']['temp_load']
 
     def make_job_title(self, suffix_str):
@@ -125,57 +321,54 @@ class ETLNasaJob(object):
             results, code = execute_shell_command(commands)
         return results, code
 
+    def get_hdfs_client(self):
+        """Returns the run hdfs client (WebHDFS or the hdfs dfs CLI)."""
+        if self.hdfs_client is None:
+            self.hdfs_client = make_hdfs_client(
+                self.config.get('webhdfs', {}))
+        return self.hdfs_client
+
     def step_01_prepare_input_dir(self):
         """Execute step 01 - Prepare input dir."""
-        ctx = dict()
+        hdfs_temp_load = self.get_temp_root_path()
         write_info('Step 1 - List hdfs input dir')
-        ctx['hdfs_temp_load'] = self.get_temp_root_path()
-        cmd_tpl = "hdfs dfs -ls {hdfs_temp_load}"
-        results, code = self._exec_command(cmd_tpl, ctx)
+        # create base dir if does not exists.
+        target_hdfs_dir = self.get_staging_dir_for_date()
+        if self.dry_run:
+            write_plain('> hdfs dfs -ls {0}\n'.format(hdfs_temp_load))
+            write_plain('> hdfs dfs -mkdir -p {0}/\n'.format(target_hdfs_dir))
+            return None, EXIT_CODE_SUCCESS
+        results, code = self.get_hdfs_client().ls(hdfs_temp_load)
         if code != EXIT_CODE_SUCCESS:
             return None, code
         write_plain('--- Input location in hdfs ---\n')
         for line in results:
             write_plain(line + '\n')
-
-        # create base dir if does not exists.
-        target_hdfs_dir = self.get_staging_dir_for_date()
         write_info('Step 1 - Creating the dir {0}'.format(target_hdfs_dir))
-        ctx = dict()
-        ctx['hdfs_path'] = target_hdfs_dir
-        cmd_tpl = "hdfs dfs -mkdir -p {hdfs_path}/"
-        results, code = self._exec_command(cmd_tpl, ctx)
+        results, code = self.get_hdfs_client().mkdirs([target_hdfs_dir])
         return None, code
 
     def step_02_load_hdfs_file(self):
         """Execute step 02 - Loads the file"""
-        ctx = dict()
-        local_file = LOCAL_DIR + 'nasa_' + self.get_date()
+        local_file = self.get_local_file()
+        if self.sample_fraction:
+            local_file = self.get_sample_file()
         target_hdfs_dir = self.get_staging_dir_for_date()
         write_info('Step 2 - Loading the file {0}'.format(local_file))
-        ctx['local_file'] = local_file
-        ctx['hdfs_path'] = target_hdfs_dir
-        cmd_tpl = "hdfs dfs -put -f {local_file} {hdfs_path}/"
-        results, code = self._exec_command(cmd_tpl, ctx)
-        return results, code
+        if self.dry_run:
+            write_plain('> hdfs dfs -put -f {0} {1}/\n'.format(
+                local_file, target_hdfs_dir))
+            return [], EXIT_CODE_SUCCESS
+        return self.get_hdfs_client().put([local_file], target_hdfs_dir)
 
     def step_03_update_load_table(self):
         """Execute step 02"""
         ctx = dict()
         ctx['hdfs_path'] = self.get_staging_dir_for_date()
+        ctx['raw_table'] = self.get_raw_table()
+        ctx['input_regex'] = hive_string(NASA_SERDE_REGEX)
         write_info('Step 3 - Update external table mapping')
-        cmd_tpl = """
-          DROP TABLE IF EXISTS nasa_raw_etl;
-          CREATE EXTERNAL TABLE nasa_raw_etl (
-            FLD_1 STRING,   
-            GET_URL STRING,  
-            FLD_2 STRING)
-          ROW FORMAT DELIMITED
-          FIELDS TERMINATED BY "\\""
-          LOCATION "{hdfs_path}"
-          ;
-        """
-        results, code = hive_query_template(cmd_tpl, ctx)
+        results, code = hive_query_template(RAW_TABLE_TPL, ctx)
         write_plain('Results\n')
         for line in results:
             write_plain(line + '\n')
@@ -185,9 +378,11 @@ class ETLNasaJob(object):
     def step_04_show_current_partitions(self):
         """Execute step 04"""
         ctx = dict()
+        ctx['daily_table'] = self.daily_table
         write_info('Step 4 - Show current partitions')
         cmd_tpl = """
-            SHOW PARTITIONS nasa_daily;
+            CREATE TABLE IF NOT EXISTS {daily_table} LIKE nasa_daily;
+            SHOW PARTITIONS {daily_table};
         """
         results, code = hive_query_template(cmd_tpl, ctx)
         write_plain('Partitions:\n')
@@ -199,56 +394,988 @@ class ETLNasaJob(object):
     def step_05_load_into_nasa_daily(self):
         """Execute step 04"""
         ctx = dict()
-        month_day = self.get_date()
-        partition_fmt = '1995-' + month_day[0:2] + '-' + month_day[2:4]
-        ctx['dt_date'] = partition_fmt
-        ctx['job_name'] = 'Insert data into nasa_daily'
+        ctx['dt_date'] = self.get_partition_date()
+        ctx['job_name'] = 'Insert data into ' + self.daily_table
+        ctx['raw_table'] = self.get_raw_table()
+        ctx['daily_table'] = self.daily_table
+        ctx['select'] = DAILY_SELECT
+        typed, code = self.daily_table_is_typed()
+        if code != EXIT_CODE_SUCCESS:
+            return [], code
+        if typed:
+            # Values are converted once here instead of by every query.
+            ctx['select'] = typed_select(
+                'host', 'request_time', "IF(method = 'GET', url, '')",
+                'status', 'size')
+        ctx['session_settings'] = self.build_session_settings()
+        ctx['analyze'] = ''
+        stats_cfg = self.get_statistics_config()
+        if stats_cfg.get('enabled') and stats_cfg.get('same_session'):
+            ctx['analyze'] = resolve_template(
+                'ANALYZE TABLE {daily_table} '
+                'PARTITION(dt_date = "{dt_date}") '
+                'COMPUTE STATISTICS {columns};', {
+                    'daily_table': self.daily_table,
+                    'dt_date': ctx['dt_date'],
+                    'columns': ('FOR COLUMNS'
+                                if stats_cfg.get('for_columns') else '')})
         write_info('Step 5 - Load new partition {0}'.format(ctx['dt_date']))
         cmd_tpl = """
           SET mapred.job.name={job_name};
+          {session_settings}
 
-          INSERT OVERWRITE TABLE nasa_daily 
+          INSERT OVERWRITE TABLE {daily_table} 
           PARTITION(dt_date = "{dt_date}") 
             SELECT 
-              regexp_extract(FLD_1, '(.*?) (.*?)', 1) as host,
-              regexp_extract(FLD_1, '(.*?)\\\\[(.*?) ', 2) as request_time,
-              regexp_extract(GET_URL, 'GET (.*?) (.*?)', 1) as page_url,
-              regexp_extract(FLD_2, '([0-9].*) ([0-9].*)', 1) as error_code,
-              regexp_extract(FLD_2, '([0-9].*) ([0-9].*)', 2) as page_size
-            FROM nasa_raw_etl
+              {select}
+            FROM {raw_table}
             ;
+
+          {analyze}
+
+          DROP TABLE IF EXISTS {raw_table};
         """
+        # The per date raw table is external (the staged file is kept),
+        # dropping it keeps the metastore from growing by one table a day.
         results, code = hive_query_template(cmd_tpl, ctx)
+        if code == EXIT_CODE_SUCCESS and not typed:
+            self.forget_converted_partition(ctx['dt_date'])
         return results, code
 
-    def execute_etl(self):
-        """Execute the etl steps and handle dry_runs."""
-        _, code = self.step_01_prepare_input_dir()
+    def daily_table_is_typed(self):
+        """Returns (True if the daily table has the typed columns, code).
+
+        The migration state answers without a query once nasa_daily was
+        swapped on this host, else the table is described (a dry run
+        assumes the text columns).
+        """
+        state_file = self.config.get('typed_storage', {}).get('state_file')
+        if (state_file and self.daily_table == 'nasa_daily' and
+                load_migration_state(state_file)['swapped']):
+            return True, EXIT_CODE_SUCCESS
+        if self.dry_run:
+            return False, EXIT_CODE_SUCCESS
+        lines, code = describe_formatted('default', self.daily_table)
+        if code != EXIT_CODE_SUCCESS:
+            return False, code
+        return has_typed_columns(parse_describe_columns(lines)), code
+
+    def forget_converted_partition(self, dt_date):
+        """Marks a reloaded text partition as not converted."""
+        state_file = self.config.get('typed_storage', {}).get('state_file')
+        if (self.dry_run or not state_file or
+                self.daily_table != 'nasa_daily' or
+                not os.path.exists(state_file)):
+            return
+        state = load_migration_state(state_file)
+        if dt_date not in state['converted']:
+            return
+        state['converted'].remove(dt_date)
+        save_migration_state(state_file, state)
+        write_info('Step 5 - {0} reloaded, the next migrate converts it '
+                   'again'.format(dt_date))
+
+    def get_summary_views(self, name=None):
+        """Returns the configured summary views (optionally only one)."""
+        views = self.config.get('summaries', {}).get('views', [])
+        if name:
+            return [x for x in views if x['name'] == name]
+        return views
+
+    def step_06_update_summary_tables(self):
+        """Execute step 06 - Refresh the summary tables for the partition."""
+        summaries_cfg = self.config.get('summaries', {})
+        if not summaries_cfg.get('enabled') or self.sample_fraction:
+            return [], EXIT_CODE_SUCCESS
+        dt_date = self.get_partition_date()
+        state = load_summary_state(summaries_cfg['state_file'])
+        views = self.get_summary_views()
+        unchecked = [x['name'] for x in views
+                     if state.get(x['name']) != definition_hash(x)]
+        stored, code = dict(), EXIT_CODE_SUCCESS
+        if unchecked and not self.dry_run:
+            stored, code = self.read_summary_hashes(unchecked)
+            if code != EXIT_CODE_SUCCESS:
+                return [], code
+        statements, changed, checked = [], [], dict()
+        for view in views:
+            name, expected = view['name'], definition_hash(view)
+            if name in stored:
+                if stored[name] is None:
+                    # New view: nothing to mix, compute every partition.
+                    write_info('Step 6 - Summary {0} is new, building it '
+                               'over every partition'.format(name))
+                    dates, code = self.get_daily_dates()
+                    if code != EXIT_CODE_SUCCESS:
+                        return [], code
+                    statements.append(summary_backfill_hql(view, dates))
+                    checked[name] = expected
+                    continue
+                if stored[name] != expected:
+                    changed.append(name)
+                    continue
+                checked[name] = expected
+            statements.append(summary_update_hql(view, dt_date))
+        if statements:
+            write_info('Step 6 - Update {0} summary tables for {1}'.format(
+                len(statements), dt_date))
+            _, code = submit_hive_query('\n'.join(statements),
+                                        dry_run=self.dry_run)
+        if code == EXIT_CODE_SUCCESS and checked:
+            # Cache the hashes checked against the tables.
+            state.update(checked)
+            save_summary_state(summaries_cfg['state_file'], state)
+        for name in changed:
+            write_error('Step 6 - Summary {0} definition changed, run '
+                        'rebuild_summaries --view={0}'.format(name))
+            code = EXIT_CODE_FAILURE
+        return [], code
+
+    def read_summary_hashes(self, names):
+        """Returns {view name: definition hash in its TBLPROPERTIES} (None
+        when the table does not exist) and the exit code."""
+        results, code = submit_hive_query('SHOW TABLES;', capture=True)
+        if code != EXIT_CODE_SUCCESS:
+            return dict(), code
+        tables = set(x.strip().lower() for x in results)
+        hashes = dict()
+        for name in names:
+            hashes[name] = None
+            if name.lower() not in tables:
+                continue
+            lines, code = describe_formatted('default', name)
+            if code != EXIT_CODE_SUCCESS:
+                return dict(), code
+            hashes[name] = parse_describe_value(lines, HASH_PROPERTY)
+        return hashes, EXIT_CODE_SUCCESS
+
+    def get_daily_dates(self):
+        """Returns the sorted dt_date partitions of nasa_daily."""
+        results, code = submit_hive_query('SHOW PARTITIONS nasa_daily;',
+                                          capture=True)
+        return sorted(x.strip().split('=', 1)[1] for x in results
+                      if x.strip().startswith('dt_date=')), code
+
+    def rebuild_summaries(self):
+        """Recreates summary tables over all the nasa_daily partitions."""
+        summaries_cfg = self.config.get('summaries', {})
+        views = self.get_summary_views(self.arguments['--view'])
+        if not views:
+            write_info('No summary views to rebuild')
+            return EXIT_CODE_FAILURE
+        dates, code = self.get_daily_dates()
         if code != EXIT_CODE_SUCCESS:
             return code
-        _, code = self.step_02_load_hdfs_file()
+        state = load_summary_state(summaries_cfg['state_file'])
+        for view in views:
+            write_info('Rebuild {0} over {1} partitions'.format(
+                view['name'], len(dates)))
+            _, code = submit_hive_query(summary_rebuild_hql(view, dates))
+            if code != EXIT_CODE_SUCCESS:
+                return code
+            state[view['name']] = definition_hash(view)
+            save_summary_state(summaries_cfg['state_file'], state)
+        return EXIT_CODE_SUCCESS
+
+    def load_verify_table(self, name, raw_table_tpl, select):
+        """Loads the staged date through one raw table definition.
+
+        Returns (output lines, fastest load seconds, exit code).
+        """
+        ctx = dict()
+        ctx['dt_date'] = self.get_partition_date()
+        ctx['hdfs_path'] = self.get_staging_dir_for_date()
+        ctx['input_regex'] = hive_string(NASA_SERDE_REGEX)
+        ctx['raw_table'] = 'nasa_raw_verify_' + name
+        ctx['verify_table'] = 'nasa_verify_' + name
+        ctx['select'] = select
+        ctx['job_name'] = self.make_job_title('Verify raw ' + name)
+        _, code = submit_hive_query(resolve_template(raw_table_tpl, ctx) +
+                                    resolve_template("""
+          DROP TABLE IF EXISTS {verify_table};
+          CREATE TABLE {verify_table} LIKE nasa_daily;
+        """, ctx))
+        if code != EXIT_CODE_SUCCESS:
+            return [], None, code
+        best = None
+        for _ in range(int(self.arguments['--repeat'])):
+            started = time.time()
+            _, code = hive_query_template("""
+          SET mapred.job.name={job_name};
+          INSERT OVERWRITE TABLE {verify_table}
+          PARTITION(dt_date = "{dt_date}")
+            SELECT
+              {select}
+            FROM {raw_table};
+        """, ctx)
+            if code != EXIT_CODE_SUCCESS:
+                return [], None, code
+            duration = time.time() - started
+            best = duration if best is None else min(best, duration)
+        lines, code = hdfs_cat(self.get_partition_location(
+            ctx['dt_date'], ctx['verify_table']) + '/*')
+        submit_hive_query(resolve_template("""
+          DROP TABLE IF EXISTS {verify_table};
+          DROP TABLE IF EXISTS {raw_table};
+        """, ctx))
+        return lines, best, code
+
+    def verify_raw_table(self):
+        """Compares the legacy and the RegexSerDe loads of the staged date."""
+        write_info('Verify - Loading {0} with both raw tables'.format(
+            self.get_staging_dir_for_date()))
+        legacy, legacy_time, code = self.load_verify_table(
+            'legacy', LEGACY_RAW_TABLE_TPL, LEGACY_DAILY_SELECT)
         if code != EXIT_CODE_SUCCESS:
             return code
-        _, code = self.step_03_update_load_table()
+        serde, serde_time, code = self.load_verify_table(
+            'serde', RAW_TABLE_TPL, DAILY_SELECT)
         if code != EXIT_CODE_SUCCESS:
             return code
-        _, code = self.step_04_show_current_partitions()
+        only_legacy = Counter(legacy) - Counter(serde)
+        only_serde = Counter(serde) - Counter(legacy)
+        write_plain('{0:<8} {1:>10} {2:>10}\n'.format('table', 'rows', 'load'))
+        for name, lines, duration in (('legacy', legacy, legacy_time),
+                                      ('serde', serde, serde_time)):
+            write_plain('{0:<8} {1:>10} {2:>10}\n'.format(
+                name, len(lines), format_seconds(duration)))
+        write_plain('Speedup: {0:.2f}x\n'.format(
+            legacy_time / max(serde_time, 1e-9)))
+        if not only_legacy and not only_serde:
+            write_info('Verify - Identical output ({0} rows)'.format(
+                len(serde)))
+            return EXIT_CODE_SUCCESS
+        rejected = sum(y for x, y in only_serde.items()
+                       if x.startswith('\\N\x01'))
+        write_info('Verify - {0} rows differ, {1} lines rejected by the '
+                   'RegexSerDe pattern (NULL host)'.format(
+                       sum(only_legacy.values()), rejected))
+        for label, rows in (('legacy', only_legacy), ('serde', only_serde)):
+            for line in sorted(rows)[:5]:
+                write_plain('  {0}: {1}\n'.format(
+                    label, line.replace('\x01', ' | ')))
+        return EXIT_CODE_FAILURE
+
+    def migrate_storage(self):
+        """Converts the nasa_daily text partitions into the typed table."""
+        storage_cfg = self.config.get('typed_storage', {})
+        typed_table = storage_cfg.get('table', 'nasa_daily_typed')
+        state_file = storage_cfg['state_file']
+        state = load_migration_state(state_file)
+        if state['swapped']:
+            write_info('Migrate - nasa_daily is already the typed table')
+            return EXIT_CODE_SUCCESS
+        if state['legacy_renamed']:
+            write_info('Migrate - Finishing the interrupted swap')
+            return self.swap_typed_table(state)
+        lines, code = describe_formatted('default', 'nasa_daily')
+        if code != EXIT_CODE_SUCCESS:
+            return code
+        source_columns = [x[0] for x in parse_describe_columns(lines)]
+        if len(source_columns) != len(TYPED_COLUMNS):
+            write_info('Migrate - nasa_daily has {0} columns, expected '
+                       '{1}'.format(len(source_columns), len(TYPED_COLUMNS)))
+            return EXIT_CODE_FAILURE
+        dates, code = self.get_daily_dates()
         if code != EXIT_CODE_SUCCESS:
             return code
-        _, code = self.step_05_load_into_nasa_daily()
+        _, code = submit_hive_query(typed_table_hql(
+            typed_table, storage_cfg.get('orc_compress', 'ZLIB')))
         if code != EXIT_CODE_SUCCESS:
             return code
+        pending = [x for x in dates if x not in state['converted']]
+        write_info('Migrate - {0} of {1} partitions to convert into '
+                   '{2}'.format(len(pending), len(dates), typed_table))
+        for idx, dt_date in enumerate(pending):
+            started = time.time()
+            _, code = submit_hive_query(migrate_partition_hql(
+                'nasa_daily', typed_table, source_columns, dt_date))
+            if code == EXIT_CODE_SUCCESS:
+                # The sketches and blooms move with the rows.
+                code = self.copy_sidecars(
+                    self.get_partition_location(dt_date, 'nasa_daily'),
+                    self.get_partition_location(dt_date, typed_table))
+            if code != EXIT_CODE_SUCCESS:
+                write_info('Migrate - {0} failed, run migrate again to '
+                           'resume'.format(dt_date))
+                return code
+            state['converted'].append(dt_date)
+            save_migration_state(state_file, state)
+            write_info('Migrate - {0} converted ({1}/{2}) in {3}'.format(
+                dt_date, idx + 1, len(pending),
+                format_seconds(time.time() - started)))
+        if not self.arguments['--swap']:
+            return EXIT_CODE_SUCCESS
+        return self.swap_typed_table(state)
+
+    def swap_typed_table(self, state):
+        """Renames nasa_daily to the legacy table and the typed table to
+        nasa_daily, recording the first rename so a retry resumes."""
+        storage_cfg = self.config.get('typed_storage', {})
+        typed_table = storage_cfg.get('table', 'nasa_daily_typed')
+        legacy_table = storage_cfg.get('legacy_table', 'nasa_daily_text')
+        if not state['legacy_renamed']:
+            _, code = submit_hive_query(rename_table_hql(
+                'nasa_daily', legacy_table))
+            if code != EXIT_CODE_SUCCESS:
+                return code
+            state['legacy_renamed'] = True
+            save_migration_state(storage_cfg['state_file'], state)
+        _, code = submit_hive_query(rename_table_hql(typed_table,
+                                                     'nasa_daily'))
+        if code != EXIT_CODE_SUCCESS:
+            write_info('Migrate - nasa_daily is renamed to {0}, run migrate '
+                       'again to finish the swap'.format(legacy_table))
+            return code
+        state['swapped'] = True
+        save_migration_state(storage_cfg['state_file'], state)
+        write_info('Migrate - nasa_daily is now typed ORC (text table kept '
+                   'as {0}), step 5 loads typed values'.format(legacy_table))
+        return EXIT_CODE_SUCCESS
+
+    def build_session_settings(self):
+        """Returns the SET statements injected before the load query."""
+        settings = self.load_settings_file('skew_settings_file')
+        settings.extend(settings_to_hql(self.compute_tuning()))
+        # Applied last so the measured codec overrides the tuning tiers.
+        settings.extend(self.load_settings_file('codec_settings_file'))
+        return '\n          '.join(settings)
+
+    def load_settings_file(self, config_key):
+        """Returns the "set" list of a json file named in the config."""
+        file_name = self.config.get(config_key)
+        if not file_name:
+            return []
+        file_path = os.path.join(self.script_dir, CFG_DIR, file_name)
+        if not os.path.exists(file_path):
+            write_info('Settings {0} not found'.format(file_path))
+            return []
+        return list(load_json_configuration(file_path)['set'])
+
+    def get_staged_input_size(self, source):
+        """Returns the staged input size from the local file or hdfs."""
+        if source == 'hdfs' and not self.dry_run:
+            size = hdfs_du(self.get_staging_dir_for_date())
+            if size is not None:
+                return size
+        local_file = self.get_local_file()
+        if self.sample_fraction:
+            local_file = self.get_sample_file()
+        if os.path.exists(local_file):
+            return os.stat(local_file).st_size
+        return 0
+
+    def compute_tuning(self):
+        """Computes and logs the Hive settings for the input size."""
+        rules = self.config.get('tuning', {})
+        if not rules.get('enabled'):
+            return []
+        input_bytes = self.get_staged_input_size(
+            rules.get('size_source', 'local'))
+        self.tuning_settings = compute_tuning_settings(input_bytes, rules)
+        write_info('Tuning for {0} input bytes:'.format(input_bytes))
+        for name, value in self.tuning_settings:
+            write_info('  {0}={1}'.format(name, value))
+        return self.tuning_settings
+
+    def get_statistics_config(self):
+        """Returns the statistics section of the job configuration."""
+        return self.config.get('statistics', {})
+
+    def step_07_compute_statistics(self):
+        """Execute step 07 - Compute stats for the loaded partition."""
+        stats_cfg = self.get_statistics_config()
+        if not stats_cfg.get('enabled'):
+            write_info('Step 7 - Statistics disabled, skipping')
+            return [], EXIT_CODE_SUCCESS
+        if stats_cfg.get('same_session'):
+            write_info('Step 7 - Statistics computed by step 5')
+            return [], EXIT_CODE_SUCCESS
+        db_name = stats_cfg.get('database', 'default')
+        for_columns = stats_cfg.get('for_columns', False)
+        partition_spec = 'PARTITION(dt_date = "{0}")'.format(
+            self.get_partition_date())
+        if not self.dry_run and partition_stats_current(
+                db_name, self.daily_table, partition_spec, for_columns):
+            write_info('Step 7 - Statistics are current for {0}'.format(
+                partition_spec))
+            return [], EXIT_CODE_SUCCESS
+        write_info('Step 7 - Compute statistics for {0}'.format(
+            partition_spec))
+        return analyze_table(db_name, self.daily_table, partition_spec,
+                             for_columns, debug_mode=self.dry_run)
+
+    def build_ingest_collectors(self):
+        """Returns {name: collector} fed by the local ingest pass."""
+        collectors = dict()
+        if self.sample_fraction:
+            # Development runs only build the sample.
+            if not self.dry_run:
+                collectors['sample'] = LineSampler(
+                    self.get_sample_file(), self.sample_fraction)
+            return collectors
+        if self.config.get('rollups', {}).get('enabled'):
+            collectors['rollups'] = DailyRollups()
+        sketches_cfg = self.config.get('sketches', {})
+        if sketches_cfg.get('enabled'):
+            collectors['sketches'] = ColumnSketches(
+                sketches_cfg.get('columns', ['host', 'page_url']),
+                sketches_cfg.get('precision', 14))
+        sessions_cfg = self.config.get('sessions', {})
+        if sessions_cfg.get('enabled') and not self.dry_run:
+            collectors['sessions'] = Sessionizer(
+                self.get_sessions_file(),
+                int(sessions_cfg.get('gap_minutes', 30) * 60),
+                sessions_cfg.get('max_open_sessions', 100000))
+        bloom_cfg = self.config.get('bloom_filters', {})
+        if bloom_cfg.get('enabled') and not self.dry_run:
+            collectors['bloom'] = HostUrlBloom(
+                bloom_cfg.get('max_keys', BLOOM_MAX_KEYS),
+                bloom_cfg.get('fp_rate', 0.01))
+        return collectors
+
+    def local_ingest_pass(self):
+        """Streams the local input file once feeding the collectors."""
+        collectors = self.build_ingest_collectors()
+        if not collectors:
+            return [], EXIT_CODE_SUCCESS
+        local_file = self.get_local_file()
+        write_info('Local ingest pass over {0} ({1})'.format(
+            local_file, ', '.join(sorted(collectors))))
+        if self.dry_run:
+            return [], EXIT_CODE_SUCCESS
+        try:
+            for line, record in read_nasa_records(local_file):
+                for collector in collectors.values():
+                    collector.add(line, record)
+        except IOError as error:
+            write_info('Local ingest pass failed: {0}'.format(error))
+            return [], EXIT_CODE_FAILURE
+        finally:
+            if 'sample' in collectors:
+                collectors['sample'].close()
+            if 'sessions' in collectors:
+                collectors['sessions'].close()
+        self.ingest_results = collectors
+        return [], EXIT_CODE_SUCCESS
+
+    def report_sample_estimate(self):
+        """Reports the full run row count and the sample scale ratio."""
+        sampler = self.ingest_results.get('sample')
+        if sampler is None:
+            return
+        write_info('Sample {0}: kept {1} of {2} input lines'.format(
+            self.sample_fraction, sampler.kept, sampler.rows))
+        ratio = sampler.scale_ratio()
+        write_info('Full run rows for {0}: {1} (sample counts scale by '
+                   '{2})'.format(self.get_partition_date(), sampler.rows,
+                                 'n/a' if ratio is None
+                                 else '{0:.2f}'.format(ratio)))
+
+    def step_08_load_daily_rollups(self):
+        """Execute step 08 - Load the rollups computed during ingest."""
+        rollups_cfg = self.config.get('rollups', {})
+        if not rollups_cfg.get('enabled') or self.sample_fraction:
+            return [], EXIT_CODE_SUCCESS
+        ctx = dict()
+        ctx['dt_date'] = self.get_partition_date()
+        output_dir = os.path.join(rollups_cfg['local_dir'], ctx['dt_date'])
+        write_info('Step 8 - Load daily rollups for {0}'.format(
+            ctx['dt_date']))
+        if 'rollups' in self.ingest_results:
+            files = self.ingest_results['rollups'].write(output_dir)
+        else:
+            files = dict((x, os.path.join(output_dir, x + '.tsv'))
+                         for x in DailyRollups.TABLES)
+        statements = []
+        for table_name in sorted(DailyRollups.TABLES):
+            ctx['table_name'] = table_name
+            ctx['columns'] = DailyRollups.TABLES[table_name]
+            ctx['local_file'] = files[table_name]
+            statements.append(resolve_template("""
+          CREATE TABLE IF NOT EXISTS {table_name} ({columns})
+          PARTITIONED BY (dt_date STRING)
+          ROW FORMAT DELIMITED
+          FIELDS TERMINATED BY '\\t'
+          STORED AS TEXTFILE;
+
+          LOAD DATA LOCAL INPATH '{local_file}'
+          OVERWRITE INTO TABLE {table_name}
+          PARTITION(dt_date = "{dt_date}");
+            """, ctx))
+        return submit_hive_query('\n'.join(statements), dry_run=self.dry_run)
+
+    def get_sessions_file(self):
+        """Returns the local tsv of the sessions of the processed date."""
+        return os.path.join(
+            self.config.get('sessions', {}).get('local_dir',
+                                                '/tmp/nasa_sessions'),
+            self.get_partition_date(), 'nasa_sessions.tsv')
+
+    def step_09_load_sessions(self):
+        """Execute step 09 - Load the sessions built during ingest."""
+        if (not self.config.get('sessions', {}).get('enabled') or
+                self.sample_fraction):
+            return [], EXIT_CODE_SUCCESS
+        ctx = dict()
+        ctx['dt_date'] = self.get_partition_date()
+        ctx['columns'] = SESSION_COLUMNS
+        ctx['local_file'] = self.get_sessions_file()
+        write_info('Step 9 - Load nasa_sessions for {0}'.format(
+            ctx['dt_date']))
+        return submit_hive_query(resolve_template("""
+          CREATE TABLE IF NOT EXISTS nasa_sessions ({columns})
+          PARTITIONED BY (dt_date STRING)
+          ROW FORMAT DELIMITED
+          FIELDS TERMINATED BY '\\t'
+          STORED AS TEXTFILE;
+
+          LOAD DATA LOCAL INPATH '{local_file}'
+          OVERWRITE INTO TABLE nasa_sessions
+          PARTITION(dt_date = "{dt_date}");
+        """, ctx), dry_run=self.dry_run)
+
+    def step_10_store_partition_sketches(self):
+        """Execute step 10 - Store the HLL sketches next to the partition."""
+        sketches_cfg = self.config.get('sketches', {})
+        if not sketches_cfg.get('enabled') or self.sample_fraction:
+            return [], EXIT_CODE_SUCCESS
+        dt_date = self.get_partition_date()
+        local_dir = os.path.join(sketches_cfg['local_dir'], dt_date)
+        local_file = os.path.join(local_dir, SKETCH_FILE)
+        partition_dir = self.get_partition_location()
+        write_info('Step 10 - Store sketches into {0}'.format(partition_dir))
+        if self.dry_run:
+            write_plain('> hdfs dfs -put -f {0} {1}/\n'.format(
+                local_file, partition_dir))
+            return [], EXIT_CODE_SUCCESS
+        if not os.path.exists(local_dir):
+            os.makedirs(local_dir)
+        sketches = self.ingest_results['sketches']
+        write_tsv(local_file, [x.split('\t') for x in sketches.to_lines(dt_date)])
+        return self.get_hdfs_client().put([local_file], partition_dir)
+
+    def step_11_store_partition_bloom(self):
+        """Execute step 11 - Store the bloom filter next to the partition."""
+        bloom_cfg = self.config.get('bloom_filters', {})
+        if not bloom_cfg.get('enabled') or self.sample_fraction:
+            return [], EXIT_CODE_SUCCESS
+        dt_date = self.get_partition_date()
+        local_dir = os.path.join(bloom_cfg['local_dir'], dt_date)
+        local_file = os.path.join(local_dir, BLOOM_FILE)
+        partition_dir = self.get_partition_location()
+        write_info('Step 11 - Store bloom filter into {0}'.format(
+            partition_dir))
+        if self.dry_run:
+            write_plain('> hdfs dfs -put -f {0} {1}/\n'.format(
+                local_file, partition_dir))
+            return [], EXIT_CODE_SUCCESS
+        if not os.path.exists(local_dir):
+            os.makedirs(local_dir)
+        bloom = self.ingest_results['bloom']
+        if bloom.distinct_keys() > bloom.max_keys:
+            write_info('Step 11 - {0} distinct keys exceed max_keys {1}, the '
+                       'false positive rate is above {2}'.format(
+                           bloom.distinct_keys(), bloom.max_keys,
+                           bloom.fp_rate))
+        write_txt_file(local_file, bloom.to_line(dt_date) + '\n')
+        return self.get_hdfs_client().put([local_file], partition_dir)
+
+    def get_date_range(self):
+        """Returns the list of dt_date values from --from_date to --to_date
+        or None (after reporting it) when the range is not valid."""
+        bounds = []
+        for name in ('--from_date', '--to_date'):
+            value = evaluate_date(self.arguments[name] or
+                                  self.arguments['--from_date'])
+            try:
+                bounds.append(datetime.strptime(value, '%Y-%m-%d'))
+            except ValueError:
+                write_error('{0} must be a yyyy-mm-dd date, got {1}'.format(
+                    name, value))
+                return None
+        if bounds[1] < bounds[0]:
+            write_error('--to_date is before --from_date')
+            return None
+        dates = [bounds[0].strftime('%Y-%m-%d')]
+        for _ in range((bounds[1] - bounds[0]).days):
+            dates.append(evaluate_relative_date(dates[-1], 1))
+        return dates
+
+    def lookup_host_url(self):
+        """Finds the days a host and/or page_url appear in the daily table."""
+        host = self.arguments['--host']
+        page_url = self.arguments['--page_url']
+        if host is None and page_url is None:
+            write_info('lookup needs --host and/or --page_url')
+            return EXIT_CODE_FAILURE
+        dates = self.get_date_range()
+        if dates is None:
+            return EXIT_CODE_FAILURE
+        pattern = '{0}/{1}'.format(self.get_partition_location(
+            '{' + ','.join(dates) + '}'), BLOOM_FILE)
+        lines, _ = hdfs_cat(pattern)
+        covered = set(x.split('\t', 1)[0] for x in lines)
+        candidates = bloom_candidate_dates(lines, host_url_key(host, page_url))
+        # Days without a bloom filter must be checked by Hive.
+        candidates.extend(x for x in dates if x not in covered)
+        write_info('Bloom filters: {0} of {1} days are candidates'.format(
+            len(candidates), len(dates)))
+        if not candidates:
+            return EXIT_CODE_SUCCESS
+        conditions = []
+        for column, value in (('host', host), ('page_url', page_url)):
+            if value is not None:
+                conditions.append('{0} = {1}'.format(
+                    column, hive_string(value)))
+        ctx = dict()
+        ctx['daily_table'] = self.daily_table
+        ctx['dates'] = ', '.join("'{0}'".format(x) for x in sorted(candidates))
+        ctx['conditions'] = ' AND '.join(conditions)
+        cmd_tpl = """
+          SELECT dt_date, count(*) AS requests
+          FROM {daily_table}
+          WHERE dt_date IN ({dates}) AND {conditions}
+          GROUP BY dt_date
+          ORDER BY dt_date;
+        """
+        results, code = hive_query_template(cmd_tpl, ctx, capture=True)
+        for line in results:
+            if line.strip():
+                write_plain(line + '\n')
+        return code
+
+    def validate_input(self):
+        """Parses the local input file in parallel and reports bad lines."""
+        local_file = self.get_local_file()
+        if not os.path.exists(local_file):
+            write_info('Input file {0} not found'.format(local_file))
+            return EXIT_CODE_FAILURE
+        processes = self.arguments['--processes']
+        start = time.time()
+        rows, malformed = validate_nasa_file(
+            local_file, int(processes) if processes else None)
+        write_plain('{0}: {1} rows, {2} malformed ({3:.3%}) in {4:.2f}s\n'
+                    .format(local_file, rows, malformed,
+                            float(malformed) / max(rows, 1),
+                            time.time() - start))
+        return EXIT_CODE_SUCCESS
+
+    def count_distinct(self):
+        """Approximate count(DISTINCT column) over a dt_date range."""
+        column = self.arguments['--column']
+        dates = self.get_date_range()
+        if dates is None:
+            return EXIT_CODE_FAILURE
+        pattern = '{0}/{1}'.format(self.get_partition_location(
+            '{' + ','.join(dates) + '}'), SKETCH_FILE)
+        # Days without sketches are reported by the partition count.
+        lines, _ = hdfs_cat(pattern)
+        from_date, to_date = dates[0], dates[-1]
+        merged, dates = merge_sketch_lines(lines, column, from_date, to_date)
+        if merged is None:
+            write_info('No {0} sketches between {1} and {2}'.format(
+                column, from_date, to_date))
+            return EXIT_CODE_FAILURE
+        write_plain('Partitions: {0} ({1} .. {2})\n'.format(
+            len(dates), dates[0], dates[-1]))
+        write_plain('Approximate distinct {0}: {1} (+/- {2:.2%}, 1 sigma)\n'
+                    .format(column, merged.count(), merged.error_bound()))
+        return EXIT_CODE_SUCCESS
+
+    def etl_steps(self):
+        """Returns the [(name, method)] of the etl in execution order."""
+        return [
+            ('step_01_prepare_input_dir', self.step_01_prepare_input_dir),
+            ('local_ingest_pass', self.local_ingest_pass),
+            ('step_02_load_hdfs_file', self.step_02_load_hdfs_file),
+            ('step_03_update_load_table', self.step_03_update_load_table),
+            ('step_04_show_current_partitions',
+             self.step_04_show_current_partitions),
+            ('step_05_load_into_nasa_daily',
+             self.step_05_load_into_nasa_daily),
+            ('step_06_update_summary_tables',
+             self.step_06_update_summary_tables),
+            ('step_07_compute_statistics', self.step_07_compute_statistics),
+            ('step_08_load_daily_rollups', self.step_08_load_daily_rollups),
+            ('step_09_load_sessions', self.step_09_load_sessions),
+            ('step_10_store_partition_sketches',
+             self.step_10_store_partition_sketches),
+            ('step_11_store_partition_bloom',
+             self.step_11_store_partition_bloom),
+        ]
+
+    def open_history(self):
+        """Returns the run history store or None when disabled."""
+        history_cfg = self.config.get('history', {})
+        if self.dry_run or not history_cfg.get('enabled'):
+            return None
+        return RunHistory(history_cfg['db_file'])
+
+    def measure_step_sizes(self, step_name):
+        """Returns the (input, output) bytes recorded for a step."""
+        input_bytes, output_bytes = None, None
+        if step_name in STEPS_READING_INPUT:
+            input_bytes = self.get_staged_input_size('local')
+        if (step_name == 'step_05_load_into_nasa_daily' and
+                self.config.get('history', {}).get('measure_output')):
+            output_bytes = hdfs_du(self.get_partition_location())
+        return input_bytes, output_bytes
+
+    def execute_etl(self):
+        """Execute the etl steps and handle dry_runs."""
+        history = self.open_history()
+        if history:
+            write_info('Run id {0}'.format(history.start_run(
+                self.daily_table, self.get_partition_date())))
+        code = EXIT_CODE_SUCCESS
+        for step_name, step in self.etl_steps():
+            started = time.time()
+            with HiveCounterCapture() as capture:
+                _, code = step()
+            if capture.queries:
+                self.step_counters[step_name] = capture.totals()
+            if history:
+                input_bytes, output_bytes = self.measure_step_sizes(step_name)
+                history.record_step(step_name, started, code, input_bytes,
+                                    output_bytes,
+                                    self.step_counters.get(step_name))
+            if code != EXIT_CODE_SUCCESS:
+                break
+        if self.hdfs_client:
+            self.hdfs_client.close()
+        if history:
+            history.finish_run(code)
+        if code == EXIT_CODE_SUCCESS:
+            self.report_sample_estimate()
+        self.report_step_counters()
         # Always return the error code.
         return code
 
+    def report_step_counters(self):
+        """Prints the hadoop counters of the steps, most hdfs bytes first.
+
+        nocnt is the number of queries that ran a job without counters.
+        """
+        steps = sorted([x for x in self.step_counters.items()
+                        if x[1]['stages'] or x[1].get('uncounted')],
+                       key=lambda x: -(x[1]['hdfs_read'] +
+                                       x[1]['hdfs_write']))
+        if not steps:
+            return
+        write_plain('{0:<34} {1:>7} {2:>6} {3:>6} {4:>10} {5:>10} '
+                    '{6:>9} {7:>5}\n'.format('step', 'queries', 'maps',
+                                             'reds', 'hdfs_read',
+                                             'hdfs_write', 'cpu', 'nocnt'))
+        for step_name, counters in steps:
+            write_plain('{0:<34} {1:>7} {2:>6} {3:>6} {4:>10} {5:>10} '
+                        '{6:>9} {7:>5}\n'.format(
+                            step_name, counters['queries'],
+                            counters['mappers'], counters['reducers'],
+                            format_mb(counters['hdfs_read']),
+                            format_mb(counters['hdfs_write']),
+                            format_seconds(counters['cpu_ms'] / 1000.0),
+                            counters.get('uncounted', 0)))
+
+    def show_history(self):
+        """Prints per step percentiles, outliers and size correlation."""
+        history_cfg = self.config.get('history', {})
+        if not os.path.exists(history_cfg.get('db_file', '')):
+            write_info('No run history found')
+            return EXIT_CODE_FAILURE
+        since = None
+        if self.arguments['--since']:
+            since = time.mktime(datetime.strptime(
+                self.arguments['--since'], '%Y-%m-%d').timetuple())
+        sigma = float(self.arguments['--sigma'])
+        history = RunHistory(history_cfg['db_file'])
+        report = history.step_report(self.arguments['--step'], since, sigma)
+        write_plain('{0:<34} {1:>5} {2:>5} {3:>9} {4:>9} {5:>9} {6:>9} '
+                    '{7:>6}\n'.format('step', 'runs', 'fail', 'p50', 'p90',
+                                      'p99', 'std', 'corr'))
+        for item in report:
+            corr = item['size_correlation']
+            write_plain('{0:<34} {1:>5} {2:>5} {3:>9} {4:>9} {5:>9} '
+                        '{6:>9.2f} {7:>6}\n'.format(
+                            item['step'], item['runs'], item['failures'],
+                            format_seconds(item['p50']),
+                            format_seconds(item['p90']),
+                            format_seconds(item['p99']), item['std'],
+                            '-' if corr is None else '{0:.2f}'.format(corr)))
+        for item in report:
+            for run_id, dt_date, duration in item['outliers']:
+                write_plain('SLOW {0} run {1} ({2}): {3:.2f}s > {4:.2f}s + '
+                            '{5} * {6:.2f}s\n'.format(
+                                item['step'], run_id, dt_date, duration,
+                                item['mean'], sigma, item['std']))
+        counters = history.counter_report(self.arguments['--step'], since)
+        if counters:
+            write_plain('\n{0:<34} {1:>5} {2:>10} {3:>10} {4:>9}\n'.format(
+                'step (mean hive counters)', 'runs', 'hdfs_read',
+                'hdfs_write', 'cpu'))
+        for item in counters:
+            write_plain('{0:<34} {1:>5} {2:>10} {3:>10} {4:>9}\n'.format(
+                item['step'], item['runs'], format_mb(item['hdfs_read']),
+                format_mb(item['hdfs_write']),
+                format_seconds(item['cpu_ms'] / 1000.0)))
+        return EXIT_CODE_SUCCESS
+
+    def find_small_file_partitions(self, location):
+        """Returns (all partitions, partitions below the size threshold)."""
+        compact_cfg = self.config.get('compaction', {})
+        small_bytes = compact_cfg.get('small_file_mb', 64) * 1024 * 1024
+        entries, code = hdfs_file_counts(location.rstrip('/'))
+        if code != EXIT_CODE_SUCCESS:
+            return None, None
+        entries = [x for x in entries if x['file_count']]
+        candidates = [
+            x for x in entries
+            if x['file_count'] > 1 and
+            x['size'] // x['file_count'] < small_bytes]
+        return entries, candidates
+
+    def save_sidecars(self, partitions, local_root):
+        """Copies the sidecar files of the partitions to a local dir.
+
+        Returns [(local file, partition dir)] or None on failure.
+        """
+        saved = []
+        for entry in partitions:
+            for hdfs_file in entry['hidden_files']:
+                name = hdfs_file.rsplit('/', 1)[-1]
+                if name not in SIDECAR_FILES:
+                    continue
+                lines, code = hdfs_cat(hdfs_file)
+                if code != EXIT_CODE_SUCCESS:
+                    return None
+                local_dir = os.path.join(local_root, str(len(saved)))
+                os.makedirs(local_dir)
+                local_file = os.path.join(local_dir, name)
+                write_txt_file(local_file, ''.join(x + '\n' for x in lines))
+                saved.append((local_file, entry['path']))
+        return saved
+
+    def restore_sidecars(self, saved):
+        """Puts the saved sidecar files back into their partitions."""
+        code = EXIT_CODE_SUCCESS
+        for local_file, partition_dir in saved:
+            _, put_code = self.get_hdfs_client().put([local_file],
+                                                     partition_dir)
+            if put_code != EXIT_CODE_SUCCESS:
+                code = put_code
+        return code
+
+    def copy_sidecars(self, source_dir, target_dir):
+        """Copies the sidecar files of a partition into another one."""
+        entries, code = hdfs_file_counts(source_dir)
+        if code != EXIT_CODE_SUCCESS:
+            return code
+        local_root = tempfile.mkdtemp(prefix='nasa_sidecars_')
+        try:
+            saved = self.save_sidecars(
+                [dict(x, path=target_dir) for x in entries], local_root)
+            if saved is None:
+                return EXIT_CODE_FAILURE
+            return self.restore_sidecars(saved)
+        finally:
+            shutil.rmtree(local_root, ignore_errors=True)
+
+    def compact_table(self):
+        """Rewrites the small file partitions of a table into big files."""
+        compact_cfg = self.config.get('compaction', {})
+        db_name = compact_cfg.get('database', 'default')
+        table_name = self.arguments['--table']
+        target_bytes = compact_cfg.get('target_file_mb', 256) * 1024 * 1024
+        write_info('Compact - Inspecting {0}.{1}'.format(db_name, table_name))
+        lines, code = describe_formatted(db_name, table_name)
+        if code != EXIT_CODE_SUCCESS:
+            return code
+        location = parse_describe_value(lines, 'Location:')
+        input_format = parse_describe_value(lines, 'InputFormat:')
+        columns = [x[0] for x in parse_describe_columns(lines)]
+        before, candidates = self.find_small_file_partitions(location)
+        if before is None:
+            return EXIT_CODE_FAILURE
+        write_plain('--- Partitions to compact ({0} of {1}) ---\n'.format(
+            len(candidates), len(before)))
+        for entry in candidates:
+            write_plain('{0}  files={1}  avg_size={2}\n'.format(
+                entry['path'], entry['file_count'],
+                entry['size'] // entry['file_count']))
+        if not candidates or self.arguments['--report_only']:
+            return EXIT_CODE_SUCCESS
+        ctx = dict()
+        ctx['target_bytes'] = target_bytes
+        ctx['job_name'] = self.make_job_title('Compact ' + table_name)
+        statements = [resolve_template("""
+          SET mapred.job.name={job_name};
+          SET hive.merge.mapfiles=true;
+          SET hive.merge.mapredfiles=true;
+          SET hive.merge.tezfiles=true;
+          SET hive.merge.size.per.task={target_bytes};
+          SET hive.merge.smallfiles.avgsize={target_bytes};
+          SET mapreduce.input.fileinputformat.split.minsize={target_bytes};
+        """, ctx)]
+        # ORC and RCFile can merge stripes/blocks without decoding rows.
+        can_concatenate = ('OrcInputFormat' in input_format or
+                           'RCFileInputFormat' in input_format)
+        for entry in candidates:
+            ctx['table'] = '{0}.{1}'.format(db_name, table_name)
+            ctx['partition'] = partition_spec_from_path(entry['path'])
+            ctx['columns'] = ', '.join(columns)
+            ctx['where'] = ' AND '.join(
+                '{0} = "{1}"'.format(key, value)
+                for key, value in partition_pairs_from_path(entry['path']))
+            if can_concatenate:
+                cmd_tpl = "ALTER TABLE {table} {partition} CONCATENATE;"
+            else:
+                cmd_tpl = """
+          INSERT OVERWRITE TABLE {table} {partition}
+            SELECT {columns} FROM {table} WHERE {where};"""
+            statements.append(resolve_template(cmd_tpl, ctx))
+        # INSERT OVERWRITE replaces the whole partition directory.
+        local_root = tempfile.mkdtemp(prefix='nasa_compact_')
+        try:
+            saved = self.save_sidecars(candidates, local_root)
+            if saved is None:
+                return EXIT_CODE_FAILURE
+            _, code = submit_hive_query('\n'.join(statements))
+            # Put back even when a rewrite failed halfway.
+            restore_code = self.restore_sidecars(saved)
+        finally:
+            shutil.rmtree(local_root)
+        if code != EXIT_CODE_SUCCESS:
+            return code
+        if restore_code != EXIT_CODE_SUCCESS:
+            write_info('Compact - Failed to restore the partition sidecars')
+            return restore_code
+        after, _ = self.find_small_file_partitions(location)
+        after_files = dict((x['path'], x['file_count']) for x in after or [])
+        write_plain('--- Compaction results ---\n')
+        for entry in candidates:
+            write_plain('{0}  files {1} -> {2}\n'.format(
+                entry['path'], entry['file_count'],
+                after_files.get(entry['path'], '?')))
+        write_info('Compact - Files {0} -> {1}'.format(
+            sum(x['file_count'] for x in before),
+            sum(after_files.values())))
+        return EXIT_CODE_SUCCESS
+
     def describe_steps(self):
         """Just list the steps about the ETL."""
         write_plain("Job Steps {0} \n\n".format(self.etl_prefix_name))
         write_plain("\t01 - Prepare stating dir \n")
+        write_plain("\t-- - Local ingest pass over the input file\n")
         write_plain("\t02 - Load hdfs file \n")
         write_plain("\t03 - Update stage table to point to new dir\n")
         write_plain("\t04 - Show partitions nasa_daily\n")
         write_plain("\t05 - Insert data into nasa_daily table\n")
+        write_plain("\t06 - Update the summary tables partition\n")
+        write_plain("\t07 - Compute statistics for the new partition\n")
+        write_plain("\t08 - Load daily rollup tables\n")
+        write_plain("\t09 - Load the per host sessions\n")
+        write_plain("\t10 - Store distinct count sketches\n")
+        write_plain("\t11 - Store host/page_url bloom filter\n")
         write_plain("\nEnd \n")
         return EXIT_CODE_SUCCESS
 
@@ -258,13 +1385,56 @@ class ETLNasaJob(object):
         write_plain("Tested!\n")
         return EXIT_CODE_SUCCESS
 
+    def execute_queued(self):
+        """Runs the etl through the host run queue (dedup + concurrency)."""
+        queue_cfg = self.config.get('run_queue', {})
+        if self.dry_run or not queue_cfg.get('enabled'):
+            return self.execute_etl()
+        run_queue = RunQueue(queue_cfg['dir'],
+                             queue_cfg.get('max_concurrency', 2),
+                             queue_cfg.get('poll_seconds', 5))
+        key = '{0}_{1}'.format(self.daily_table, self.get_date())
+        return run_queue.run(key, self.execute_etl)
+
+    def load_config(self):
+        """Loads the json configuration file given on the command line."""
+        config_file = os.path.join(self.script_dir, CFG_DIR,
+                                   self.arguments['--cfg_file'])
+        self.config = json.load(open(config_file))
+
     def execute(self):
         """Controls the execution of steps and populating exit code."""
-        if self.arguments['run'] or self.arguments['dry_run']:
-            config_file = os.path.join(self.script_dir, CFG_DIR,
-                                       self.arguments['--cfg_file'])
-            self.config = json.load(open(config_file))
-            exit_code = self.execute_etl()
+        if self.sample_fraction is not None and not (
+                0.0 < self.sample_fraction <= 1.0):
+            write_info('--sample must be in the range (0, 1]')
+            exit_code = EXIT_CODE_FAILURE
+        elif self.arguments['run'] or self.arguments['dry_run']:
+            self.load_config()
+            exit_code = self.execute_queued()
+        elif self.arguments['compact']:
+            self.load_config()
+            exit_code = self.compact_table()
+        elif self.arguments['distinct']:
+            self.load_config()
+            exit_code = self.count_distinct()
+        elif self.arguments['lookup']:
+            self.load_config()
+            exit_code = self.lookup_host_url()
+        elif self.arguments['validate']:
+            self.load_config()
+            exit_code = self.validate_input()
+        elif self.arguments['history']:
+            self.load_config()
+            exit_code = self.show_history()
+        elif self.arguments['rebuild_summaries']:
+            self.load_config()
+            exit_code = self.rebuild_summaries()
+        elif self.arguments['verify_raw']:
+            self.load_config()
+            exit_code = self.verify_raw_table()
+        elif self.arguments['migrate']:
+            self.load_config()
+            exit_code = self.migrate_storage()
         elif self.arguments['describe']:
             exit_code = self.describe_steps()
         elif self.arguments['test']:
@@ -6,6 +6,7 @@ Version : 1.12
 
 """
 from __future__ import print_function
+import gzip
 import os
 import shlex
 import sys
@@ -79,8 +80,7 @@ def read_txt_file(file_name):
     :param file_name: file name including path of the file.
     """
     with open(file_name, 'r') as handle:
-        lines = handle.readlines()
-    return [x.strip('\n') for x in lines]
+        return [x.rstrip('\n') for x in handle]
 
 
 def write_txt_file(file_name, data):
@@ -97,6 +97,74 @@ def write_txt_file(file_name, data):
             handle.write(data)
 
 
+class RotatingFileWriter(object):
+    """
+    Writes lines to text files with constant memory.
+
+    Files are optionally gzip compressed and rotated after max_bytes of
+    uncompressed data. With rotation the files are named
+    <prefix>_part0000<suffix>, otherwise <prefix><suffix>.
+    """
+
+    def __init__(self, file_prefix, suffix='.txt', compress=False,
+                 max_bytes=0):
+        self.file_prefix = file_prefix
+        self.suffix = suffix + ('.gz' if compress else '')
+        self.compress = compress
+        self.max_bytes = max_bytes
+        self.handle = None
+        self.file_names = []
+        self.rows = 0
+        self.bytes = 0
+        self.file_bytes = 0
+
+    def _next_file_name(self):
+        """Returns the name of the next file to be opened."""
+        if not self.max_bytes:
+            return self.file_prefix + self.suffix
+        return '{0}_part{1:04d}{2}'.format(
+            self.file_prefix, len(self.file_names), self.suffix)
+
+    def _open(self):
+        """Closes the current file and opens the next one."""
+        if self.handle:
+            self.handle.close()
+        file_name = self._next_file_name()
+        if self.compress:
+            self.handle = gzip.open(file_name, 'wb')
+        else:
+            self.handle = open(file_name, 'wb')
+        self.file_names.append(file_name)
+        self.file_bytes = 0
+
+    def write_line(self, line):
+        """
+        Writes one line adding the line feed.
+        :param line: The line to be written (without line feed).
+        """
+        data = (line + '\n').encode('utf-8')
+        if (self.handle is None or
+                (self.max_bytes and self.file_bytes and
+                 self.file_bytes + len(data) > self.max_bytes)):
+            self._open()
+        self.handle.write(data)
+        self.file_bytes += len(data)
+        self.bytes += len(data)
+        self.rows += 1
+
+    def close(self):
+        """Closes the writer and returns the summary of what was written."""
+        if self.handle is None:
+            self._open()
+        self.handle.close()
+        return {
+            'files': self.file_names,
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'disk_bytes': sum(os.path.getsize(x) for x in self.file_names),
+        }
+
+
 def evaluate_date(dt_date, current_date=date.today()):
     """
     Parses date macros converting Yesterday into a real date.
@@ -122,6 +190,16 @@ def execute_shell_command(command, debug=False, silent=False):
     return_code = call(command, shell=True)
     return [], return_code
 
+
+def capture_shell_command(command):
+    """
+    Executes a shell command capturing its standard output.
+    :param command: Command to be executed.
+    """
+    child = Popen(command, shell=True, stdout=PIPE, universal_newlines=True)
+    output = child.communicate()[0]
+    return output.split('\n'), child.returncode
+
 def execute_shell_command2(command, debug=False, silent=False):
     """
     Executes a shell command.
@@ -0,0 +1,197 @@
+"""
+Output compression codec measurements for nasa_daily.
+
+Every codec compresses the same sample in memory. The scan throughput
+decompresses and parses all the lines, which is what a query over a
+compressed TEXTFILE partition pays. Codecs without a Hadoop equivalent
+(lzma) are measured for reference but never recommended.
+
+A gzip file is not splittable: every nasa_daily file is read by a single
+mapper in the rollup, session and summary stages, whatever its size.
+Gzip is only recommended when allowed explicitly (files known to stay
+below the split size).
+"""
+
+# System imports.
+from __future__ import print_function
+import bz2
+import random
+import time
+import zlib
+
+try:
+    import lzma
+except ImportError:  # Python 2
+    lzma = None
+
+# Libs.
+from .nasa_utils import parse_nasa_line
+from .reader_utils import iter_lines
+
+# Version information.
+
+PROGRAM_VERSION = '1.0.0'
+
+MB = 1024.0 * 1024.0
+GZIP_CODEC = 'org.apache.hadoop.io.compress.GzipCodec'
+BZIP2_CODEC = 'org.apache.hadoop.io.compress.BZip2Codec'
+# Hadoop zlib.compress.level names of the gzip levels.
+ZLIB_LEVELS = {1: 'BEST_SPEED', 6: 'DEFAULT_COMPRESSION',
+               9: 'BEST_COMPRESSION'}
+OBJECTIVES = ('scan', 'storage', 'balanced')
+
+
+def gzip_codec(level):
+    """Returns the (compress, decompress) functions of a gzip level."""
+    def compress(data):
+        packer = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return packer.compress(data) + packer.flush()
+
+    def decompress(data):
+        return zlib.decompress(data, 31)
+    return compress, decompress
+
+
+def codec_table():
+    """Returns [(name, compress, decompress, hadoop codec, level,
+    splittable)]."""
+    codecs = [('none', lambda x: x, lambda x: x, None, None, True)]
+    for level in sorted(ZLIB_LEVELS):
+        compress, decompress = gzip_codec(level)
+        codecs.append(('gzip-{0}'.format(level), compress, decompress,
+                       GZIP_CODEC, level, False))
+    codecs.append(('bz2', bz2.compress, bz2.decompress, BZIP2_CODEC, None,
+                   True))
+    if lzma is not None:
+        codecs.append(('lzma', lzma.compress, lzma.decompress, None, None,
+                       False))
+    return codecs
+
+
+def sample_file(file_name, max_bytes):
+    """Returns up to max_bytes of whole lines of a local log file."""
+    lines, size = [], 0
+    for line in iter_lines(file_name):
+        lines.append(line)
+        size += len(line) + 1
+        if size >= max_bytes:
+            break
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def generated_sample(max_bytes, seed=0):
+    """Returns a nasa shaped log sample of about max_bytes."""
+    rng = random.Random(seed)
+    hosts = ['h{0}.example.com'.format(x) for x in range(500)] + [
+        '199.72.81.{0}'.format(x) for x in range(200)]
+    pages = ['/', '/images/NASA-logosmall.gif', '/shuttle/countdown/',
+             '/history/apollo/apollo-13/apollo-13.html',
+             '/images/KSC-logosmall.gif', '/shuttle/missions/sts-71/',
+             '/icons/menu.xbm', '/software/winvn/winvn.html']
+    lines, size, second = [], 0, 0
+    while size < max_bytes:
+        second += rng.randint(0, 2)
+        status = rng.choice(['200'] * 18 + ['304', '404'])
+        line = '{0} - - [01/Jul/1995:{1:02d}:{2:02d}:{3:02d} -0400] ' \
+               '"GET {4} HTTP/1.0" {5} {6}'.format(
+                   rng.choice(hosts[:50] if rng.random() < 0.6 else hosts),
+                   second // 3600 % 24, second // 60 % 60, second % 60,
+                   rng.choice(pages), status,
+                   rng.randint(100, 80000) if status == '200' else '-')
+        lines.append(line)
+        size += len(line) + 1
+    return ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def scan(data):
+    """Parses every line of an uncompressed sample (query emulation)."""
+    rows = 0
+    for line in data.decode('utf-8', 'replace').split('\n'):
+        if line and parse_nasa_line(line) is not None:
+            rows += 1
+    return rows
+
+
+def best_of(func, repeat):
+    """Returns (result, fastest duration) of func() over repeat calls."""
+    best, result = None, None
+    for _ in range(repeat):
+        start = time.time()
+        result = func()
+        duration = time.time() - start
+        best = duration if best is None else min(best, duration)
+    return result, max(best, 1e-9)
+
+
+def measure_codecs(data, repeat=3):
+    """Measures every codec on the sample.
+
+    Parameters
+    ----------
+    data: uncompressed sample bytes.
+    repeat: timing rounds, the fastest one is kept.
+    Returns a list of result dictionaries (MB/s of uncompressed data).
+    """
+    results = []
+    mb = len(data) / MB
+    for (name, compress, decompress, hadoop_codec, level,
+         splittable) in codec_table():
+        packed, compress_time = best_of(lambda: compress(data), repeat)
+        _, decompress_time = best_of(lambda: decompress(packed), repeat)
+        _, scan_time = best_of(lambda: scan(decompress(packed)), repeat)
+        results.append({
+            'codec': name,
+            'hadoop_codec': hadoop_codec,
+            'level': level,
+            'splittable': splittable,
+            'input_bytes': len(data),
+            'output_bytes': len(packed),
+            'ratio': len(data) / float(max(len(packed), 1)),
+            'compress_mb_s': mb / compress_time,
+            'decompress_mb_s': mb / decompress_time,
+            'scan_mb_s': mb / scan_time,
+        })
+    return results
+
+
+def recommend_codec(results, objective='balanced', allow_unsplittable=False):
+    """Returns the result to apply for the objective.
+
+    Parameters
+    ----------
+    results: output of measure_codecs.
+    objective: scan (fastest scans), storage (smallest output) or
+    balanced (best product of the normalized ratio and scan speed).
+    allow_unsplittable: also consider gzip (one mapper per file in the
+    stages reading the output).
+    """
+    candidates = [x for x in results
+                  if (x['hadoop_codec'] or x['codec'] == 'none') and
+                  (x['splittable'] or allow_unsplittable)]
+    best_ratio = max(x['ratio'] for x in candidates)
+    best_scan = max(x['scan_mb_s'] for x in candidates)
+
+    def score(result):
+        ratio = result['ratio'] / best_ratio
+        speed = result['scan_mb_s'] / best_scan
+        if objective == 'scan':
+            return speed
+        if objective == 'storage':
+            return ratio
+        return ratio * speed
+    return max(candidates, key=score)
+
+
+def codec_settings(result):
+    """Returns the SET statements applying a recommended codec."""
+    if not result['hadoop_codec']:
+        return ['SET hive.exec.compress.output=false;']
+    settings = [
+        'SET hive.exec.compress.output=true;',
+        'SET mapreduce.output.fileoutputformat.compress.codec={0};'.format(
+            result['hadoop_codec']),
+    ]
+    if result['level'] in ZLIB_LEVELS:
+        settings.append('SET zlib.compress.level={0};'.format(
+            ZLIB_LEVELS[result['level']]))
+    return settings
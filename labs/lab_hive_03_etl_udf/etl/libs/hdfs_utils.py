@@ -0,0 +1,108 @@
+"""
+HDFS utility functions.
+"""
+
+# System imports.
+from __future__ import print_function
+
+# Libs.
+from .cli_utils import capture_shell_command
+from .cli_utils import write_error
+from .cli_utils import EXIT_CODE_SUCCESS
+
+# Version information.
+
+PROGRAM_VERSION = '1.0.0'
+
+
+def parse_ls_line(line):
+    """Parses one 'hdfs dfs -ls' line into a dictionary.
+
+    Parameters
+    ----------
+    line: like '-rw-r--r--  3 hive hadoop  12345 2018-07-01 10:00 /w/t/000000_0'
+    """
+    parts = line.split(None, 7)
+    if len(parts) != 8 or not parts[4].isdigit():
+        return None
+    return {
+        'is_dir': parts[0].startswith('d'),
+        'size': int(parts[4]),
+        'path': parts[7],
+    }
+
+
+def is_hidden_file(path):
+    """True for the '_' and '.' files Hive does not read as data."""
+    return path.rstrip('/').rsplit('/', 1)[-1].startswith(('_', '.'))
+
+
+def hdfs_file_counts(path):
+    """Returns the data files per directory below an hdfs path.
+
+    Hidden files ('_SUCCESS', sidecars like '_hll_sketches.tsv') are
+    listed apart so they never count as small data files.
+
+    Parameters
+    ----------
+    path: hdfs directory, listed recursively.
+
+    Returns a list of {'path', 'file_count', 'size', 'hidden_files'} with
+    one entry per directory holding files, and the exit code.
+    """
+    results, code = capture_shell_command(
+        'hdfs dfs -ls -R "{0}"'.format(path))
+    if code != EXIT_CODE_SUCCESS:
+        write_error('Failed to list {0}'.format(path))
+        return [], code
+    entries = dict()
+    for item in (parse_ls_line(x) for x in results):
+        if not item or item['is_dir']:
+            continue
+        directory = item['path'].rsplit('/', 1)[0]
+        entry = entries.setdefault(directory, {
+            'path': directory, 'file_count': 0, 'size': 0,
+            'hidden_files': []})
+        if is_hidden_file(item['path']):
+            entry['hidden_files'].append(item['path'])
+        else:
+            entry['file_count'] += 1
+            entry['size'] += item['size']
+    return [entries[x] for x in sorted(entries)], code
+
+
+def partition_pairs_from_path(path):
+    """Returns [(key, value)] from the key=value path segments."""
+    return [tuple(x.split('=', 1)) for x in path.split('/') if '=' in x]
+
+
+def partition_spec_from_path(path):
+    """Builds PARTITION(k="v", ...) from the key=value path segments."""
+    pairs = partition_pairs_from_path(path)
+    if not pairs:
+        return ''
+    return 'PARTITION({0})'.format(', '.join(
+        '{0}="{1}"'.format(key, value) for key, value in pairs))
+
+
+def hdfs_cat(path_pattern):
+    """Returns the text lines of the hdfs files matching the pattern."""
+    results, code = capture_shell_command(
+        'hdfs dfs -cat "{0}"'.format(path_pattern))
+    if code != EXIT_CODE_SUCCESS:
+        write_error('Failed to read {0}'.format(path_pattern))
+        return [], code
+    return [x for x in results if x], code
+
+
+def hdfs_du(path):
+    """Returns the total size in bytes of an hdfs path (None on failure)."""
+    results, code = capture_shell_command('hdfs dfs -du -s "{0}"'.format(path))
+    if code != EXIT_CODE_SUCCESS:
+        write_error('Failed to get the size of {0}'.format(path))
+        return None
+    for line in results:
+        parts = line.split()
+        if parts and parts[0].isdigit():
+            return int(parts[0])
+    return None
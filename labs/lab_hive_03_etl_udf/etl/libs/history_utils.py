@@ -0,0 +1,198 @@
+"""
+Local run history stored in sqlite with per step trend reports.
+"""
+
+# System imports.
+from __future__ import print_function
+import json
+import math
+import os
+import sqlite3
+import time
+from datetime import datetime
+
+# Version information.
+
+PROGRAM_VERSION = '1.0.0'
+
+# Ignore timing jitter of steps that take a few milliseconds.
+MIN_OUTLIER_SECONDS = 1.0
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS runs (
+        run_id TEXT PRIMARY KEY,
+        job TEXT,
+        dt_date TEXT,
+        started REAL,
+        finished REAL,
+        exit_code INTEGER);
+    CREATE TABLE IF NOT EXISTS steps (
+        run_id TEXT,
+        step TEXT,
+        started REAL,
+        duration REAL,
+        exit_code INTEGER,
+        input_bytes INTEGER,
+        output_bytes INTEGER,
+        hive_counters TEXT);
+    CREATE INDEX IF NOT EXISTS steps_by_name ON steps (step, started);
+"""
+
+
+def percentile(sorted_values, fraction):
+    """Nearest rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = int(math.ceil(fraction * len(sorted_values))) - 1
+    return sorted_values[max(0, min(rank, len(sorted_values) - 1))]
+
+
+def mean_std(values):
+    """Returns the mean and the population standard deviation."""
+    if not values:
+        return 0.0, 0.0
+    mean = sum(values) / float(len(values))
+    variance = sum((x - mean) ** 2 for x in values) / float(len(values))
+    return mean, math.sqrt(variance)
+
+
+def correlation(pairs):
+    """Pearson correlation of [(x, y)], None when undefined."""
+    if len(pairs) < 2:
+        return None
+    mean_x, std_x = mean_std([x for x, _ in pairs])
+    mean_y, std_y = mean_std([y for _, y in pairs])
+    if not std_x or not std_y:
+        return None
+    covariance = sum((x - mean_x) * (y - mean_y)
+                     for x, y in pairs) / float(len(pairs))
+    return covariance / (std_x * std_y)
+
+
+class RunHistory(object):
+    """Appends job runs and their steps to a sqlite database."""
+
+    def __init__(self, db_file):
+        db_dir = os.path.dirname(db_file)
+        if db_dir and not os.path.exists(db_dir):
+            os.makedirs(db_dir)
+        self.connection = sqlite3.connect(db_file)
+        self.connection.executescript(SCHEMA)
+        columns = [x[1] for x in self.connection.execute(
+            'PRAGMA table_info(steps)')]
+        if 'hive_counters' not in columns:
+            # Databases created before the counters were recorded.
+            with self.connection:
+                self.connection.execute(
+                    'ALTER TABLE steps ADD COLUMN hive_counters TEXT')
+        self.run_id = None
+
+    def start_run(self, job, dt_date):
+        """Registers a new run and returns its id."""
+        self.run_id = '{0}_{1}'.format(
+            datetime.now().strftime('%Y%m%d%H%M%S%f'), os.getpid())
+        with self.connection:
+            self.connection.execute(
+                'INSERT INTO runs VALUES (?, ?, ?, ?, NULL, NULL)',
+                (self.run_id, job, dt_date, time.time()))
+        return self.run_id
+
+    def record_step(self, step, started, exit_code, input_bytes=None,
+                    output_bytes=None, hive_counters=None):
+        """Appends one finished step of the current run."""
+        with self.connection:
+            self.connection.execute(
+                'INSERT INTO steps VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (self.run_id, step, started, time.time() - started,
+                 exit_code, input_bytes, output_bytes,
+                 json.dumps(hive_counters, sort_keys=True)
+                 if hive_counters else None))
+
+    def finish_run(self, exit_code):
+        """Stores the run exit code."""
+        with self.connection:
+            self.connection.execute(
+                'UPDATE runs SET finished = ?, exit_code = ? '
+                'WHERE run_id = ?', (time.time(), exit_code, self.run_id))
+
+    def step_rows(self, step=None, since=None):
+        """Returns [(step, run_id, dt_date, duration, exit_code, input)]."""
+        query = ('SELECT s.step, s.run_id, r.dt_date, s.duration, '
+                 's.exit_code, s.input_bytes FROM steps s '
+                 'JOIN runs r ON r.run_id = s.run_id WHERE 1 = 1')
+        params = []
+        if step:
+            query += ' AND s.step = ?'
+            params.append(step)
+        if since:
+            query += ' AND s.started >= ?'
+            params.append(since)
+        query += ' ORDER BY s.step, s.started'
+        return self.connection.execute(query, params).fetchall()
+
+    def step_report(self, step=None, since=None, sigma=3.0):
+        """Returns per step statistics and the outlier runs.
+
+        Parameters
+        ----------
+        step: only report this step.
+        since: epoch seconds of the oldest step to consider.
+        sigma: runs slower than mean + sigma * std are flagged.
+        """
+        by_step = dict()
+        for row in self.step_rows(step, since):
+            by_step.setdefault(row[0], []).append(row)
+        report = []
+        for name in sorted(by_step):
+            rows = [x for x in by_step[name] if x[4] == 0]
+            durations = sorted(x[3] for x in rows)
+            mean, std = mean_std(durations)
+            outliers = [x for x in rows
+                        if x[3] - mean > max(sigma * std, MIN_OUTLIER_SECONDS)]
+            report.append({
+                'step': name,
+                'runs': len(by_step[name]),
+                'failures': len(by_step[name]) - len(rows),
+                'p50': percentile(durations, 0.50),
+                'p90': percentile(durations, 0.90),
+                'p99': percentile(durations, 0.99),
+                'mean': mean,
+                'std': std,
+                'size_correlation': correlation(
+                    [(x[5], x[3]) for x in rows if x[5] is not None]),
+                'outliers': [(x[1], x[2], x[3]) for x in outliers],
+            })
+        return report
+
+    def counter_report(self, step=None, since=None):
+        """Returns the mean hive counters per step, most bytes first.
+
+        Parameters
+        ----------
+        step: only report this step.
+        since: epoch seconds of the oldest step to consider.
+        """
+        query = ('SELECT step, hive_counters FROM steps '
+                 'WHERE hive_counters IS NOT NULL AND exit_code = 0')
+        params = []
+        if step:
+            query += ' AND step = ?'
+            params.append(step)
+        if since:
+            query += ' AND started >= ?'
+            params.append(since)
+        by_step = dict()
+        for name, counters in self.connection.execute(query, params):
+            counters = json.loads(counters)
+            if counters.get('stages'):
+                by_step.setdefault(name, []).append(counters)
+        report = []
+        for name, runs in by_step.items():
+            item = {'step': name, 'runs': len(runs)}
+            for key in ('hdfs_read', 'hdfs_write', 'cpu_ms', 'mappers',
+                        'reducers'):
+                item[key] = sum(x.get(key, 0) for x in runs) / float(
+                    len(runs))
+            report.append(item)
+        return sorted(report, key=lambda x: -(x['hdfs_read'] +
+                                              x['hdfs_write']))
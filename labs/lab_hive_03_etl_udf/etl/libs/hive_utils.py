@@ -4,16 +4,19 @@ Hive utility functions.
 
 # System imports.
 from __future__ import print_function
+import json
 import os
 import re
+import sys
 import tempfile
+import threading
 from datetime import datetime
+from subprocess import PIPE, Popen
 
 
 # Libs.
 from .cli_utils import write_info, write_plain, AppError
-from .cli_utils import write_txt_file, write_error
-from .cli_utils import execute_shell_command
+from .cli_utils import write_error, RotatingFileWriter
 from .cli_utils import EXIT_CODE_FAILURE, EXIT_CODE_SUCCESS
 
 # Version information.
@@ -43,46 +46,292 @@ class Template(object):
         self.debug = True
 
 
-def submit_hive_query(query, dry_run=False):
+def valid_result(result_line):
+    """Return true if is a data line otherwise returns False
+
+    Parameters
+    ----------
+    result_line: Check if result is valid or error.
+    """
+    if 'WARN  - [main:] ~ HiveConf ' in result_line:
+        return False
+    if not result_line.strip():
+        return False
+    return True
+
+
+# ---- Hadoop job counters ----
+
+# "Stage-Stage-1: Map: 3  Reduce: 1   Cumulative CPU: 12.34 sec   HDFS Read:
+# 205242476 HDFS Write: 160134 SUCCESS" (older releases print "Job 0:",
+# Hive 3 adds "HDFS EC Read: 0" before the status).
+STAGE_COUNTERS_RE = re.compile(
+    r'^(?:Stage-)?(Stage-\d+|Job \d+):\s+(?:Map:\s*(\d+))?\s*'
+    r'(?:Reduce:\s*(\d+))?\s*(?:Cumulative CPU:\s*([\d.]+)\s*sec)?\s*'
+    r'HDFS Read:\s*(\d+)\s+HDFS Write:\s*(\d+)'
+    r'(?:.*?\s(SUCCESS|FAIL))?\s*$')
+TIME_TAKEN_RE = re.compile(r'^Time taken:\s*([\d.]+)\s*seconds')
+# Lines showing that a query launched a MapReduce or Tez job.
+JOB_LAUNCH_RE = re.compile(
+    r'^(?:Total jobs = \d+|Launching Job \d+|Status: Running \(|'
+    r'MapReduce Jobs Launched:)')
+# Tez prints vertices instead of stages. The task counts come from the
+# progress lines, "Map 1: 3/3	Reducer 2: 0(+1)/1" (or the in-place
+# table "Map 1 .......... container  SUCCEEDED  3  3  0  0  0  0"), and
+# with hive.tez.exec.print.summary=true the CPU and HDFS bytes from the
+# "Task Execution Summary" and "FileSystem Counters Summary" tables.
+TEZ_DAG_START_RE = re.compile(r'^Status: Running \(')
+TEZ_VERTEX = r'((?:Map|Reducer) \d+)'
+TEZ_PROGRESS_RE = re.compile(
+    r'^(?:' + TEZ_VERTEX + r': \S+/(?:\d+|-)\s*)+$')
+TEZ_PROGRESS_ITEM_RE = re.compile(TEZ_VERTEX + r': \S+/(\d+)')
+TEZ_VERTEX_STATUS_RE = re.compile(
+    '^' + TEZ_VERTEX + r' \.+\s+\S+\s+([A-Z]+)\s+(\d+)\s+\d+')
+TEZ_TASK_SUMMARY_RE = re.compile(
+    '^' + TEZ_VERTEX + r'\s+[\d,.]+\s+([\d,]+)\s+[\d,]+\s+[\d,]+'
+    r'\s+[\d,]+\s*$')
+TEZ_SCHEME_RE = re.compile(r'^Scheme:\s*(\w+)')
+TEZ_FS_SUMMARY_RE = re.compile(
+    '^' + TEZ_VERTEX + r'\s+([\d.]+[KMGTPE]?B)\s+\d+\s+\d+\s+'
+    r'([\d.]+[KMGTPE]?B)\s+\d+\s*$')
+# Prefix of the lines echoed by beeline.
+LOG_PREFIX_RE = re.compile(r'^INFO\s+:')
+# Makes Tez print the vertex counter tables (ignored by MapReduce).
+COUNTER_SETTINGS = 'SET hive.tez.exec.print.summary=true;'
+COUNTER_KEYS = ('stages', 'mappers', 'reducers', 'cpu_ms', 'hdfs_read',
+                'hdfs_write', 'time_taken')
+_COUNTER_CAPTURES = []
+
+
+def parse_byte_count(text):
+    """Returns the bytes of a Tez summary size like '47.24MB' or '0B'."""
+    units = 'KMGTPE'
+    number, unit = text[:-1], ''
+    if number and number[-1] in units:
+        number, unit = number[:-1], number[-1]
+    return int(round(float(number) * 1024 ** (units.index(unit) + 1
+                                              if unit else 0)))
+
+
+class HiveCounters(object):
+    """Hadoop job counters parsed from the output lines of one hive run."""
+
+    def __init__(self):
+        self.stages = []
+        self.time_taken = 0.0
+        self.jobs_launched = False
+        # Vertices of the running Tez DAG and the summary scheme.
+        self.vertices = dict()
+        self.scheme = None
+
+    def vertex(self, name):
+        """Returns the stage entry of a vertex of the current Tez DAG."""
+        if name not in self.vertices:
+            self.vertices[name] = {
+                'stage': name, 'mappers': 0, 'reducers': 0, 'cpu_ms': 0,
+                'hdfs_read': 0, 'hdfs_write': 0, 'status': None}
+            self.stages.append(self.vertices[name])
+        return self.vertices[name]
+
+    def set_tasks(self, name, tasks):
+        """Sets the task count of a vertex (mappers or reducers)."""
+        key = 'mappers' if name.startswith('Map') else 'reducers'
+        self.vertex(name)[key] = tasks
+
+    def feed_tez(self, line):
+        """Parses the Tez vertex lines, returns True if it was one."""
+        if TEZ_DAG_START_RE.match(line):
+            self.vertices, self.scheme = dict(), None
+            return False
+        if TEZ_PROGRESS_RE.match(line):
+            for name, tasks in TEZ_PROGRESS_ITEM_RE.findall(line):
+                self.set_tasks(name, int(tasks))
+            return True
+        match = TEZ_VERTEX_STATUS_RE.match(line)
+        if match:
+            self.set_tasks(match.group(1), int(match.group(3)))
+            self.vertex(match.group(1))['status'] = (
+                'SUCCESS' if match.group(2) == 'SUCCEEDED' else
+                'FAIL' if match.group(2) in ('FAILED', 'KILLED') else None)
+            return True
+        match = TEZ_TASK_SUMMARY_RE.match(line)
+        if match:
+            self.vertex(match.group(1))['cpu_ms'] = int(
+                match.group(2).replace(',', ''))
+            return True
+        match = TEZ_SCHEME_RE.match(line)
+        if match:
+            self.scheme = match.group(1).upper()
+            return True
+        match = TEZ_FS_SUMMARY_RE.match(line)
+        if match and self.scheme == 'HDFS':
+            stage = self.vertex(match.group(1))
+            stage['hdfs_read'] = parse_byte_count(match.group(2))
+            stage['hdfs_write'] = parse_byte_count(match.group(3))
+            return True
+        return False
+
+    def feed(self, line):
+        """Parses one stdout or stderr line."""
+        line = LOG_PREFIX_RE.sub('', line.strip()).strip()
+        if self.feed_tez(line):
+            return
+        match = STAGE_COUNTERS_RE.match(line)
+        if match:
+            self.stages.append({
+                'stage': match.group(1),
+                'mappers': int(match.group(2) or 0),
+                'reducers': int(match.group(3) or 0),
+                'cpu_ms': int(round(float(match.group(4) or 0) * 1000)),
+                'hdfs_read': int(match.group(5)),
+                'hdfs_write': int(match.group(6)),
+                'status': match.group(7),
+            })
+            return
+        match = TIME_TAKEN_RE.match(line)
+        if match:
+            self.time_taken += float(match.group(1))
+            return
+        if JOB_LAUNCH_RE.match(line):
+            self.jobs_launched = True
+
+    def missing_stages(self):
+        """Returns True if a job ran but no stage or vertex counters were
+        parsed (unknown engine output)."""
+        return self.jobs_launched and not self.stages
+
+    def as_dict(self):
+        """Returns the totals and the per stage (or vertex) counters."""
+        totals = dict((x, sum(y[x] for y in self.stages))
+                      for x in COUNTER_KEYS[1:-1])
+        totals['stages'] = len(self.stages)
+        totals['time_taken'] = round(self.time_taken, 3)
+        totals['stage_counters'] = self.stages
+        totals['uncounted'] = 1 if self.missing_stages() else 0
+        return totals
+
+
+def merge_counters(counters):
+    """Sums the counters of several queries (stage details dropped).
+
+    uncounted is the number of queries that ran a job without counters.
+    """
+    merged = dict((x, 0) for x in COUNTER_KEYS)
+    merged['uncounted'] = 0
+    for item in counters:
+        for key in COUNTER_KEYS + ('uncounted',):
+            merged[key] += item.get(key, 0)
+    merged['queries'] = len(counters)
+    merged['time_taken'] = round(merged['time_taken'], 3)
+    return merged
+
+
+class HiveCounterCapture(object):
+    """Collects the counters of every hive query run while active.
+
+    with HiveCounterCapture() as capture:
+        submit_hive_query(query)
+    capture.totals()
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __enter__(self):
+        _COUNTER_CAPTURES.append(self)
+        return self
+
+    def __exit__(self, *args):
+        _COUNTER_CAPTURES.remove(self)
+        return False
+
+    def totals(self):
+        """Returns the merged counters of the captured queries."""
+        return merge_counters(self.queries)
+
+
+def run_hive_file(file_name, on_output):
+    """Runs 'hive -f file' parsing the job counters of its output.
+
+    stderr is echoed as it arrives and stdout lines are given to
+    on_output. The counters are handed to the active captures.
+
+    Parameters
+    ----------
+    file_name: the .hql file.
+    on_output: function called with every stdout line (no newline).
+    Returns (counters dictionary, exit code).
+    """
+    counters = HiveCounters()
+    child = Popen(['hive', '-f', file_name], stdout=PIPE, stderr=PIPE,
+                  universal_newlines=True)
+
+    def pump_stderr():
+        """Echoes and parses stderr while stdout is read."""
+        for line in child.stderr:
+            sys.stderr.write(line)
+            counters.feed(line)
+    thread = threading.Thread(target=pump_stderr)
+    thread.daemon = True
+    thread.start()
+    for line in child.stdout:
+        line = line.rstrip('\n')
+        counters.feed(line)
+        on_output(line)
+    child.stdout.close()
+    return_code = child.wait()
+    thread.join()
+    child.stderr.close()
+    if counters.missing_stages():
+        write_info('No stage or vertex counters in the hive output, the '
+                   'step counters miss this query')
+    result = counters.as_dict()
+    for capture in _COUNTER_CAPTURES:
+        capture.queries.append(result)
+    return result, return_code
+
+
+def write_query_file(query):
+    """Writes the query into a temporary .hql file and returns its name.
+
+    Parameters
+    ----------
+    query: string containing the query.
+    """
+    file_desc, file_name = tempfile.mkstemp(prefix='query_', suffix='.hql')
+    tmp_file = os.fdopen(file_desc, 'w')
+    tmp_file.write(COUNTER_SETTINGS + '\n')
+    tmp_file.write(query)
+    tmp_file.write('\n')
+    tmp_file.close()
+    write_plain('Hive Query:')
+    with open(file_name) as infile:
+        write_plain(infile.read())
+    return file_name
+
+
+def submit_hive_query(query, dry_run=False, capture=False):
     """Submits a Hive query to Hadoop.
 
     Parameters
     ----------
     dry_run: If true just prints the query instead of executing it.
     query: string containing the query.
+    capture: If true returns the query output lines instead of printing.
     """
     file_name = None
-
-    def valid_result(result_line):
-        """Return true if is a data line otherwise returns False
-
-        Parameters
-        ----------
-        result_line: Check if result is valid or error.
-        """
-        if 'WARN  - [main:] ~ HiveConf ' in result_line:
-            return False
-        if not result_line.strip():
-            return False
-        return True
-
     try:
-        file_desc, file_name = tempfile.mkstemp(
-            prefix='query_', suffix='.hql')
-        tmp_file = os.fdopen(file_desc, 'w')
-        tmp_file.write(query)
-        tmp_file.write('\n')
-        tmp_file.close()
-        write_plain('Hive Query:')
-        with open(file_name) as infile:
-            write_plain(infile.read())
+        file_name = write_query_file(query)
+        results = []
         if dry_run:
-            results, return_code = [], EXIT_CODE_SUCCESS
+            return_code = EXIT_CODE_SUCCESS
+        elif capture:
+            _, return_code = run_hive_file(file_name, results.append)
         else:
-            results, return_code = execute_shell_command(
-                'hive -f ' + file_name)
+            _, return_code = run_hive_file(
+                file_name, lambda x: sys.stdout.write(x + '\n'))
         results = [x for x in results if valid_result(x)]
-    except IOError:
+    except (IOError, OSError):
         results, return_code = [], EXIT_CODE_FAILURE
     finally:
         if file_name:
@@ -90,7 +339,7 @@ def submit_hive_query(query, dry_run=False):
     return results, return_code
 
 
-def hive_query_template(query_template, ctx, debug_mode=False):
+def hive_query_template(query_template, ctx, debug_mode=False, capture=False):
     """Render Hive query template, executes it an returns result.
 
     Parameters
@@ -98,13 +347,21 @@ def hive_query_template(query_template, ctx, debug_mode=False):
     query_template: the template representing the query
     ctx: dictionary containing the data to fill template.
     debug_mode: if true just prints the commands instead of running it.
+    capture: if true returns the query output lines.
     """
     template = Template(query_template)
     query = template.render(ctx)
     if debug_mode:
         write_info(query)
         return [], 0
-    return submit_hive_query(query)
+    return submit_hive_query(query, capture=capture)
+
+
+HIVE_QUERY_TPL = """
+        SET mapred.job.name={job_name}
+        {query}
+        ;
+    """
 
 
 def hive_query(query_str, job_name, debug_mode=False):
@@ -119,23 +376,69 @@ def hive_query(query_str, job_name, debug_mode=False):
     ctx = dict()
     ctx['job_name'] = job_name
     ctx['query'] = query_str
-    query_tpl = """
-        SET mapred.job.name={job_name}
-        {query}
-        ;
-    """
-    results, code = hive_query_template(query_tpl, ctx, debug_mode)
+    results, code = hive_query_template(HIVE_QUERY_TPL, ctx, debug_mode)
     return results, code
 
 
-def capture_hive_query(query_str, file_prefix, debug_mode=False):
-    """Executes the Hive query and saves results."""
+def stream_hive_query(query, writer):
+    """Runs the query sending each valid output row to the writer.
+
+    Rows are read from the hive process one at a time so memory stays
+    constant regardless of the result size.
+
+    Parameters
+    ----------
+    query: string containing the query.
+    writer: object with a write_line method (see RotatingFileWriter).
+    """
+    file_name = None
+    try:
+        file_name = write_query_file(query)
+
+        def write_row(line):
+            """Sends a data row to the writer."""
+            if valid_result(line):
+                writer.write_line(line)
+        _, return_code = run_hive_file(file_name, write_row)
+    except (IOError, OSError) as error:
+        write_error('Failed streaming hive results: {0}'.format(error))
+        return_code = EXIT_CODE_FAILURE
+    finally:
+        if file_name:
+            os.remove(file_name)
+    return return_code
+
+
+def capture_hive_query(query_str, file_prefix, debug_mode=False,
+                       compress=False, max_file_bytes=0):
+    """Executes the Hive query and streams the results to files.
+
+    Parameters
+    ----------
+    query_str: hive query to be executed.
+    file_prefix: prefix of the output file names.
+    debug_mode: if debug mode just print the query.
+    compress: if true the output files are gzip compressed.
+    max_file_bytes: rotate output files after this many bytes (0 = never).
+    """
     now = datetime.now()
-    output_file = '{0}_{1}.txt'.format(
+    output_prefix = '{0}_{1}'.format(
         file_prefix, now.strftime("%Y%m%d_%H%M"))
-    job_name = 'Hive: File {0}'.format(output_file)
-    results, code = hive_query(query_str, job_name, debug_mode)
-    write_txt_file(output_file, results)
+    job_name = 'Hive: File {0}.txt'.format(output_prefix)
+    if debug_mode:
+        _, code = hive_query(query_str, job_name, debug_mode)
+        return code
+    ctx = dict()
+    ctx['job_name'] = job_name
+    ctx['query'] = query_str
+    query = resolve_template(HIVE_QUERY_TPL, ctx)
+    writer = RotatingFileWriter(output_prefix, compress=compress,
+                                max_bytes=max_file_bytes)
+    code = stream_hive_query(query, writer)
+    summary = writer.close()
+    write_info('Wrote {0} rows, {1} bytes ({2} on disk) into {3}'.format(
+        summary['rows'], summary['bytes'], summary['disk_bytes'],
+        ', '.join(summary['files'])))
     return code
 
 
@@ -145,27 +448,142 @@ def resolve_template(query_template, context):
     return template.render(context)
 
 
+def hive_string(value):
+    """Returns value as a single quoted Hive string literal."""
+    return "'{0}'".format(value.replace('\\', '\\\\').replace("'", "\\'"))
+
+
 # ---- Hive commands ----
 
 
-def analyze_table(db_name, table_name, partition_spec=''):
+def analyze_table(db_name, table_name, partition_spec='', for_columns=False,
+                  debug_mode=False):
     """Analyze and compute stats of a Hive table"""
     ctx = dict()
     ctx['db_name'] = db_name
     ctx['table_name'] = table_name
     ctx['partition'] = partition_spec
+    ctx['columns'] = 'FOR COLUMNS' if for_columns else ''
     query_tpl = """
         ANALYZE TABLE {db_name}.{table_name}
-           {partition} COMPUTE STATISTICS
+           {partition} COMPUTE STATISTICS {columns}
         ;
     """
-    results, code = hive_query_template(query_tpl, ctx)
+    results, code = hive_query_template(query_tpl, ctx, debug_mode)
     if code != EXIT_CODE_SUCCESS:
         write_error('Failed to analyze table {0}.'.format(
             table_name))
     return results, code
 
 
+def describe_formatted(db_name, table_name, partition_spec=''):
+    """Returns the DESCRIBE FORMATTED output lines of a table or partition.
+
+    Parameters
+    ----------
+    db_name: database containing the table.
+    table_name: the table to describe.
+    partition_spec: optional clause like PARTITION(dt_date="...").
+    """
+    ctx = dict()
+    ctx['db_name'] = db_name
+    ctx['table_name'] = table_name
+    ctx['partition'] = partition_spec
+    query_tpl = """
+        DESCRIBE FORMATTED {db_name}.{table_name} {partition}
+        ;
+    """
+    return hive_query_template(query_tpl, ctx, capture=True)
+
+
+def parse_describe_columns(describe_lines):
+    """Returns the [(name, type)] data columns from DESCRIBE FORMATTED.
+
+    Partition columns are not included.
+
+    Parameters
+    ----------
+    describe_lines: output lines of a DESCRIBE FORMATTED statement.
+    """
+    columns = []
+    for line in describe_lines:
+        text = line.strip()
+        if text.startswith('#'):
+            if columns:
+                break
+            continue
+        if not text:
+            if columns:
+                break
+            continue
+        parts = text.split()
+        if len(parts) >= 2:
+            columns.append((parts[0], parts[1]))
+    return columns
+
+
+def parse_describe_value(describe_lines, key):
+    """Returns a DESCRIBE FORMATTED value like 'Location:' or 'InputFormat:'.
+
+    Parameters
+    ----------
+    describe_lines: output lines of a DESCRIBE FORMATTED statement.
+    key: the label including the colon.
+    """
+    for line in describe_lines:
+        parts = line.strip().split()
+        if len(parts) >= 2 and parts[0] == key:
+            return parts[1]
+    return ''
+
+
+def parse_stats_accurate(describe_lines):
+    """Returns the COLUMN_STATS_ACCURATE parameter as a dictionary.
+
+    Parameters
+    ----------
+    describe_lines: output lines of a DESCRIBE FORMATTED statement.
+    """
+    for line in describe_lines:
+        parts = line.strip().split(None, 1)
+        if len(parts) < 2 or parts[0] != 'COLUMN_STATS_ACCURATE':
+            continue
+        value = parts[1].strip().replace('\\"', '"')
+        if value == 'true':
+            # Hive 1.x only tracks basic stats as a boolean flag.
+            return {'BASIC_STATS': 'true'}
+        try:
+            return json.loads(value)
+        except ValueError:
+            return {}
+    return {}
+
+
+def partition_stats_current(db_name, table_name, partition_spec,
+                            for_columns=False):
+    """Returns True if Hive considers the partition stats up to date.
+
+    Parameters
+    ----------
+    db_name: database containing the table.
+    table_name: the partitioned table.
+    partition_spec: the partition clause like PARTITION(dt_date="...").
+    for_columns: if true column stats must be accurate as well.
+    """
+    results, code = describe_formatted(db_name, table_name, partition_spec)
+    if code != EXIT_CODE_SUCCESS:
+        return False
+    accurate = parse_stats_accurate(results)
+    if accurate.get('BASIC_STATS') != 'true':
+        return False
+    if for_columns:
+        columns = accurate.get('COLUMN_STATS', {})
+        if not columns:
+            return False
+        return all(value == 'true' for value in columns.values())
+    return True
+
+
 def drop_table(db_name, table_name):
     """Drop hive table"""
     ctx = dict()
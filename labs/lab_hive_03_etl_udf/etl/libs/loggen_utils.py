@@ -0,0 +1,230 @@
+"""
+Synthetic nasa access logs for scale tests.
+
+Lines follow the format of the lab_hive_01_2 instructions:
+
+199.72.81.55 - - [01/Jul/1995:00:00:01 -0400] "GET /history/apollo/ HTTP/1.0" 200 6245
+
+Hosts and urls are drawn from fixed populations with Zipf popularity,
+every url keeps the same page size and the request times grow through
+the day, so the files look like the real logs to the ETL (skew, repeated
+pages, time ordered sessions). A day is cut into chunks of chunk_lines
+lines; each chunk has its own seeded random generator, so the output
+only depends on the seed and the options, never on the number of
+processes generating the chunks.
+
+The generators are seeded with integers (string seeds go through hash()
+on python 2, which is randomized with -R) and every draw goes through
+random(), whose sequence is the same on python 2 and 3 (choice and
+randint are not), so both versions write identical files.
+"""
+
+# System imports.
+from __future__ import print_function
+import bisect
+import hashlib
+import random
+from collections import deque
+from datetime import date
+from multiprocessing import Pool, cpu_count
+
+# Version information.
+
+PROGRAM_VERSION = '1.0.0'
+
+MONTHS = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep',
+          'Oct', 'Nov', 'Dec']
+YEAR = 1995
+SECONDS_PER_DAY = 86400
+DEFAULT_OPTIONS = {
+    'seed': 0,
+    'hosts': 20000,
+    'urls': 4000,
+    'host_skew': 1.1,
+    'url_skew': 1.3,
+    'error_rate': 0.01,
+    'not_modified_rate': 0.08,
+    'malformed_rate': 0.0001,
+    'chunk_lines': 50000,
+}
+DOMAINS = ['aol.com', 'compuserve.com', 'prodigy.com', 'netcom.com',
+           'ksc.nasa.gov', 'jsc.nasa.gov', 'ix.netcom.com', 'umich.edu',
+           'mit.edu', 'att.net', 'ibm.net', 'uni-stuttgart.de']
+DIRECTORIES = ['/', '/images/', '/shuttle/countdown/', '/shuttle/missions/',
+               '/shuttle/missions/sts-71/', '/shuttle/missions/sts-70/',
+               '/history/apollo/', '/history/apollo/apollo-13/',
+               '/software/winvn/', '/icons/', '/facilities/', '/elv/',
+               '/ksc.html/', '/htbin/', '/cgi-bin/']
+EXTENSIONS = ['.gif', '.gif', '.gif', '.html', '.html', '.jpg', '.xbm',
+              '.txt', '.mpg']
+
+_PROFILE = None
+
+
+def seeded_random(*parts):
+    """Returns a generator seeded with an integer hash of the parts."""
+    key = '-'.join(str(x) for x in parts).encode('utf-8')
+    return random.Random(int(hashlib.md5(key).hexdigest()[:16], 16))
+
+
+def pick(rng, items):
+    """Returns a random item (rng.choice differs between versions)."""
+    return items[int(rng.random() * len(items))]
+
+
+def between(rng, low, high):
+    """Returns a random integer of [low, high] (like rng.randint)."""
+    return low + int(rng.random() * (high - low + 1))
+
+
+def zipf_cdf(size, skew):
+    """Returns the cumulative Zipf(skew) weights of ranks 1..size."""
+    total, cdf = 0.0, []
+    for rank in range(1, size + 1):
+        total += 1.0 / rank ** skew
+        cdf.append(total)
+    return [x / total for x in cdf]
+
+
+class LogProfile(object):
+    """Host and url populations and rates shared by every chunk."""
+
+    def __init__(self, options):
+        self.options = dict(DEFAULT_OPTIONS)
+        self.options.update(options)
+        rng = seeded_random('profile', self.options['seed'])
+        self.hosts = [self.make_host(rng) for _ in
+                      range(self.options['hosts'])]
+        self.requests = []
+        self.sizes = []
+        for idx in range(self.options['urls']):
+            directory = pick(rng, DIRECTORIES)
+            if idx % 10 == 0:
+                url = directory
+            else:
+                url = '{0}{1}{2}'.format(
+                    directory, ''.join(pick(rng, 'abcdefghiklmnoprstuvw-')
+                                       for _ in range(between(rng, 3, 12))),
+                    pick(rng, EXTENSIONS))
+            self.requests.append('"GET {0} HTTP/1.0"'.format(url))
+            self.sizes.append(str(int(rng.lognormvariate(8.5, 1.2)) + 100))
+        self.host_cdf = zipf_cdf(len(self.hosts), self.options['host_skew'])
+        self.url_cdf = zipf_cdf(len(self.requests), self.options['url_skew'])
+
+    @staticmethod
+    def make_host(rng):
+        """Returns a host name or ip address."""
+        if rng.random() < 0.3:
+            return '{0}.{1}.{2}.{3}'.format(
+                between(rng, 128, 223), between(rng, 0, 255),
+                between(rng, 0, 255), between(rng, 1, 254))
+        return '{0}{1}.{2}'.format(pick(rng, ['ppp', 'dial', 'port', 'www',
+                                              'news', 'pm', 'slip']),
+                                   between(rng, 1, 999), pick(rng, DOMAINS))
+
+
+def day_prefix(mmdd):
+    """Returns the '01/Jul/1995' date of a MMDD day."""
+    day = date(YEAR, int(mmdd[:2]), int(mmdd[2:4]))
+    return '{0:02d}/{1}/{2}'.format(day.day, MONTHS[day.month - 1], YEAR)
+
+
+def malformed_line(rng, line):
+    """Returns a broken variant of a valid line."""
+    kind = between(rng, 0, 3)
+    if kind == 0:
+        return line[:between(rng, 1, len(line) - 10)]
+    if kind == 1:
+        return line.rsplit(' ', 2)[0]
+    if kind == 2:
+        return line.replace('[', '', 1).replace(']', '', 1)
+    return ''.join(pick(rng, 'abcdef0123456789 ./-') for _ in range(20))
+
+
+def generate_lines(profile, mmdd, start, end, total_lines):
+    """Returns the lines [start, end) of a day of total_lines lines."""
+    options = profile.options
+    rng = seeded_random(options['seed'], mmdd,
+                        start // options['chunk_lines'])
+    prefix = day_prefix(mmdd)
+    malformed = options['malformed_rate']
+    errors = malformed + options['error_rate']
+    not_modified = errors + options['not_modified_rate']
+    hosts, requests, sizes = profile.hosts, profile.requests, profile.sizes
+    host_cdf, url_cdf = profile.host_cdf, profile.url_cdf
+    last_host, last_url = len(hosts) - 1, len(requests) - 1
+    lines, second, stamp = [], None, None
+    for idx in range(start, end):
+        current = idx * SECONDS_PER_DAY // total_lines
+        if current != second:
+            second = current
+            stamp = '[{0}:{1:02d}:{2:02d}:{3:02d} -0400]'.format(
+                prefix, second // 3600, second // 60 % 60, second % 60)
+        host = hosts[min(bisect.bisect(host_cdf, rng.random()), last_host)]
+        url = min(bisect.bisect(url_cdf, rng.random()), last_url)
+        draw = rng.random()
+        if malformed <= draw < errors:
+            status, size = '404', '-'
+        elif errors <= draw < not_modified:
+            status, size = '304', '0'
+        else:
+            status, size = '200', sizes[url]
+        line = '{0} - - {1} {2} {3} {4}'.format(
+            host, stamp, requests[url], status, size)
+        if draw < malformed:
+            line = malformed_line(rng, line)
+        lines.append(line)
+    return lines
+
+
+def _init_worker(options):
+    """Builds the profile once per worker process."""
+    global _PROFILE
+    _PROFILE = LogProfile(options)
+
+
+def _generate_chunk(task):
+    """Pool task: returns the encoded lines of one chunk."""
+    mmdd, start, end, total_lines = task
+    lines = generate_lines(_PROFILE, mmdd, start, end, total_lines)
+    return mmdd, ('\n'.join(lines) + '\n').encode('utf-8')
+
+
+def estimate_lines(options, size_bytes):
+    """Returns the lines per day giving about size_bytes per file."""
+    sample = generate_lines(LogProfile(options), '0701', 0, 5000, 5000)
+    average = sum(len(x) + 1 for x in sample) / float(len(sample))
+    return max(1, int(size_bytes / average))
+
+
+def generate_days(days, lines_per_day, options, processes=None):
+    """Yields (mmdd, encoded chunk) in file order, built by a pool.
+
+    Parameters
+    ----------
+    days: list of MMDD days.
+    lines_per_day: lines of every day.
+    options: LogProfile options (see DEFAULT_OPTIONS).
+    processes: pool size, defaults to the number of cpus.
+    """
+    chunk_lines = options.get('chunk_lines', DEFAULT_OPTIONS['chunk_lines'])
+    tasks = [(mmdd, start, min(start + chunk_lines, lines_per_day),
+              lines_per_day)
+             for mmdd in days for start in range(0, lines_per_day,
+                                                 chunk_lines)]
+    processes = processes or cpu_count()
+    pool = Pool(processes, _init_worker, (options,))
+    try:
+        # A bounded window keeps the file order and the memory in check
+        # while the workers run ahead of the writer.
+        pending = deque()
+        for task in tasks:
+            pending.append(pool.apply_async(_generate_chunk, (task,)))
+            if len(pending) >= 2 * processes:
+                yield pending.popleft().get()
+        while pending:
+            yield pending.popleft().get()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
@@ -0,0 +1,189 @@
+"""
+Incremental per movie rating aggregates with heap based top-N queries.
+
+The results follow the lab_hive_01 queries over the ratings and movies
+tables: count(*) and round(avg(rating), 4) per movie_id, titles taken
+from the ':' delimited movies file the way Hive splits it. Ties are
+broken by the lowest movie_id.
+
+The snapshot keeps the byte offset folded in each batch file, so a file
+that grew since is resumed at that offset and only the appended complete
+lines are folded (a last line without line feed waits for the next add).
+"""
+
+# System imports.
+from __future__ import print_function
+import heapq
+import io
+import json
+import os
+from decimal import Decimal, ROUND_HALF_UP
+
+# Libs.
+from .reader_utils import COMPRESSED_OPENERS, iter_lines
+
+# Version information.
+
+PROGRAM_VERSION = '1.0.0'
+
+SNAPSHOT_VERSION = 2
+RANKINGS = ('count', 'avg')
+
+
+def hive_round(value, digits=4):
+    """Rounds like Hive round(double, digits) (half up on the decimal)."""
+    quantum = Decimal(1).scaleb(-digits)
+    return float(Decimal(repr(value)).quantize(quantum, ROUND_HALF_UP))
+
+
+def parse_rating_line(line):
+    """Returns (movie_id, rating) of a ratings.csv line or None."""
+    fields = line.split(',')
+    if len(fields) < 3:
+        return None
+    try:
+        return int(fields[1]), float(fields[2])
+    except ValueError:
+        return None
+
+
+def iter_new_lines(file_name, offset):
+    """Yields (line, offset after the line) of the complete lines past a
+    byte offset of a plain, gzip or bz2 file.
+
+    Parameters
+    ----------
+    file_name: the local file.
+    offset: bytes already read (of the uncompressed data).
+    """
+    opener = COMPRESSED_OPENERS.get(os.path.splitext(file_name)[1], io.open)
+    with opener(file_name, 'rb') as handle:
+        if opener is io.open:
+            handle.seek(offset)
+            skipped = min(offset, os.path.getsize(file_name))
+        else:
+            skipped = 0
+            while skipped < offset:
+                block = handle.read(min(offset - skipped, 1024 * 1024))
+                if not block:
+                    break
+                skipped += len(block)
+        if skipped < offset:
+            raise ValueError('{0} is shorter than the {1} bytes already '
+                             'folded'.format(file_name, offset))
+        for line in handle:
+            if not line.endswith(b'\n'):
+                return
+            offset += len(line)
+            yield line.decode('utf-8', 'replace').rstrip('\n'), offset
+
+
+def read_movie_titles(file_name):
+    """Returns {movie_id: title} of the ':' delimited movies file."""
+    titles = dict()
+    for line in iter_lines(file_name):
+        fields = line.split(':')
+        if len(fields) < 2:
+            continue
+        try:
+            titles[int(fields[0])] = fields[1]
+        except ValueError:
+            continue
+    return titles
+
+
+class MovieRatings(object):
+    """Running rating sums and counts per movie."""
+
+    def __init__(self):
+        self.sums = dict()
+        self.counts = dict()
+        self.titles = dict()
+        # {file name: byte offset} of the batch data already folded in.
+        self.batches = dict()
+
+    def add(self, movie_id, rating):
+        """Folds one rating."""
+        self.sums[movie_id] = self.sums.get(movie_id, 0.0) + rating
+        self.counts[movie_id] = self.counts.get(movie_id, 0) + 1
+
+    def add_file(self, file_name):
+        """Folds the lines of a ratings batch not folded yet and returns
+        the ratings added.
+
+        Parameters
+        ----------
+        file_name: csv file with the ratings.csv layout.
+        Returns None if no new line was appended to the batch. Raises
+        ValueError if the batch is shorter than the data already folded
+        (rewritten instead of appended).
+        """
+        batch_key = os.path.abspath(file_name)
+        offset = self.batches.get(batch_key, 0)
+        added, lines = 0, 0
+        for line, offset in iter_new_lines(file_name, offset):
+            lines += 1
+            parsed = parse_rating_line(line)
+            if parsed is not None:
+                self.add(*parsed)
+                added += 1
+        if not lines and batch_key in self.batches:
+            return None
+        self.batches[batch_key] = offset
+        return added
+
+    def avg_rating(self, movie_id):
+        """Returns round(avg(rating), 4) of a movie."""
+        return hive_round(self.sums[movie_id] / self.counts[movie_id])
+
+    def top(self, num=10, by='count', min_ratings=1):
+        """Returns [(movie_id, title, number_of_ratings, avg_rating)].
+
+        Parameters
+        ----------
+        num: number of movies.
+        by: 'count' (most rated) or 'avg' (best rated).
+        min_ratings: ignore movies with fewer ratings.
+        """
+        if by == 'count':
+            def sort_key(movie_id):
+                return self.counts[movie_id], -movie_id
+        else:
+            def sort_key(movie_id):
+                return self.avg_rating(movie_id), -movie_id
+        candidates = (x for x in self.counts
+                      if self.counts[x] >= min_ratings)
+        return [(x, self.titles.get(x), self.counts[x], self.avg_rating(x))
+                for x in heapq.nlargest(num, candidates, key=sort_key)]
+
+    def save(self, snapshot_file):
+        """Writes the state atomically for a fast restart."""
+        snapshot_dir = os.path.dirname(snapshot_file)
+        if snapshot_dir and not os.path.exists(snapshot_dir):
+            os.makedirs(snapshot_dir)
+        data = {
+            'version': SNAPSHOT_VERSION,
+            'batches': self.batches,
+            'movies': [[x, self.sums[x], self.counts[x]]
+                       for x in sorted(self.counts)],
+            'titles': [[x, y] for x, y in sorted(self.titles.items())],
+        }
+        with open(snapshot_file + '.tmp', 'w') as handle:
+            json.dump(data, handle)
+        os.rename(snapshot_file + '.tmp', snapshot_file)
+
+    @classmethod
+    def load(cls, snapshot_file):
+        """Returns the state saved by save()."""
+        with open(snapshot_file) as handle:
+            data = json.load(handle)
+        if data.get('version') != SNAPSHOT_VERSION:
+            raise ValueError('Unknown snapshot version {0}'.format(
+                data.get('version')))
+        ratings = cls()
+        ratings.batches = data['batches']
+        for movie_id, total, count in data['movies']:
+            ratings.sums[movie_id] = total
+            ratings.counts[movie_id] = count
+        ratings.titles = dict((x, y) for x, y in data['titles'])
+        return ratings
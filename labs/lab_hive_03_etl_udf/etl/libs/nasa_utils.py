@@ -0,0 +1,235 @@
+"""
+Nasa access log utility functions.
+
+Each line of the nasa log looks like:
+
+199.72.81.55 - - [01/Jul/1995:00:00:01 -0400] "GET /history/apollo/ HTTP/1.0" 200 6245
+"""
+
+# System imports.
+from __future__ import print_function
+import os
+import re
+import zlib
+from collections import namedtuple
+
+# Libs.
+from .cli_utils import write_info
+from .reader_utils import iter_lines, map_file_lines
+
+# Version information.
+
+PROGRAM_VERSION = '1.0.0'
+
+NASA_LINE_RE = re.compile(
+    r'^(\S+) \S+ \S+ \[([^\]]*)\] "([^"]*)" (\S+) (\S+)\s*$')
+
+NasaRecord = namedtuple(
+    'NasaRecord',
+    ['host', 'request_time', 'method', 'page_url', 'error_code',
+     'page_size'])
+
+HIVE_NULL = '\\N'
+
+# Whole line pattern of the RegexSerDe raw table (valid in Java and
+# Python): host, request_time, method, url, status and size. The optional
+# groups are NULL exactly where the former regexp_extract calls over the
+# '"' separated fields returned '' (no GET url, size '-').
+NASA_SERDE_REGEX = (
+    r'^([^ "]*) [^"\[]*\[([^ "]*) [^"]*"'
+    r'(?:([^ "]*) ([^ "]*) [^"]*|[^"]*)"'
+    r'(?:[^0-9"]*([0-9][^"]*) ([0-9][^"]*)|[^"]*)(?:".*)?$')
+
+
+def parse_nasa_line(line):
+    """Parses a log line returning a NasaRecord or None when malformed.
+
+    Parameters
+    ----------
+    line: one line of the nasa access log.
+    """
+    match = NASA_LINE_RE.match(line)
+    if not match:
+        return None
+    host, request_time, request, error_code, page_size = match.groups()
+    parts = request.split(' ')
+    method = parts[0]
+    page_url = parts[1] if len(parts) > 1 else ''
+    return NasaRecord(host, request_time.split(' ')[0], method, page_url,
+                      error_code, page_size)
+
+
+def daily_value(record, column):
+    """Returns the nasa_daily value of a record column.
+
+    Step 05 loads page_url only for GET requests (blank otherwise).
+    """
+    if column == 'page_url' and record.method != 'GET':
+        return ''
+    return getattr(record, column)
+
+
+def read_nasa_records(file_name):
+    """Yields (line, record) for each line of the file.
+
+    Parameters
+    ----------
+    file_name: the local nasa log file (plain, .gz or .bz2).
+    """
+    for line in iter_lines(file_name):
+        yield line, parse_nasa_line(line)
+
+
+def count_malformed(lines):
+    """Returns (rows, malformed rows) for an iterable of log lines."""
+    rows = 0
+    malformed = 0
+    for line in lines:
+        rows += 1
+        if parse_nasa_line(line) is None:
+            malformed += 1
+    return rows, malformed
+
+
+def validate_nasa_file(file_name, processes=None):
+    """Counts rows and malformed rows using all the cpus.
+
+    Parameters
+    ----------
+    file_name: the local nasa log file (plain, .gz or .bz2).
+    processes: pool size, defaults to the number of cpus.
+    """
+    results = map_file_lines(file_name, count_malformed, processes)
+    return (sum(x[0] for x in results), sum(x[1] for x in results))
+
+
+def page_sub_dir(page_url):
+    """Returns the first url directory like Hive SPLIT(url, "/")[1]."""
+    parts = page_url.split('/')
+    if len(parts) < 2:
+        return None
+    return parts[1]
+
+
+def page_bytes(page_size):
+    """Returns the page size as an integer ('-' means 0 bytes)."""
+    if page_size.isdigit():
+        return int(page_size)
+    return 0
+
+
+def write_tsv(file_name, rows):
+    """Writes tuples as a tab separated file using Hive NULL markers.
+
+    Parameters
+    ----------
+    file_name: output file.
+    rows: iterable of tuples.
+    """
+    with open(file_name, 'w') as handle:
+        for row in rows:
+            values = [HIVE_NULL if x is None else str(x) for x in row]
+            handle.write('\t'.join(values) + '\n')
+
+
+class DailyRollups(object):
+    """Per day aggregations computed while streaming the local log."""
+
+    TABLES = {
+        'nasa_rollup_subdir': 'sub_dir STRING, requests BIGINT',
+        'nasa_rollup_status': 'error_code STRING, requests BIGINT',
+        'nasa_rollup_host_bytes':
+            'host STRING, requests BIGINT, total_bytes BIGINT',
+    }
+
+    def __init__(self):
+        self.by_sub_dir = dict()
+        self.by_status = dict()
+        self.by_host = dict()
+        self.rows = 0
+        self.malformed = 0
+
+    def add(self, line, record):
+        """Adds one parsed line to the rollups."""
+        if record is None:
+            self.malformed += 1
+            return
+        self.rows += 1
+        sub_dir = page_sub_dir(record.page_url)
+        self.by_sub_dir[sub_dir] = self.by_sub_dir.get(sub_dir, 0) + 1
+        self.by_status[record.error_code] = self.by_status.get(
+            record.error_code, 0) + 1
+        requests, total = self.by_host.get(record.host, (0, 0))
+        self.by_host[record.host] = (
+            requests + 1, total + page_bytes(record.page_size))
+
+    def write(self, output_dir):
+        """Writes one tsv per rollup table and returns {table: file}."""
+        if not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        files = dict()
+        tables = [
+            ('nasa_rollup_subdir', sorted(
+                self.by_sub_dir.items(), key=lambda x: -x[1])),
+            ('nasa_rollup_status', sorted(self.by_status.items())),
+            ('nasa_rollup_host_bytes', sorted(
+                (host, value[0], value[1])
+                for host, value in self.by_host.items())),
+        ]
+        for table_name, rows in tables:
+            files[table_name] = os.path.join(output_dir, table_name + '.tsv')
+            write_tsv(files[table_name], rows)
+        write_info('Rollups: {0} rows, {1} malformed, {2} hosts'.format(
+            self.rows, self.malformed, len(self.by_host)))
+        return files
+
+
+def hash_fraction(key):
+    """Maps a string deterministically into [0, 1)."""
+    return (zlib.crc32(key.encode('utf-8')) & 0xffffffff) / 4294967296.0
+
+
+class LineSampler(object):
+    """Writes a deterministic hash based sample of the lines to a file.
+
+    A line is kept when the hash of its contents falls below the sample
+    fraction so reruns over the same input always pick the same lines.
+    """
+
+    def __init__(self, output_file, fraction):
+        self.output_file = output_file
+        self.fraction = fraction
+        output_dir = os.path.dirname(output_file)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        self.handle = open(output_file, 'w')
+        self.rows = 0
+        self.kept = 0
+
+    def add(self, line, record):
+        """Writes the line into the sample when selected."""
+        self.rows += 1
+        if hash_fraction(line) < self.fraction:
+            self.handle.write(line + '\n')
+            self.kept += 1
+
+    def close(self):
+        """Closes the sample file."""
+        self.handle.close()
+
+    def scale_ratio(self):
+        """Returns the input lines per kept line (None if none was kept).
+
+        The input row count is exact (self.rows); the ratio only scales
+        the counts Hive computes over the sample.
+        """
+        if not self.kept:
+            return None
+        return float(self.rows) / self.kept
+
+    def estimated_count(self, sample_count):
+        """Scales a count computed over the sample to the full input."""
+        ratio = self.scale_ratio()
+        if ratio is None:
+            return None
+        return int(round(sample_count * ratio))
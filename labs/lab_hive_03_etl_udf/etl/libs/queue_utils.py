@@ -0,0 +1,125 @@
+"""
+File lock based run queue shared by all the job invocations of a host.
+
+Identical requests (same key) coalesce onto the run in flight and get
+its exit code. Distinct keys run concurrently up to max_concurrency.
+The locks are released by the OS if a process dies.
+"""
+
+# System imports.
+from __future__ import print_function
+import fcntl
+import json
+import os
+import re
+import time
+
+# Libs.
+from .cli_utils import write_info
+
+# Version information.
+
+PROGRAM_VERSION = '1.0.0'
+
+
+def try_lock(file_name):
+    """Returns the open handle if the exclusive lock was taken else None."""
+    handle = open(file_name, 'a')
+    try:
+        fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except IOError:
+        handle.close()
+        return None
+    return handle
+
+
+def release_lock(handle):
+    """Releases a lock taken by try_lock."""
+    fcntl.flock(handle, fcntl.LOCK_UN)
+    handle.close()
+
+
+class RunQueue(object):
+    """Deduplicating run queue with a concurrency limit."""
+
+    def __init__(self, queue_dir, max_concurrency=2, poll_seconds=5):
+        self.queue_dir = queue_dir
+        self.max_concurrency = max_concurrency
+        self.poll_seconds = poll_seconds
+        if not os.path.exists(queue_dir):
+            os.makedirs(queue_dir)
+
+    def _path(self, name):
+        """Returns the file for a key or slot inside the queue dir."""
+        return os.path.join(self.queue_dir, re.sub(r'[^\w.-]', '_', name))
+
+    def _read_result(self, key):
+        """Returns the last result saved for the key or None."""
+        try:
+            with open(self._path(key) + '.result') as handle:
+                return json.load(handle)
+        except (IOError, ValueError):
+            return None
+
+    def _write_result(self, key, exit_code, started):
+        """Saves the exit code of the run for coalesced requests."""
+        result_file = self._path(key) + '.result'
+        with open(result_file + '.tmp', 'w') as handle:
+            json.dump({'exit_code': exit_code, 'started': started,
+                       'finished': time.time(), 'pid': os.getpid()}, handle)
+        os.rename(result_file + '.tmp', result_file)
+
+    def _wait_in_flight(self, key, wait_start):
+        """Blocks until the run in flight for key finishes."""
+        handle = open(self._path(key) + '.lock', 'a')
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX)
+        finally:
+            handle.close()
+        result = self._read_result(key)
+        if result and result['finished'] >= wait_start:
+            return result['exit_code']
+        # The other run died without a result.
+        return None
+
+    def _acquire_slot(self):
+        """Waits for one of the concurrency slots and returns its lock."""
+        while True:
+            for idx in range(self.max_concurrency):
+                handle = try_lock(self._path('slot_{0}.lock'.format(idx)))
+                if handle:
+                    return handle
+            time.sleep(self.poll_seconds)
+
+    def run(self, key, func):
+        """Runs func() once per key in flight and returns its exit code.
+
+        Parameters
+        ----------
+        key: request identity like 'nasa_2018-07-02'.
+        func: callable returning an exit code.
+        """
+        wait_start = time.time()
+        key_lock = try_lock(self._path(key) + '.lock')
+        while key_lock is None:
+            write_info('Run {0} in flight, waiting for its result'.format(key))
+            exit_code = self._wait_in_flight(key, wait_start)
+            if exit_code is not None:
+                write_info('Coalesced onto the run in flight for {0} '
+                           '(waited {1:.1f}s, exit code {2})'.format(
+                               key, time.time() - wait_start, exit_code))
+                return exit_code
+            key_lock = try_lock(self._path(key) + '.lock')
+        try:
+            slot = self._acquire_slot()
+            started = time.time()
+            write_info('Queue wait {0:.1f}s for {1} (max {2} runs)'.format(
+                started - wait_start, key, self.max_concurrency))
+            try:
+                exit_code = func()
+            finally:
+                release_lock(slot)
+            self._write_result(key, exit_code, started)
+            return exit_code
+        finally:
+            release_lock(key_lock)
@@ -0,0 +1,179 @@
+"""
+Line readers for large local input files.
+
+Sequential reads go through the buffered io text layer, which decodes
+large blocks that are split at once (see the read_iter_lines and
+read_text_lines benchmarks of bench/bench_etl.py). For a process pool,
+plain files are split into newline aligned byte ranges that each worker
+reads in blocks from its own offset. Gzip and bz2 files cannot be split
+and are always read sequentially.
+"""
+
+# System imports.
+from __future__ import print_function
+import bz2
+import gzip
+import io
+import os
+import sys
+from multiprocessing import Pool, cpu_count
+
+# Version information.
+
+PROGRAM_VERSION = '1.0.0'
+
+READ_BLOCK_BYTES = 1024 * 1024
+
+COMPRESSED_OPENERS = {
+    '.gz': gzip.open,
+    '.bz2': bz2.BZ2File,
+}
+
+
+def is_compressed(file_name):
+    """Returns True if the file must be read sequentially."""
+    return os.path.splitext(file_name)[1] in COMPRESSED_OPENERS
+
+
+def iter_lines(file_name):
+    """Yields the lines of a plain, gzip or bz2 file without line feeds.
+
+    Parameters
+    ----------
+    file_name: the local file.
+    """
+    extension = os.path.splitext(file_name)[1]
+    if extension in COMPRESSED_OPENERS:
+        raw = COMPRESSED_OPENERS[extension](file_name, 'rb')
+        if sys.version_info[0] < 3:
+            # The python 2 gzip and bz2 files have no read1 for TextIOWrapper.
+            with raw:
+                for line in raw:
+                    yield line.decode('utf-8', 'replace').rstrip('\n')
+            return
+        text = io.TextIOWrapper(raw, encoding='utf-8', errors='replace')
+    else:
+        # Split on line feeds only, like the ranges of map_file_lines.
+        text = io.open(file_name, encoding='utf-8', errors='replace',
+                       newline='\n')
+    with text:
+        # Decoded blocks are split at once: only the yield is per line.
+        tail = u''
+        while True:
+            data = text.read(READ_BLOCK_BYTES)
+            if not data:
+                break
+            lines = (tail + data).split(u'\n')
+            tail = lines.pop()
+            for line in lines:
+                yield line
+        if tail:
+            yield tail
+
+
+def open_csv(file_name):
+    """Returns a handle of a plain, gzip or bz2 file for csv.reader.
+
+    Parameters
+    ----------
+    file_name: the local file.
+    The csv module parses the line ends itself (quoted fields may hold
+    newlines), it reads bytes on python 2 and newline='' text on python 3.
+    """
+    opener = COMPRESSED_OPENERS.get(os.path.splitext(file_name)[1], io.open)
+    raw = opener(file_name, 'rb')
+    if sys.version_info[0] < 3:
+        return raw
+    return io.TextIOWrapper(raw, encoding='utf-8', errors='replace',
+                            newline='')
+
+
+def iter_range_lines(file_name, start, end):
+    """Yields the lines between two newline aligned offsets.
+
+    Parameters
+    ----------
+    file_name: the local plain text file.
+    start, end: byte range as returned by split_ranges.
+    """
+    with io.open(file_name, 'rb') as handle:
+        handle.seek(start)
+        remaining = end - start
+        tail = b''
+        while remaining > 0:
+            data = handle.read(min(READ_BLOCK_BYTES, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            data = tail + data
+            # A utf-8 multi byte character never contains a line feed.
+            cut = data.rfind(b'\n') + 1
+            tail = data[cut:]
+            if cut:
+                lines = data[:cut].decode('utf-8', 'replace').split('\n')
+                lines.pop()
+                for line in lines:
+                    yield line
+        if tail:
+            yield tail.decode('utf-8', 'replace')
+
+
+def split_ranges(file_name, num_ranges):
+    """Splits a plain file into at most num_ranges newline aligned ranges.
+
+    Parameters
+    ----------
+    file_name: the local plain text file.
+    num_ranges: wanted number of ranges (usually the number of workers).
+    Returns a list of (start, end) byte offsets.
+    """
+    size = os.path.getsize(file_name)
+    if not size:
+        return []
+    if is_compressed(file_name) or num_ranges < 2:
+        return [(0, size)]
+    boundaries = [0]
+    with io.open(file_name, 'rb') as handle:
+        for idx in range(1, num_ranges):
+            # The range starts after the line crossing the split point.
+            handle.seek(size * idx // num_ranges)
+            handle.readline()
+            line_end = handle.tell()
+            if line_end >= size:
+                break
+            if line_end > boundaries[-1]:
+                boundaries.append(line_end)
+    if boundaries[-1] < size:
+        boundaries.append(size)
+    return list(zip(boundaries[:-1], boundaries[1:]))
+
+
+def _apply_range(args):
+    """Pool worker: applies func to the lines of one range."""
+    func, file_name, start, end = args
+    return func(iter_range_lines(file_name, start, end))
+
+
+def map_file_lines(file_name, func, processes=None):
+    """Applies func(lines) to the file ranges in a process pool.
+
+    Parameters
+    ----------
+    file_name: local file (gzip and bz2 fall back to one sequential call).
+    func: module level function taking an iterable of lines.
+    processes: pool size, defaults to the number of cpus.
+    Returns the list of func results in file order.
+    """
+    if is_compressed(file_name):
+        return [func(iter_lines(file_name))]
+    processes = processes or cpu_count()
+    ranges = split_ranges(file_name, processes)
+    if len(ranges) < 2:
+        return [func(iter_lines(file_name))]
+    pool = Pool(min(processes, len(ranges)))
+    try:
+        return pool.map(_apply_range, [
+            (func, file_name, start, end) for start, end in ranges])
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,179 @@
+"""
+Streaming sessionization of the nasa access log.
+
+A session is a run of requests of one host with no gap longer than the
+inactivity gap. The log is time ordered, so the open sessions are kept
+in an OrderedDict by last activity: the least recently active session
+sits at the front and is emitted as soon as the clock moves past its
+gap. The map is bounded by max_open; when full, the least recently
+active session is emitted early (counted as a forced eviction) so memory
+never depends on the number of hosts of the day.
+"""
+
+# System imports.
+from __future__ import print_function
+import os
+import time
+from calendar import timegm
+from collections import OrderedDict
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Libs.
+from .cli_utils import write_info
+from .nasa_utils import HIVE_NULL, page_bytes
+
+# Version information.
+
+PROGRAM_VERSION = '1.0.0'
+
+SESSION_COLUMNS = ('host STRING, start_time STRING, end_time STRING, '
+                   'duration_seconds BIGINT, requests BIGINT, '
+                   'total_bytes BIGINT, entry_url STRING, exit_url STRING, '
+                   'error_requests BIGINT')
+MONTHS = dict((x, idx + 1) for idx, x in enumerate(
+    ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct',
+     'Nov', 'Dec']))
+# Open session fields.
+START, LAST, REQUESTS, BYTES, ENTRY, EXIT, ERRORS = range(7)
+
+
+class RequestClock(object):
+    """Converts '01/Jul/1995:00:00:01' to epoch seconds (wall time)."""
+
+    def __init__(self):
+        self.days = dict()
+
+    def epoch(self, request_time):
+        """Returns the seconds or None when the time is malformed."""
+        try:
+            day = self.days.get(request_time[:11])
+            if day is None:
+                day = timegm((int(request_time[7:11]),
+                              MONTHS[request_time[3:6]],
+                              int(request_time[0:2]), 0, 0, 0))
+                self.days[request_time[:11]] = day
+            return (day + int(request_time[12:14]) * 3600 +
+                    int(request_time[15:17]) * 60 + int(request_time[18:20]))
+        except (KeyError, ValueError):
+            return None
+
+
+def format_epoch(seconds):
+    """Returns the 'yyyy-MM-dd HH:mm:ss' Hive timestamp string."""
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(seconds))
+
+
+def peak_rss_mb():
+    """Returns the peak resident memory of the process in MB (or None)."""
+    if resource is None:
+        return None
+    # ru_maxrss is in KB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0
+
+
+class Sessionizer(object):
+    """Ingest pass collector writing one tsv row per session."""
+
+    def __init__(self, output_file, gap_seconds=1800, max_open=100000):
+        self.output_file = output_file
+        self.gap_seconds = gap_seconds
+        self.max_open = max_open
+        output_dir = os.path.dirname(output_file)
+        if output_dir and not os.path.exists(output_dir):
+            os.makedirs(output_dir)
+        self.handle = open(output_file, 'w')
+        self.clock = RequestClock()
+        self.open_sessions = OrderedDict()
+        self.now = None
+        self.rows = 0
+        self.malformed = 0
+        self.sessions = 0
+        self.forced = 0
+        self.peak_open = 0
+        self.started = None
+
+    def add(self, line, record):
+        """Adds one request, emitting the sessions that timed out."""
+        if self.started is None:
+            self.started = time.time()
+        seconds = None
+        if record is not None:
+            seconds = self.clock.epoch(record.request_time)
+        if seconds is None:
+            self.malformed += 1
+            return
+        self.rows += 1
+        if self.now is None or seconds > self.now:
+            self.now = seconds
+            self.expire(self.now - self.gap_seconds)
+        session = self.open_sessions.pop(record.host, None)
+        if session is not None and seconds - session[LAST] > self.gap_seconds:
+            self.emit(record.host, session)
+            session = None
+        if session is None:
+            session = [seconds, seconds, 0, 0, record.page_url, None, 0]
+            if len(self.open_sessions) >= self.max_open:
+                self.forced += 1
+                self.emit(*self.open_sessions.popitem(last=False))
+        session[LAST] = max(session[LAST], seconds)
+        session[REQUESTS] += 1
+        session[BYTES] += page_bytes(record.page_size)
+        session[EXIT] = record.page_url
+        if record.error_code[:1] in ('4', '5'):
+            session[ERRORS] += 1
+        # Re-inserted at the end: the front is the least recently active.
+        self.open_sessions[record.host] = session
+        self.peak_open = max(self.peak_open, len(self.open_sessions))
+
+    def expire(self, cutoff):
+        """Emits the sessions inactive since before cutoff."""
+        while self.open_sessions:
+            host, session = next(iter(self.open_sessions.items()))
+            if session[LAST] >= cutoff:
+                break
+            del self.open_sessions[host]
+            self.emit(host, session)
+
+    def emit(self, host, session):
+        """Writes one session row."""
+        self.sessions += 1
+        values = [host, format_epoch(session[START]),
+                  format_epoch(session[LAST]), session[LAST] - session[START],
+                  session[REQUESTS], session[BYTES], session[ENTRY],
+                  session[EXIT], session[ERRORS]]
+        self.handle.write('\t'.join(
+            HIVE_NULL if x is None else str(x) for x in values) + '\n')
+
+    def close(self):
+        """Emits the sessions still open and returns the report."""
+        while self.open_sessions:
+            self.emit(*self.open_sessions.popitem(last=False))
+        self.handle.close()
+        elapsed = time.time() - self.started if self.started else 0.0
+        report = {
+            'rows': self.rows,
+            'malformed': self.malformed,
+            'sessions': self.sessions,
+            'peak_open_sessions': self.peak_open,
+            'max_open_sessions': self.max_open,
+            'forced_evictions': self.forced,
+            'peak_rss_mb': peak_rss_mb(),
+            'seconds': elapsed,
+            'lines_per_second': (self.rows + self.malformed) /
+                                max(elapsed, 1e-9),
+        }
+        write_info('Sessions: {0} from {1} rows ({2} malformed), peak open '
+                   '{3} of {4} ({5} forced evictions)'.format(
+                       report['sessions'], report['rows'],
+                       report['malformed'], report['peak_open_sessions'],
+                       report['max_open_sessions'],
+                       report['forced_evictions']))
+        write_info('Sessions: peak RSS {0} MB, {1:.0f} lines/s'.format(
+            '-' if report['peak_rss_mb'] is None
+            else '{0:.1f}'.format(report['peak_rss_mb']),
+            report['lines_per_second']))
+        return report
@@ -0,0 +1,378 @@
+"""
+Streaming sketches with bounded memory.
+"""
+
+# System imports.
+from __future__ import print_function
+import base64
+import binascii
+import hashlib
+import math
+import zlib
+
+# Libs.
+from .nasa_utils import daily_value
+
+# Version information.
+
+PROGRAM_VERSION = '1.0.0'
+
+HASH_SEEDS = [0x9e3779b1, 0x85ebca77, 0xc2b2ae3d, 0x27d4eb2f,
+              0x165667b1, 0xd3a2646c, 0xfd7046c5, 0xb55a4f09]
+
+
+def seeded_hash(key, seed):
+    """Returns a 32 bit hash of the string for the given seed."""
+    return zlib.crc32(key.encode('utf-8'), seed) & 0xffffffff
+
+
+class MisraGries(object):
+    """Misra-Gries heavy hitters summary with at most k counters.
+
+    Any key with more than rows / (k + 1) occurrences is guaranteed to be
+    kept. Counts are lower bounds, off by at most rows / (k + 1).
+    """
+
+    def __init__(self, num_counters):
+        self.num_counters = num_counters
+        self.counters = dict()
+        self.rows = 0
+
+    def add(self, key):
+        """Counts one occurrence of key."""
+        self.rows += 1
+        counters = self.counters
+        if key in counters:
+            counters[key] += 1
+        elif len(counters) < self.num_counters:
+            counters[key] = 1
+        else:
+            for other in list(counters):
+                counters[other] -= 1
+                if not counters[other]:
+                    del counters[other]
+
+    def candidates(self):
+        """Returns the keys currently tracked."""
+        return list(self.counters)
+
+
+class CountMinSketch(object):
+    """Count-Min sketch. Estimates never under count and over count by at
+    most 2 * rows / width with probability 1 - (1/2) ** depth."""
+
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.seeds = HASH_SEEDS[:depth]
+        self.tables = [[0] * width for _ in range(depth)]
+
+    def add(self, key, count=1):
+        """Counts occurrences of key."""
+        for row, seed in enumerate(self.seeds):
+            self.tables[row][seeded_hash(key, seed) % self.width] += count
+
+    def estimate(self, key):
+        """Returns the estimated count of key."""
+        return min(self.tables[row][seeded_hash(key, seed) % self.width]
+                   for row, seed in enumerate(self.seeds))
+
+
+class SkewProfile(object):
+    """Heavy hitter profile of a key column."""
+
+    def __init__(self, num_counters=256, width=2048, depth=4):
+        self.heavy = MisraGries(num_counters)
+        self.sketch = CountMinSketch(width, depth)
+        self.rows = 0
+
+    def add(self, key):
+        """Adds one key occurrence."""
+        self.rows += 1
+        self.heavy.add(key)
+        self.sketch.add(key)
+
+    def top_keys(self, top_n):
+        """Returns [(key, estimated count, share of rows)]."""
+        ranked = sorted(((key, self.sketch.estimate(key))
+                         for key in self.heavy.candidates()),
+                        key=lambda x: (-x[1], x[0]))[:top_n]
+        return [(key, count, float(count) / max(self.rows, 1))
+                for key, count in ranked]
+
+    def skew_ratio(self, reducers):
+        """Ratio between the heaviest key and an even reducer share."""
+        top = self.top_keys(1)
+        if not top or not self.rows:
+            return 0.0
+        return top[0][1] / (float(self.rows) / reducers)
+
+
+def hash64(key):
+    """Returns a 64 bit hash of the string."""
+    return int(hashlib.sha1(key.encode('utf-8')).hexdigest()[:16], 16)
+
+
+class HyperLogLog(object):
+    """HyperLogLog distinct counter.
+
+    Uses 2 ** precision one byte registers. The relative standard error
+    of count() is 1.04 / sqrt(2 ** precision), about 0.81% for the
+    default precision 14 (16 KB), and stays the same after merging any
+    number of sketches built with the same precision.
+    """
+
+    def __init__(self, precision=14):
+        self.precision = precision
+        self.num_registers = 1 << precision
+        self.registers = bytearray(self.num_registers)
+
+    def add(self, key):
+        """Adds one value to the sketch."""
+        hashed = hash64(key)
+        bits = 64 - self.precision
+        index = hashed >> bits
+        rest = hashed & ((1 << bits) - 1)
+        rank = bits - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def merge(self, other):
+        """Merges another sketch into this one (union of the values)."""
+        if other.precision != self.precision:
+            raise ValueError('Cannot merge sketches of different precision')
+        registers = self.registers
+        for index, rank in enumerate(other.registers):
+            if rank > registers[index]:
+                registers[index] = rank
+
+    def count(self):
+        """Returns the estimated number of distinct values."""
+        size = float(self.num_registers)
+        alpha = 0.7213 / (1.0 + 1.079 / size)
+        estimate = alpha * size * size / sum(
+            2.0 ** -rank for rank in self.registers)
+        zeros = self.registers.count(b'\x00')
+        if estimate <= 2.5 * size and zeros:
+            # Linear counting is more accurate for small cardinalities.
+            estimate = size * math.log(size / zeros)
+        return int(round(estimate))
+
+    def error_bound(self):
+        """Returns the relative standard error of count()."""
+        return 1.04 / math.sqrt(self.num_registers)
+
+    def to_text(self):
+        """Serializes the registers as base64 text."""
+        return base64.b64encode(bytes(self.registers)).decode('ascii')
+
+    @classmethod
+    def from_text(cls, precision, text):
+        """Builds a sketch from to_text() output."""
+        sketch = cls(precision)
+        sketch.registers = bytearray(base64.b64decode(text))
+        return sketch
+
+
+class ColumnSketches(object):
+    """One HyperLogLog per column fed from parsed records."""
+
+    def __init__(self, columns, precision=14):
+        self.columns = columns
+        self.precision = precision
+        self.sketches = dict((x, HyperLogLog(precision)) for x in columns)
+
+    def add(self, line, record):
+        """Adds the record nasa_daily column values to the sketches."""
+        if record is None:
+            return
+        for column in self.columns:
+            self.sketches[column].add(daily_value(record, column))
+
+    def to_lines(self, dt_date):
+        """Returns 'dt_date<TAB>column<TAB>precision<TAB>registers' lines."""
+        return ['{0}\t{1}\t{2}\t{3}'.format(
+            dt_date, column, self.precision,
+            self.sketches[column].to_text()) for column in self.columns]
+
+
+def merge_sketch_lines(lines, column, from_date, to_date):
+    """Merges the sketches of a column between two dates (inclusive).
+
+    Parameters
+    ----------
+    lines: lines written by ColumnSketches.to_lines.
+    column: the column to count.
+    from_date, to_date: dt_date range like 1995-07-01.
+    Returns the merged HyperLogLog (None if nothing matched) and the dates.
+    """
+    merged = None
+    dates = []
+    for line in lines:
+        parts = line.strip().split('\t')
+        if len(parts) != 4 or parts[1] != column:
+            continue
+        if not from_date <= parts[0] <= to_date:
+            continue
+        sketch = HyperLogLog.from_text(int(parts[2]), parts[3])
+        if merged is None:
+            merged = sketch
+        else:
+            merged.merge(sketch)
+        dates.append(parts[0])
+    return merged, sorted(dates)
+
+
+class BloomFilter(object):
+    """Bloom filter sized for the expected items and false positive rate.
+
+    Uses double hashing over the two halves of an md5 digest.
+    """
+
+    def __init__(self, num_bits, num_hashes):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray((num_bits + 7) // 8)
+
+    @staticmethod
+    def bits_for(expected_items, fp_rate):
+        """Returns the optimal number of bits for the capacity."""
+        return int(math.ceil(
+            -max(expected_items, 1) * math.log(fp_rate) / (math.log(2) ** 2)))
+
+    @staticmethod
+    def hashes_for(fp_rate):
+        """Returns the optimal number of hashes (independent of the size)."""
+        return max(1, int(round(-math.log(fp_rate) / math.log(2))))
+
+    @classmethod
+    def for_capacity(cls, expected_items, fp_rate=0.01):
+        """Builds a filter with optimal bits and hashes for the capacity."""
+        return cls(cls.bits_for(expected_items, fp_rate),
+                   cls.hashes_for(fp_rate))
+
+    def fold(self, num_bits):
+        """Returns the filter shrunk to num_bits (a multiple of 8 dividing
+        the current size).
+
+        A position p % num_bits is the same as (p % self.num_bits) %
+        num_bits, so OR-ing the slices of the bits keeps every key.
+        """
+        if num_bits <= 0 or num_bits % 8 or self.num_bits % num_bits:
+            raise ValueError('Cannot fold {0} bits into {1}'.format(
+                self.num_bits, num_bits))
+        size = num_bits // 8
+        merged = 0
+        for start in range(0, len(self.bits), size):
+            merged |= int(binascii.hexlify(
+                bytes(self.bits[start:start + size])), 16)
+        folded = BloomFilter(num_bits, self.num_hashes)
+        folded.bits = bytearray(binascii.unhexlify(
+            '{0:0{1}x}'.format(merged, 2 * size)))
+        return folded
+
+    def _positions(self, key):
+        """Yields the bit positions of the key."""
+        digest = hashlib.md5(key.encode('utf-8')).hexdigest()
+        first, second = int(digest[:16], 16), int(digest[16:], 16)
+        for idx in range(self.num_hashes):
+            yield (first + idx * second) % self.num_bits
+
+    def add(self, key):
+        """Adds the key to the filter."""
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7))
+                   for pos in self._positions(key))
+
+    def to_text(self):
+        """Serializes the bits as base64 text."""
+        return base64.b64encode(bytes(self.bits)).decode('ascii')
+
+    @classmethod
+    def from_text(cls, num_bits, num_hashes, text):
+        """Builds a filter from to_text() output."""
+        bloom = cls(num_bits, num_hashes)
+        bloom.bits = bytearray(base64.b64decode(text))
+        return bloom
+
+
+def host_url_key(host=None, page_url=None):
+    """Returns the bloom key for a host, a page_url or both."""
+    if host is not None and page_url is not None:
+        return 'p:' + host + ' ' + page_url
+    if host is not None:
+        return 'h:' + host
+    return 'u:' + page_url
+
+
+class HostUrlBloom(object):
+    """Bloom filter over hosts, page urls and (host, page_url) pairs.
+
+    The input size says little about the distinct keys (compressed files,
+    repeated hosts), so the filter is allocated for max_keys with a power
+    of two number of bits and a HyperLogLog counts the distinct keys. The
+    stored filter is folded down to the smallest size meeting fp_rate for
+    that count, so the memory is bounded by max_keys and the sidecar
+    size follows the distinct keys of the day.
+    """
+
+    def __init__(self, max_keys, fp_rate=0.01, precision=14):
+        self.max_keys = max_keys
+        self.fp_rate = fp_rate
+        num_bits = 1 << (BloomFilter.bits_for(max_keys, fp_rate) - 1
+                         ).bit_length()
+        self.bloom = BloomFilter(num_bits, BloomFilter.hashes_for(fp_rate))
+        self.keys = HyperLogLog(precision)
+
+    def add(self, line, record):
+        """Adds the record keys (nasa_daily values) to the filter."""
+        if record is None:
+            return
+        page_url = daily_value(record, 'page_url')
+        for key in (host_url_key(host=record.host),
+                    host_url_key(page_url=page_url),
+                    host_url_key(record.host, page_url)):
+            self.bloom.add(key)
+            self.keys.add(key)
+
+    def distinct_keys(self):
+        """Returns the estimated distinct keys, with 3 sigma headroom."""
+        return int(self.keys.count() * (1 + 3 * self.keys.error_bound()))
+
+    def folded(self):
+        """Returns the smallest fold of the filter meeting fp_rate."""
+        needed = BloomFilter.bits_for(self.distinct_keys(), self.fp_rate)
+        num_bits = self.bloom.num_bits
+        while num_bits % 2 == 0 and num_bits // 2 >= max(needed, 8):
+            num_bits //= 2
+        if num_bits == self.bloom.num_bits:
+            return self.bloom
+        return self.bloom.fold(num_bits)
+
+    def to_line(self, dt_date):
+        """Returns 'dt_date<TAB>num_bits<TAB>num_hashes<TAB>bits'."""
+        bloom = self.folded()
+        return '{0}\t{1}\t{2}\t{3}'.format(
+            dt_date, bloom.num_bits, bloom.num_hashes, bloom.to_text())
+
+
+def bloom_candidate_dates(lines, key):
+    """Returns the dates whose bloom filter may contain the key.
+
+    Parameters
+    ----------
+    lines: lines written by HostUrlBloom.to_line.
+    key: the key built by host_url_key.
+    """
+    dates = []
+    for line in lines:
+        parts = line.strip().split('\t')
+        if len(parts) != 4:
+            continue
+        bloom = BloomFilter.from_text(int(parts[1]), int(parts[2]), parts[3])
+        if key in bloom:
+            dates.append(parts[0])
+    return sorted(dates)
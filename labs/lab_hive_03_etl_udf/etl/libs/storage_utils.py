@@ -0,0 +1,142 @@
+"""
+Typed ORC storage of nasa_daily and its partition by partition migration.
+
+The "typed_storage" section of the job configuration:
+
+  "typed_storage": {
+    "table": "nasa_daily_typed",
+    "legacy_table": "nasa_daily_text",
+    "orc_compress": "ZLIB",
+    "state_file": "/tmp/nasa_migration/state.json"
+  }
+
+'job_nasa.py migrate' creates the typed table and converts the text
+partitions one at a time (with their sketch and bloom files), recording
+every converted partition in the state file so an interrupted migration
+resumes where it stopped. A text partition reloaded by step 05 is removed
+from the converted ones. With --swap, once every partition is converted,
+the text table is renamed to legacy_table and the typed one to
+nasa_daily. The two renames are separate statements and the state
+records the first one, so a swap interrupted in between is finished by
+the next migrate. Step 05 loads typed values once nasa_daily has the
+typed columns (read from the state, else from DESCRIBE).
+"""
+
+# System imports.
+from __future__ import print_function
+import json
+import os
+
+# Libs.
+from .hive_utils import resolve_template
+
+# Version information.
+
+PROGRAM_VERSION = '1.0.0'
+
+TYPED_COLUMNS = [
+    ('host', 'STRING'),
+    ('request_time', 'TIMESTAMP'),
+    ('page_url', 'STRING'),
+    ('error_code', 'INT'),
+    ('page_size', 'BIGINT'),
+]
+# Java SimpleDateFormat of the nasa log request time (01/Jul/1995:00:00:01).
+REQUEST_TIME_FORMAT = 'dd/MMM/yyyy:HH:mm:ss'
+
+CREATE_TPL = """
+          CREATE TABLE IF NOT EXISTS {table} (
+            {columns})
+          PARTITIONED BY (dt_date STRING)
+          STORED AS ORC
+          TBLPROPERTIES ('orc.compress' = '{orc_compress}');
+"""
+
+MIGRATE_TPL = """
+          INSERT OVERWRITE TABLE {table}
+          PARTITION(dt_date = "{dt_date}")
+            SELECT
+              {select}
+            FROM {source}
+            WHERE dt_date = "{dt_date}";
+"""
+
+RENAME_TPL = """
+          ALTER TABLE {source} RENAME TO {target};
+"""
+
+
+def typed_select(host, request_time, page_url, error_code, page_size):
+    """Returns the select list converting string expressions to the types.
+
+    Parameters
+    ----------
+    host, request_time, page_url, error_code, page_size: the HQL
+    expressions of the string values. Empty or invalid numbers become
+    NULL and the request time is parsed once into a TIMESTAMP.
+    """
+    return ',\n              '.join([
+        '{0} as host'.format(host),
+        "CAST(from_unixtime(unix_timestamp({0}, '{1}')) AS TIMESTAMP) "
+        "as request_time".format(request_time, REQUEST_TIME_FORMAT),
+        '{0} as page_url'.format(page_url),
+        'CAST({0} AS INT) as error_code'.format(error_code),
+        'CAST({0} AS BIGINT) as page_size'.format(page_size),
+    ])
+
+
+def typed_table_hql(table, orc_compress='ZLIB'):
+    """Returns the CREATE statement of the typed ORC table."""
+    return resolve_template(CREATE_TPL, {
+        'table': table,
+        'orc_compress': orc_compress,
+        'columns': ',\n            '.join(
+            '{0} {1}'.format(x, y) for x, y in TYPED_COLUMNS)})
+
+
+def migrate_partition_hql(source, table, source_columns, dt_date):
+    """Returns the statement converting one partition of the text table.
+
+    Parameters
+    ----------
+    source: the text table.
+    table: the typed table.
+    source_columns: the five column names of the text table, in order.
+    dt_date: the partition to convert.
+    """
+    return resolve_template(MIGRATE_TPL, {
+        'source': source, 'table': table, 'dt_date': dt_date,
+        'select': typed_select(*source_columns)})
+
+
+def rename_table_hql(source, target):
+    """Returns the statement renaming a table (one step of the swap)."""
+    return resolve_template(RENAME_TPL, {'source': source, 'target': target})
+
+
+def has_typed_columns(columns):
+    """Returns True if the [(name, type)] columns are the typed ones."""
+    return [x[1].lower() for x in columns] == [
+        x[1].lower() for x in TYPED_COLUMNS]
+
+
+def load_migration_state(state_file):
+    """Returns {"converted": [dt_date], "legacy_renamed": bool,
+    "swapped": bool}."""
+    state = {'converted': [], 'legacy_renamed': False, 'swapped': False}
+    if os.path.exists(state_file):
+        with open(state_file) as handle:
+            state.update(json.load(handle))
+    return state
+
+
+def save_migration_state(state_file, state):
+    """Saves the migration state (written after every partition)."""
+    state_dir = os.path.dirname(state_file)
+    if state_dir and not os.path.exists(state_dir):
+        os.makedirs(state_dir)
+    # Per process: concurrent runs forget reloaded partitions too.
+    temp_file = '{0}.{1}.tmp'.format(state_file, os.getpid())
+    with open(temp_file, 'w') as handle:
+        json.dump(state, handle, indent=2, sort_keys=True)
+    os.rename(temp_file, state_file)
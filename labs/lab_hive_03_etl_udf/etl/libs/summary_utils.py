@@ -0,0 +1,116 @@
+"""
+Incrementally maintained summary tables.
+
+The views live in the "summaries" section of the job configuration:
+
+  "summaries": {
+    "enabled": true,
+    "state_file": "/tmp/nasa_summaries/state.json",
+    "views": [
+      {"name": "nasa_summary_status",
+       "columns": "error_code STRING, requests BIGINT",
+       "query": "SELECT error_code, count(*) FROM nasa_daily
+                 WHERE dt_date = '{dt_date}' GROUP BY error_code"}
+    ]
+  }
+
+Every summary table is partitioned by dt_date and the job only recomputes
+the partition of the processed date (literal braces of a query must be
+doubled). The definition hash is stored in the table TBLPROPERTIES so
+changed definitions are rebuilt instead of mixing partitions computed by
+different queries; the state file only caches the hashes already checked
+on this host.
+"""
+
+# System imports.
+from __future__ import print_function
+import hashlib
+import json
+import os
+
+# Libs.
+from .hive_utils import resolve_template
+
+# Version information.
+
+PROGRAM_VERSION = '1.0.0'
+
+HASH_PROPERTY = 'summary.definition_hash'
+
+CREATE_TPL = """
+          CREATE TABLE IF NOT EXISTS {name} ({columns})
+          PARTITIONED BY (dt_date STRING)
+          STORED AS TEXTFILE
+          TBLPROPERTIES ('{hash_property}' = '{definition_hash}');
+"""
+
+INSERT_TPL = """
+          INSERT OVERWRITE TABLE {name}
+          PARTITION(dt_date = "{dt_date}")
+          {query};
+"""
+
+
+def definition_hash(view):
+    """Returns a short hash identifying the view definition."""
+    data = json.dumps([view['columns'], view['query']])
+    return hashlib.md5(data.encode('utf-8')).hexdigest()[:12]
+
+
+def load_summary_state(state_file):
+    """Returns {view name: definition hash} of the built views."""
+    if not os.path.exists(state_file):
+        return dict()
+    try:
+        with open(state_file) as handle:
+            return json.load(handle)
+    except ValueError:
+        # Only a cache: the hashes are read again from the tables.
+        return dict()
+
+
+def save_summary_state(state_file, state):
+    """Saves {view name: definition hash} (atomically, concurrent runs
+    may read it at any time)."""
+    state_dir = os.path.dirname(state_file)
+    if state_dir and not os.path.exists(state_dir):
+        os.makedirs(state_dir)
+    temp_file = '{0}.{1}.tmp'.format(state_file, os.getpid())
+    with open(temp_file, 'w') as handle:
+        json.dump(state, handle, indent=2, sort_keys=True)
+    os.rename(temp_file, state_file)
+
+
+def _view_ctx(view, dt_date):
+    """Returns the template context of a view for a date."""
+    ctx = dict()
+    ctx['name'] = view['name']
+    ctx['columns'] = view['columns']
+    ctx['hash_property'] = HASH_PROPERTY
+    ctx['definition_hash'] = definition_hash(view)
+    ctx['dt_date'] = dt_date
+    ctx['query'] = resolve_template(view['query'], {'dt_date': dt_date})
+    return ctx
+
+
+def summary_update_hql(view, dt_date):
+    """Returns the statements refreshing one partition of the view."""
+    ctx = _view_ctx(view, dt_date)
+    return (resolve_template(CREATE_TPL, ctx) +
+            resolve_template(INSERT_TPL, ctx))
+
+
+def summary_backfill_hql(view, dates):
+    """Returns the statements creating the view if needed and computing
+    all the dates (safe to run concurrently, nothing is dropped)."""
+    statements = [resolve_template(CREATE_TPL, _view_ctx(view, ''))]
+    for dt_date in dates:
+        statements.append(resolve_template(INSERT_TPL,
+                                           _view_ctx(view, dt_date)))
+    return ''.join(statements)
+
+
+def summary_rebuild_hql(view, dates):
+    """Returns the statements recreating the view for all the dates."""
+    return ('\n          DROP TABLE IF EXISTS {0};'.format(view['name']) +
+            summary_backfill_hql(view, dates))
@@ -0,0 +1,189 @@
+"""
+Bike trip csv re-encoding for LazySimpleSerDe tables.
+
+The monthly trip files are quoted csv read through OpenCSVSerde, which
+types every column as STRING and parses the quotes on every query. The
+re-encoded files are tab delimited with backslash escapes and typed
+values, plus columns derived once at ingest time.
+
+LazySimpleSerDe unescapes a backslash followed by any character to that
+character, so a delimiter is written as a backslash and the literal tab.
+Line ends cannot be written literally (the input format splits the lines
+before the SerDe), they are written as \\r and \\n which the SerDe only
+decodes with 'serialization.escape.crlf' = 'true'.
+"""
+
+# System imports.
+from __future__ import print_function
+import calendar
+import csv
+import os
+from datetime import datetime
+from multiprocessing import Pool, cpu_count
+
+# Libs.
+from .nasa_utils import HIVE_NULL
+from .reader_utils import open_csv
+
+# Version information.
+
+PROGRAM_VERSION = '1.0.0'
+
+TRIP_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# (name, hive type) of the bike_rides csv columns.
+TRIP_COLUMNS = [
+    ('duration', 'INT'),
+    ('start_time', 'TIMESTAMP'),
+    ('end_time', 'TIMESTAMP'),
+    ('start_station_number', 'INT'),
+    ('start_station', 'STRING'),
+    ('end_station_number', 'INT'),
+    ('end_station', 'STRING'),
+    ('bike_number', 'STRING'),
+    ('member_type', 'STRING'),
+]
+
+# Computed from start_time/end_time (epochs read the wall clock as UTC).
+DERIVED_COLUMNS = [
+    ('start_epoch', 'BIGINT'),
+    ('end_epoch', 'BIGINT'),
+    ('start_hour', 'TINYINT'),
+    ('start_date', 'STRING'),
+]
+
+TRIP_DDL_TPL = """CREATE EXTERNAL TABLE IF NOT EXISTS {table_name} (
+{columns}
+)
+ROW FORMAT DELIMITED
+FIELDS TERMINATED BY '\\t'
+ESCAPED BY '\\\\'
+LINES TERMINATED BY '\\n'
+STORED AS TEXTFILE
+LOCATION '{location}'
+TBLPROPERTIES ('serialization.escape.crlf' = 'true')
+;
+"""
+
+ESCAPES = [('\\', '\\\\'), ('\t', '\\\t'), ('\n', '\\n'), ('\r', '\\r')]
+
+
+def escape_value(value):
+    """Returns a LazySimpleSerDe field (backslash escapes, \\N for None)."""
+    if value is None:
+        return HIVE_NULL
+    value = str(value)
+    for char, escaped in ESCAPES:
+        value = value.replace(char, escaped)
+    return value
+
+
+def to_int(value):
+    """Returns the integer value or None."""
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def to_datetime(value):
+    """Returns the trip time parsed or None."""
+    try:
+        return datetime.strptime(value[:19], TRIP_TIME_FORMAT)
+    except ValueError:
+        return None
+
+
+def convert_trip_row(row):
+    """Returns the typed and derived values of a csv row or None.
+
+    Parameters
+    ----------
+    row: list of the csv fields of one trip.
+    Rows without a numeric duration (headers) or a valid start time are
+    rejected.
+    """
+    if len(row) != len(TRIP_COLUMNS):
+        return None
+    duration = to_int(row[0])
+    start_time = to_datetime(row[1])
+    if duration is None or start_time is None:
+        return None
+    end_time = to_datetime(row[2])
+    return [
+        duration,
+        start_time.strftime(TRIP_TIME_FORMAT),
+        end_time.strftime(TRIP_TIME_FORMAT) if end_time else None,
+        to_int(row[3]),
+        row[4],
+        to_int(row[5]),
+        row[6],
+        row[7],
+        row[8],
+        calendar.timegm(start_time.timetuple()),
+        calendar.timegm(end_time.timetuple()) if end_time else None,
+        start_time.hour,
+        start_time.strftime('%Y-%m-%d'),
+    ]
+
+
+def output_file_for(input_file, output_dir):
+    """Returns the re-encoded file name of an input trip file."""
+    base_name = os.path.basename(input_file)
+    for extension in ('.gz', '.bz2', '.csv'):
+        if base_name.endswith(extension):
+            base_name = base_name[:-len(extension)]
+    return os.path.join(output_dir, base_name + '.tsv')
+
+
+def reencode_trip_file(args):
+    """Pool worker: re-encodes one trip file.
+
+    Parameters
+    ----------
+    args: (input_file, output_file) tuple.
+    Returns (input_file, rows written, rows rejected).
+    """
+    input_file, output_file = args
+    rows, rejected = 0, 0
+    with open(output_file, 'w') as handle, open_csv(input_file) as source:
+        for row in csv.reader(source):
+            values = convert_trip_row(row)
+            if values is None:
+                rejected += 1
+                continue
+            handle.write('\t'.join(escape_value(x) for x in values) + '\n')
+            rows += 1
+    return input_file, rows, rejected
+
+
+def reencode_trip_files(input_files, output_dir, processes=None):
+    """Re-encodes the trip files in parallel, one file per worker.
+
+    Parameters
+    ----------
+    input_files: local csv files (plain, .gz or .bz2).
+    output_dir: directory receiving one .tsv per input file.
+    processes: pool size, defaults to the number of cpus.
+    """
+    if not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    jobs = [(x, output_file_for(x, output_dir)) for x in input_files]
+    processes = min(processes or cpu_count(), len(jobs))
+    if processes < 2:
+        return [reencode_trip_file(x) for x in jobs]
+    pool = Pool(processes)
+    try:
+        return pool.map(reencode_trip_file, jobs)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def trip_table_ddl(table_name, location):
+    """Returns the CREATE TABLE matching the re-encoded files."""
+    columns = ',\n'.join('  {0} {1}'.format(name, hive_type)
+                         for name, hive_type in
+                         TRIP_COLUMNS + DERIVED_COLUMNS)
+    return TRIP_DDL_TPL.format(table_name=table_name, columns=columns,
+                               location=location)
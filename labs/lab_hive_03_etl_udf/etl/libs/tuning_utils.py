@@ -0,0 +1,97 @@
+"""
+Input size aware Hive session tuning.
+
+The rules live in the "tuning" section of the job configuration:
+
+  "tuning": {
+    "enabled": true,
+    "size_source": "local",        -> local (os.stat) or hdfs (dfs -du)
+    "target_maps": 40,             -> split min/max size = input / target_maps
+    "min_split_mb": 32,
+    "max_split_mb": 512,
+    "target_reducers": 20,         -> bytes per reducer = input / reducers
+    "min_bytes_per_reducer_mb": 64,
+    "max_bytes_per_reducer_mb": 1024,
+    "output_codec": "org.apache.hadoop.io.compress.BZip2Codec",
+    "tiers": [                     -> first tier with input <= max_input_mb
+      {"max_input_mb": 1024, "map_memory_mb": 1024,
+       "reduce_memory_mb": 2048, "compress_output": false},
+      {"max_input_mb": 0, ...}     -> 0 means no limit
+    ]
+  }
+"""
+
+# System imports.
+from __future__ import print_function
+
+# Version information.
+
+PROGRAM_VERSION = '1.0.0'
+
+MB = 1024 * 1024
+# Fraction of the container memory given to the JVM heap.
+HEAP_FRACTION = 0.8
+# Later stages split the nasa_daily text files: gzip (and the cluster
+# default deflate) would give them one mapper per file, bzip2 is splittable.
+DEFAULT_OUTPUT_CODEC = 'org.apache.hadoop.io.compress.BZip2Codec'
+
+
+def clamp(value, low, high):
+    """Returns value limited to the [low, high] range."""
+    return max(low, min(high, value))
+
+
+def select_tier(input_bytes, tiers):
+    """Returns the first tier whose max_input_mb holds the input."""
+    for tier in tiers:
+        limit = tier.get('max_input_mb', 0)
+        if not limit or input_bytes <= limit * MB:
+            return tier
+    return tiers[-1] if tiers else {}
+
+
+def compute_tuning_settings(input_bytes, rules):
+    """Returns the ordered [(property, value)] for the input size.
+
+    Parameters
+    ----------
+    input_bytes: size of the staged input.
+    rules: the "tuning" configuration section.
+    """
+    split_bytes = clamp(
+        input_bytes // max(rules.get('target_maps', 40), 1),
+        rules.get('min_split_mb', 32) * MB,
+        rules.get('max_split_mb', 512) * MB)
+    reducer_bytes = clamp(
+        input_bytes // max(rules.get('target_reducers', 20), 1),
+        rules.get('min_bytes_per_reducer_mb', 64) * MB,
+        rules.get('max_bytes_per_reducer_mb', 1024) * MB)
+    # FileInputFormat splits at max(minsize, min(maxsize, block size)):
+    # both bounds are set so large inputs are not held to one block.
+    settings = [
+        ('mapreduce.input.fileinputformat.split.minsize', split_bytes),
+        ('mapreduce.input.fileinputformat.split.maxsize', split_bytes),
+        ('hive.exec.reducers.bytes.per.reducer', reducer_bytes),
+    ]
+    tier = select_tier(input_bytes, rules.get('tiers', []))
+    for kind in ('map', 'reduce'):
+        memory_mb = tier.get(kind + '_memory_mb')
+        if memory_mb:
+            settings.append(('mapreduce.{0}.memory.mb'.format(kind),
+                             memory_mb))
+            settings.append(('mapreduce.{0}.java.opts'.format(kind),
+                             '-Xmx{0}m'.format(
+                                 int(memory_mb * HEAP_FRACTION))))
+    if 'compress_output' in tier:
+        compress = bool(tier['compress_output'])
+        settings.append(('hive.exec.compress.output',
+                         'true' if compress else 'false'))
+        if compress:
+            settings.append(('mapreduce.output.fileoutputformat.compress.codec',
+                             rules.get('output_codec', DEFAULT_OUTPUT_CODEC)))
+    return settings
+
+
+def settings_to_hql(settings):
+    """Returns the SET statements for [(property, value)]."""
+    return ['SET {0}={1};'.format(name, value) for name, value in settings]
@@ -0,0 +1,274 @@
+"""
+HDFS clients used by the ETL steps.
+
+WebHdfsClient talks to the namenode REST api over keep-alive HTTP
+connections pooled per host (CREATE redirects to the datanodes), and
+caches the directory listings of the run. CliHdfsClient runs 'hdfs dfs'
+and is also the fallback when WebHDFS cannot be reached.
+
+Both clients return (lines, code) like the other hdfs helpers.
+
+The "webhdfs" section of the job configuration:
+
+  "webhdfs": {
+    "enabled": true,
+    "url": "http://namenode:9870",
+    "user": "hdfs",
+    "timeout": 60
+  }
+"""
+
+# System imports.
+from __future__ import print_function
+import json
+import os
+import socket
+import time
+
+try:
+    from http.client import HTTPConnection, HTTPException
+    from urllib.parse import quote, urlencode, urlparse
+except ImportError:  # Python 2
+    from httplib import HTTPConnection, HTTPException
+    from urllib import quote, urlencode
+    from urlparse import urlparse
+
+# Libs.
+from .cli_utils import capture_shell_command, execute_shell_command
+from .cli_utils import write_error, write_info
+from .cli_utils import EXIT_CODE_FAILURE, EXIT_CODE_SUCCESS
+
+# Version information.
+
+PROGRAM_VERSION = '1.0.0'
+
+WEBHDFS_PREFIX = '/webhdfs/v1'
+
+
+class WebHdfsError(Exception):
+    """A WebHDFS request failed (RemoteException or HTTP error)."""
+    pass
+
+
+def permission_string(octal):
+    """Returns 'rwxr-xr-x' for the WebHDFS permission '755'."""
+    bits = int(octal or '0', 8)
+    return ''.join(char if bits & (1 << (8 - idx)) else '-'
+                   for idx, char in enumerate('rwxrwxrwx'))
+
+
+def format_status_line(path, status):
+    """Formats a FileStatus like an 'hdfs dfs -ls' line."""
+    kind = 'd' if status['type'] == 'DIRECTORY' else '-'
+    modified = time.strftime('%Y-%m-%d %H:%M', time.localtime(
+        status.get('modificationTime', 0) / 1000.0))
+    return '{0}{1} {2:>3} {3} {4} {5:>10} {6} {7}'.format(
+        kind, permission_string(status.get('permission')),
+        status.get('replication', 0) or '-', status.get('owner', ''),
+        status.get('group', ''), status.get('length', 0), modified,
+        path.rstrip('/') + '/' + status['pathSuffix'])
+
+
+class ConnectionPool(object):
+    """Keep-alive HTTP connections reused per (host, port)."""
+
+    def __init__(self, timeout=60, max_idle=4):
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.idle = dict()
+
+    def get(self, host, port):
+        """Returns an idle connection or a new one."""
+        connections = self.idle.get((host, port))
+        if connections:
+            return connections.pop()
+        return HTTPConnection(host, port, timeout=self.timeout)
+
+    def release(self, host, port, connection):
+        """Returns a connection whose response was fully read."""
+        connections = self.idle.setdefault((host, port), [])
+        if len(connections) < self.max_idle:
+            connections.append(connection)
+        else:
+            connection.close()
+
+    def close(self):
+        """Closes all the idle connections."""
+        for connections in self.idle.values():
+            for connection in connections:
+                connection.close()
+        self.idle = dict()
+
+
+class CliHdfsClient(object):
+    """Runs the 'hdfs dfs' CLI (one JVM per call)."""
+
+    def ls(self, path):
+        """Returns the listing lines of an hdfs directory."""
+        results, code = capture_shell_command('hdfs dfs -ls "{0}"'.format(path))
+        return [x for x in results if x and not x.startswith('Found ')], code
+
+    def mkdirs(self, paths):
+        """Creates the directories (with parents) in one call."""
+        return execute_shell_command('hdfs dfs -mkdir -p {0}'.format(
+            ' '.join('"{0}"'.format(x) for x in paths)))
+
+    def put(self, local_files, hdfs_dir):
+        """Copies local files into an hdfs directory (overwriting)."""
+        return execute_shell_command('hdfs dfs -put -f {0} "{1}/"'.format(
+            ' '.join('"{0}"'.format(x) for x in local_files), hdfs_dir))
+
+    def close(self):
+        """Nothing to release."""
+        pass
+
+
+class WebHdfsClient(object):
+    """WebHDFS client with pooled connections and a listing cache."""
+
+    def __init__(self, url, user=None, timeout=60, fallback=None):
+        parsed = urlparse(url)
+        self.host = parsed.hostname
+        self.port = parsed.port or 80
+        self.user = user
+        self.pool = ConnectionPool(timeout)
+        self.fallback = fallback
+        self.unreachable = False
+        self.listings = dict()
+        self.requests = 0
+
+    def _request(self, method, path, operation, params=None, body=None,
+                 headers=None, host=None, port=None, full_path=None):
+        """Sends one request and returns (status, headers, data)."""
+        host, port = host or self.host, port or self.port
+        if full_path is None:
+            query = dict(params or {})
+            query['op'] = operation
+            if self.user:
+                query['user.name'] = self.user
+            full_path = '{0}{1}?{2}'.format(
+                WEBHDFS_PREFIX, quote(path), urlencode(sorted(query.items())))
+        connection = self.pool.get(host, port)
+        try:
+            connection.request(method, full_path, body=body,
+                               headers=headers or {})
+            response = connection.getresponse()
+            data = response.read()
+        except (socket.error, HTTPException):
+            connection.close()
+            raise
+        self.requests += 1
+        self.pool.release(host, port, connection)
+        if response.status >= 400:
+            raise WebHdfsError('{0} {1}: {2} {3}'.format(
+                operation, path, response.status,
+                data.decode('utf-8', 'replace')[:200]))
+        return response.status, dict(response.getheaders()), data
+
+    def _json(self, method, path, operation, params=None):
+        """Sends one request and returns the decoded json body."""
+        _, _, data = self._request(method, path, operation, params)
+        return json.loads(data.decode('utf-8')) if data else {}
+
+    def list_status(self, path, use_cache=True):
+        """Returns the FileStatus list of a directory (cached per run)."""
+        path = path.rstrip('/') or '/'
+        if use_cache and path in self.listings:
+            return self.listings[path]
+        result = self._json('GET', path, 'LISTSTATUS')
+        self.listings[path] = result['FileStatuses']['FileStatus']
+        return self.listings[path]
+
+    def _invalidate(self, path):
+        """Drops the cached listings of a path and its parent."""
+        path = path.rstrip('/') or '/'
+        self.listings.pop(path, None)
+        self.listings.pop(os.path.dirname(path), None)
+
+    def _upload(self, local_file, hdfs_file):
+        """Uploads one file following the namenode redirect."""
+        status, headers, _ = self._request(
+            'PUT', hdfs_file, 'CREATE', {'overwrite': 'true'})
+        location = dict((x.lower(), y) for x, y in headers.items()).get(
+            'location')
+        if status != 307 or not location:
+            raise WebHdfsError('CREATE {0}: expected a datanode redirect, '
+                               'got {1}'.format(hdfs_file, status))
+        target = urlparse(location)
+        full_path = target.path + ('?' + target.query
+                                   if target.query else '')
+        # The file object body is streamed by the connection.
+        with open(local_file, 'rb') as handle:
+            status, _, _ = self._request(
+                'PUT', hdfs_file, 'CREATE', body=handle,
+                headers={'Content-Length': str(os.path.getsize(local_file))},
+                host=target.hostname, port=target.port or 80,
+                full_path=full_path)
+        if status != 201:
+            raise WebHdfsError('CREATE {0}: datanode answered {1}, not '
+                               '201'.format(hdfs_file, status))
+
+    def _with_fallback(self, name, func, *args):
+        """Runs func, using the CLI client if WebHDFS is unreachable."""
+        if self.unreachable:
+            return getattr(self.fallback, name)(*args)
+        try:
+            return func(*args)
+        except (socket.error, HTTPException) as error:
+            if self.fallback is None:
+                write_error('WebHDFS {0} failed: {1}'.format(name, error))
+                return [], EXIT_CODE_FAILURE
+            write_info('WebHDFS unreachable ({0}), using hdfs dfs'.format(
+                error))
+            self.unreachable = True
+            return getattr(self.fallback, name)(*args)
+        except WebHdfsError as error:
+            write_error(str(error))
+            return [], EXIT_CODE_FAILURE
+
+    def ls(self, path):
+        """Returns the listing lines of an hdfs directory."""
+        def list_lines(path):
+            return [format_status_line(path, x)
+                    for x in self.list_status(path)], EXIT_CODE_SUCCESS
+        return self._with_fallback('ls', list_lines, path)
+
+    def mkdirs(self, paths):
+        """Creates the directories (with parents) over one connection."""
+        def make_dirs(paths):
+            for path in paths:
+                self._json('PUT', path, 'MKDIRS')
+                self._invalidate(path)
+            return [], EXIT_CODE_SUCCESS
+        return self._with_fallback('mkdirs', make_dirs, paths)
+
+    def put(self, local_files, hdfs_dir):
+        """Copies local files into an hdfs directory (overwriting)."""
+        # Checked first: a local OSError would pass for an unreachable
+        # WebHDFS (socket.error is OSError on python 3).
+        missing = [x for x in local_files if not os.path.isfile(x)]
+        if missing:
+            write_error('Local files not found: {0}'.format(
+                ', '.join(missing)))
+            return [], EXIT_CODE_FAILURE
+
+        def put_files(local_files, hdfs_dir):
+            for local_file in local_files:
+                self._upload(local_file, '{0}/{1}'.format(
+                    hdfs_dir.rstrip('/'), os.path.basename(local_file)))
+            self._invalidate(hdfs_dir)
+            return [], EXIT_CODE_SUCCESS
+        return self._with_fallback('put', put_files, local_files, hdfs_dir)
+
+    def close(self):
+        """Closes the pooled connections."""
+        self.pool.close()
+
+
+def make_hdfs_client(webhdfs_cfg):
+    """Returns the WebHDFS client when enabled else the CLI client."""
+    cli_client = CliHdfsClient()
+    if not webhdfs_cfg.get('enabled'):
+        return cli_client
+    return WebHdfsClient(webhdfs_cfg['url'], webhdfs_cfg.get('user'),
+                         webhdfs_cfg.get('timeout', 60), fallback=cli_client)
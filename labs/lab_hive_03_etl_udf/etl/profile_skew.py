@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""
+Skew Profiler - Finds heavy hitter keys before running Hive jobs.
+Version : {version}
+
+Description:
+    Streams a local dataset once with bounded memory (Misra-Gries plus
+    Count-Min sketches) and reports the most frequent values of a join or
+    partition key, their share of the rows and the skew ratio against an
+    even split over the reducers.
+
+    When the key is skewed it suggests hive.optimize.skewjoin and
+    SKEWED BY settings. --output saves them as json so the ETL can
+    inject them (see "skew_settings_file" in etc/config.json).
+
+
+Usage:
+  profile_skew.py csv --file=F --key=K [--header] [--delimiter=D] [options]
+  profile_skew.py nasa --file=F --key=K [options]
+
+
+Options:
+  -h --help                Shows this help.
+  --file=F                 Local file to be profiled.
+  --key=K                  Column name (header/nasa) or 0 based index.
+  --header                 The csv file has a header line.
+  --delimiter=D            Csv field delimiter [default: ,].
+  --top=N                  Number of heavy hitters to show [default: 10].
+  --counters=N             Misra-Gries counters [default: 256].
+  --reducers=N             Reducers used to compute the skew ratio [default: 10].
+  --max_ratio=R            Skew ratio above which settings are suggested [default: 2.0].
+  --output=OUT             Json file to save the suggested settings.
+
+Examples:
+
+  python profile_skew.py csv --file=../../lab_hive_02_win/data/trip_w78.csv --key=4
+
+  python profile_skew.py csv --file=../../lab_hive_01_hive/data/data_movies/ratings.csv --key=1
+
+  python profile_skew.py nasa --file=/shared/lab_c2/data/data_nasa/nasa_0701 --key=host
+
+"""
+from __future__ import print_function
+
+import csv
+import json
+import os
+import sys
+
+from libs.cli_utils import EXIT_CODE_FAILURE, EXIT_CODE_SUCCESS
+from libs.cli_utils import docopt_parse, write_info, write_plain, write_error
+from libs.nasa_utils import NasaRecord, page_sub_dir, read_nasa_records
+from libs.reader_utils import iter_lines
+from libs.sketch_utils import SkewProfile
+
+PROG_VERSION = '1.0.0'
+NASA_KEYS = list(NasaRecord._fields) + ['sub_dir']
+
+
+def csv_keys(file_name, key, header, delimiter):
+    """Yields the key column of each csv row."""
+    reader = csv.reader(iter_lines(file_name), delimiter=delimiter)
+    if header:
+        columns = next(reader)
+        index = columns.index(key) if key in columns else int(key)
+    else:
+        index = int(key)
+    for row in reader:
+        if len(row) > index:
+            yield row[index]
+
+
+def nasa_keys(file_name, key):
+    """Yields the key field of each well formed nasa log line."""
+    for _, record in read_nasa_records(file_name):
+        if record is None:
+            continue
+        if key == 'sub_dir':
+            yield page_sub_dir(record.page_url) or ''
+        else:
+            yield getattr(record, key)
+
+
+def suggest_settings(key, profile, reducers, max_ratio, top_n):
+    """Returns the Hive settings suggested for the profiled key."""
+    skew_ratio = profile.skew_ratio(reducers)
+    even_share = max(1, profile.rows // reducers)
+    skewed = [x for x in profile.top_keys(top_n) if x[1] > even_share]
+    suggestion = {
+        'column': key,
+        'rows': profile.rows,
+        'skew_ratio': round(skew_ratio, 3),
+        'skewed_keys': [x[0] for x in skewed],
+        'set': [],
+        'skewed_by': '',
+    }
+    if skew_ratio <= max_ratio or not skewed:
+        return suggestion
+    suggestion['set'] = [
+        'SET hive.optimize.skewjoin=true;',
+        'SET hive.skewjoin.key={0};'.format(even_share),
+        'SET hive.groupby.skewindata=true;',
+    ]
+    suggestion['skewed_by'] = "SKEWED BY ({0}) ON ({1}) STORED AS DIRECTORIES".format(
+        key, ', '.join("'{0}'".format(x[0].replace("'", "\\'"))
+                       for x in skewed))
+    return suggestion
+
+
+def main():
+    """Profiles the dataset and prints the report."""
+    _, arguments = docopt_parse(__doc__, PROG_VERSION)
+    file_name = arguments['--file']
+    key = arguments['--key']
+    if not os.path.exists(file_name):
+        write_error('File not found: {0}'.format(file_name))
+        return EXIT_CODE_FAILURE
+    if arguments['nasa']:
+        if key not in NASA_KEYS:
+            write_error('--key must be one of {0}'.format(', '.join(NASA_KEYS)))
+            return EXIT_CODE_FAILURE
+        keys = nasa_keys(file_name, key)
+    else:
+        keys = csv_keys(file_name, key, arguments['--header'],
+                        arguments['--delimiter'])
+    top_n = int(arguments['--top'])
+    reducers = int(arguments['--reducers'])
+    profile = SkewProfile(int(arguments['--counters']))
+    try:
+        for value in keys:
+            profile.add(value)
+    except ValueError:
+        write_error('Unknown column --key={0}'.format(key))
+        return EXIT_CODE_FAILURE
+    write_plain('Rows: {0}\n'.format(profile.rows))
+    write_plain('{0:<50} {1:>10} {2:>8}\n'.format('key', 'rows', 'share'))
+    for value, count, share in profile.top_keys(top_n):
+        write_plain('{0:<50} {1:>10} {2:>7.2%}\n'.format(value, count, share))
+    suggestion = suggest_settings(key, profile, reducers,
+                                  float(arguments['--max_ratio']), top_n)
+    write_plain('Skew ratio ({0} reducers): {1}\n'.format(
+        reducers, suggestion['skew_ratio']))
+    if suggestion['set']:
+        write_plain('Suggested settings:\n')
+        for line in suggestion['set']:
+            write_plain('  {0}\n'.format(line))
+        write_plain('  {0}\n'.format(suggestion['skewed_by']))
+    else:
+        write_plain('No skew handling needed.\n')
+    if arguments['--output']:
+        with open(arguments['--output'], 'w') as handle:
+            json.dump(suggestion, handle, indent=2)
+        write_info('Saved {0}'.format(arguments['--output']))
+    return EXIT_CODE_SUCCESS
+
+
+if __name__ == '__main__':
+    sys.exit(main())
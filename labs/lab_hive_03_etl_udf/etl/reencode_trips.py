@@ -0,0 +1,77 @@
+#!/usr/bin/env python
+"""
+Trip Re-encoder - Converts the quoted bike trip csv files for Hive.
+Version : {version}
+
+Description:
+    Streams the monthly trip csv files (one worker per file) and writes
+    tab delimited, backslash escaped files with typed values that
+    LazySimpleSerDe reads without OpenCSVSerde. Derived columns are
+    computed once: start_epoch, end_epoch, start_hour (what the hour_slot
+    macro of ex_11 extracts with SUBSTRING) and start_date.
+
+    It also writes the DDL of the matching external table.
+
+
+Usage:
+  reencode_trips.py --output_dir=DIR [options] FILE...
+
+
+Options:
+  -h --help                Shows this help.
+  --output_dir=DIR         Local directory receiving one .tsv per file.
+  --processes=N            Worker processes (defaults to the cpu count).
+  --table=TB               Table name of the DDL [default: bike_rides_typed].
+  --location=LOC           Hdfs location of the table [default: /data/bike_rides_typed].
+  --ddl=FILE               Write the DDL to this file instead of stdout.
+
+Examples:
+
+  python reencode_trips.py --output_dir=/tmp/trips ../../lab_hive_02_win/data/trip_w78.csv
+
+  hdfs dfs -mkdir -p /data/bike_rides_typed
+  hdfs dfs -put -f /tmp/trips/*.tsv /data/bike_rides_typed/
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from libs.cli_utils import EXIT_CODE_FAILURE, EXIT_CODE_SUCCESS
+from libs.cli_utils import docopt_parse, write_info, write_plain, write_error
+from libs.cli_utils import write_txt_file
+from libs.trip_utils import reencode_trip_files, trip_table_ddl
+
+PROG_VERSION = '1.0.0'
+
+
+def main():
+    """Re-encodes the trip files and prints the table DDL."""
+    _, arguments = docopt_parse(__doc__, PROG_VERSION)
+    input_files = arguments['FILE']
+    missing = [x for x in input_files if not os.path.exists(x)]
+    if missing:
+        write_error('File not found: {0}'.format(', '.join(missing)))
+        return EXIT_CODE_FAILURE
+    processes = arguments['--processes']
+    start = time.time()
+    results = reencode_trip_files(input_files, arguments['--output_dir'],
+                                  int(processes) if processes else None)
+    for file_name, rows, rejected in results:
+        write_info('{0}: {1} rows, {2} rejected'.format(
+            file_name, rows, rejected))
+    write_info('Re-encoded {0} rows in {1:.2f}s'.format(
+        sum(x[1] for x in results), time.time() - start))
+    ddl = trip_table_ddl(arguments['--table'], arguments['--location'])
+    if arguments['--ddl']:
+        write_txt_file(arguments['--ddl'], ddl)
+        write_info('Saved {0}'.format(arguments['--ddl']))
+    else:
+        write_plain(ddl)
+    return EXIT_CODE_SUCCESS
+
+
+if __name__ == '__main__':
+    sys.exit(main())
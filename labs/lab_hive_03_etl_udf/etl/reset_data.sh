@@ -8,7 +8,7 @@ CREATE TABLE nasa_daily (
    host STRING,   
    request_time STRING,  
    page_url STRING,
-   error_cide STRING,
+   error_code STRING,
    page_size STRING)
  PARTITIONED BY (dt_date STRING)
  STORED AS TEXTFILE;
@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+"""
+Sessionize - Per host sessions of a nasa log in one streaming pass.
+Version : {version}
+
+Description:
+    Runs the sessionizer of the ETL ingest pass alone over a local file
+    and reports the sessions, the open sessions high-water mark, the peak
+    resident memory and the throughput. Use it to size max_open_sessions
+    of the "sessions" configuration section.
+
+
+Usage:
+  sessionize.py --file=F [options]
+
+
+Options:
+  -h --help                Shows this help.
+  --file=F                 Local nasa log (plain, .gz or .bz2).
+  --gap_minutes=N          Inactivity gap closing a session [default: 30].
+  --max_open=N             Open sessions kept in memory [default: 100000].
+  --output=OUT             Session tsv file [default: /tmp/nasa_sessions.tsv].
+  --report=REP             Json file to save the report.
+
+Examples:
+
+  python sessionize.py --file=/shared/lab_c2/data/data_nasa/nasa_0701
+
+  python sessionize.py --file=nasa_0701 --max_open=1000 --report=sessions.json
+
+"""
+from __future__ import print_function
+
+import json
+import os
+import sys
+
+from libs.cli_utils import EXIT_CODE_FAILURE, EXIT_CODE_SUCCESS
+from libs.cli_utils import docopt_parse, write_info, write_error
+from libs.nasa_utils import read_nasa_records
+from libs.session_utils import Sessionizer
+
+PROG_VERSION = '1.0.0'
+
+
+def main():
+    """Sessionizes the file and prints the report."""
+    _, arguments = docopt_parse(__doc__, PROG_VERSION)
+    if not os.path.exists(arguments['--file']):
+        write_error('File not found: {0}'.format(arguments['--file']))
+        return EXIT_CODE_FAILURE
+    sessionizer = Sessionizer(arguments['--output'],
+                              int(float(arguments['--gap_minutes']) * 60),
+                              int(arguments['--max_open']))
+    try:
+        for line, record in read_nasa_records(arguments['--file']):
+            sessionizer.add(line, record)
+    finally:
+        report = sessionizer.close()
+    write_info('Saved {0}'.format(arguments['--output']))
+    if arguments['--report']:
+        with open(arguments['--report'], 'w') as handle:
+            json.dump(report, handle, indent=2, sort_keys=True)
+        write_info('Saved {0}'.format(arguments['--report']))
+    return EXIT_CODE_SUCCESS
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,13 @@
+"""
+Puts the etl directory and the bundled libs on the path of the tests.
+"""
+
+# System imports.
+import os
+import sys
+
+ETL_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+for path in (os.path.join(ETL_DIR, 'libs'), ETL_DIR):
+    if path not in sys.path:
+        sys.path.insert(0, path)
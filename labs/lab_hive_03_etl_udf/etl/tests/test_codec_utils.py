@@ -0,0 +1,73 @@
+"""
+Tests of the output codec measurements.
+"""
+
+# System imports.
+import os
+import shutil
+import tempfile
+import unittest
+
+# Libs.
+from libs.codec_utils import BZIP2_CODEC, GZIP_CODEC, codec_settings
+from libs.codec_utils import codec_table, generated_sample, measure_codecs
+from libs.codec_utils import recommend_codec, sample_file, scan
+
+
+class CodecTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.data = generated_sample(20000)
+        cls.results = measure_codecs(cls.data, repeat=1)
+
+    def test_codecs_round_trip(self):
+        rows = scan(self.data)
+        self.assertGreater(rows, 100)
+        for _, compress, decompress, _, _, _ in codec_table():
+            self.assertEqual(decompress(compress(self.data)), self.data)
+        by_name = dict((x['codec'], x) for x in self.results)
+        self.assertEqual(by_name['none']['ratio'], 1.0)
+        self.assertGreater(by_name['gzip-9']['ratio'], 2.0)
+        self.assertFalse(by_name['gzip-6']['splittable'])
+        self.assertTrue(by_name['bz2']['splittable'])
+
+    def test_recommendation_is_splittable(self):
+        for objective in ('scan', 'storage', 'balanced'):
+            result = recommend_codec(self.results, objective)
+            self.assertTrue(result['splittable'])
+            self.assertIn(result['hadoop_codec'], (None, BZIP2_CODEC))
+        result = recommend_codec(self.results, 'storage',
+                                 allow_unsplittable=True)
+        self.assertTrue(result['hadoop_codec'] in (GZIP_CODEC, BZIP2_CODEC))
+
+    def test_codec_settings(self):
+        by_name = dict((x['codec'], x) for x in self.results)
+        self.assertEqual(codec_settings(by_name['none']),
+                         ['SET hive.exec.compress.output=false;'])
+        self.assertEqual(codec_settings(by_name['gzip-1']), [
+            'SET hive.exec.compress.output=true;',
+            'SET mapreduce.output.fileoutputformat.compress.codec={0};'
+            .format(GZIP_CODEC),
+            'SET zlib.compress.level=BEST_SPEED;'])
+        self.assertEqual(len(codec_settings(by_name['bz2'])), 2)
+
+
+class SampleFileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_whole_lines(self):
+        file_name = os.path.join(self.tmp_dir, 'nasa_0701')
+        with open(file_name, 'w') as handle:
+            handle.write('aaaa\nbbbb\ncccc\n')
+        self.assertEqual(sample_file(file_name, 7), b'aaaa\nbbbb\n')
+        self.assertEqual(sample_file(file_name, 100), b'aaaa\nbbbb\ncccc\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
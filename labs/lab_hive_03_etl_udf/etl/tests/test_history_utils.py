@@ -0,0 +1,67 @@
+"""
+Tests of the run history store.
+"""
+
+# System imports.
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+# Libs.
+from libs.history_utils import RunHistory, correlation, mean_std
+from libs.history_utils import percentile
+
+
+class StatisticsTest(unittest.TestCase):
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 0.50), 50)
+        self.assertEqual(percentile(values, 0.99), 99)
+        self.assertEqual(percentile([7], 0.90), 7)
+        self.assertIsNone(percentile([], 0.50))
+
+    def test_mean_std_and_correlation(self):
+        self.assertEqual(mean_std([2, 4, 4, 4, 5, 5, 7, 9]), (5.0, 2.0))
+        self.assertAlmostEqual(correlation([(1, 2), (2, 4), (3, 6)]), 1.0)
+        self.assertIsNone(correlation([(1, 2), (1, 3)]))
+        self.assertIsNone(correlation([(1, 2)]))
+
+
+class RunHistoryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.db_file = os.path.join(self.tmp_dir, 'history', 'runs.db')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def record(self, history, dt_date, duration, exit_code=0):
+        history.start_run('nasa', dt_date)
+        history.record_step('step_02_load_hdfs_file',
+                            time.time() - duration, exit_code,
+                            input_bytes=int(duration * 1000))
+        history.finish_run(exit_code)
+
+    def test_step_report(self):
+        history = RunHistory(self.db_file)
+        for idx in range(20):
+            self.record(history, '1995-07-01', 10 + idx % 2)
+        self.record(history, '1995-07-02', 60)
+        self.record(history, '1995-07-03', 5, exit_code=1)
+        # A reopened database keeps the runs.
+        report = RunHistory(self.db_file).step_report(sigma=3.0)
+        self.assertEqual(len(report), 1)
+        item = report[0]
+        self.assertEqual((item['runs'], item['failures']), (22, 1))
+        self.assertEqual(round(item['p50']), 11)
+        self.assertAlmostEqual(item['size_correlation'], 1.0, places=3)
+        self.assertEqual([x[1] for x in item['outliers']], ['1995-07-02'])
+        self.assertEqual(history.step_report(step='other'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
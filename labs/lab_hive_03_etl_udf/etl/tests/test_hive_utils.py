@@ -0,0 +1,130 @@
+"""
+Tests of the hive output parsing.
+"""
+
+# System imports.
+import unittest
+
+# Libs.
+from libs.hive_utils import (HiveCounters, hive_string, merge_counters,
+                             parse_byte_count)
+
+
+class HiveCountersTest(unittest.TestCase):
+
+    def feed(self, lines):
+        counters = HiveCounters()
+        for line in lines:
+            counters.feed(line)
+        return counters
+
+    def test_mapreduce_stage(self):
+        counters = self.feed([
+            'MapReduce Jobs Launched: ',
+            'Stage-Stage-1: Map: 3  Reduce: 1   Cumulative CPU: 12.34 sec   '
+            'HDFS Read: 205242476 HDFS Write: 160134 SUCCESS',
+            'Time taken: 1.5 seconds',
+            'Time taken: 0.25 seconds',
+        ])
+        result = counters.as_dict()
+        self.assertEqual(result['stages'], 1)
+        self.assertEqual(result['mappers'], 3)
+        self.assertEqual(result['reducers'], 1)
+        self.assertEqual(result['cpu_ms'], 12340)
+        self.assertEqual(result['hdfs_read'], 205242476)
+        self.assertEqual(result['hdfs_write'], 160134)
+        self.assertEqual(result['time_taken'], 1.75)
+        self.assertEqual(result['stage_counters'][0]['status'], 'SUCCESS')
+        self.assertFalse(counters.missing_stages())
+
+    def test_hive3_erasure_coding_counters(self):
+        counters = self.feed([
+            'Stage-Stage-1: Map: 1   Cumulative CPU: 2.5 sec   HDFS Read: 10 '
+            'HDFS Write: 20 HDFS EC Read: 0 SUCCESS',
+            'Job 0: Map: 2  Reduce: 1  HDFS Read: 5 HDFS Write: 0 FAIL',
+        ])
+        stages = counters.as_dict()['stage_counters']
+        self.assertEqual([x['status'] for x in stages], ['SUCCESS', 'FAIL'])
+        self.assertEqual([x['hdfs_write'] for x in stages], [20, 0])
+        self.assertEqual(stages[1]['stage'], 'Job 0')
+
+    def test_tez_summary(self):
+        counters = self.feed([
+            'INFO  : Status: Running (Executing on YARN cluster with App id '
+            'application_1_0001)',
+            'INFO  : Map 1: 0/3\tReducer 2: 0/1',
+            'INFO  : Map 1: 3/3\tReducer 2: 1/1',
+            'INFO  : Status: DAG finished successfully in 3.21 seconds',
+            'INFO  : Task Execution Summary',
+            'INFO  : VERTICES  DURATION(ms)  CPU_TIME(ms)  GC_TIME(ms)  '
+            'INPUT_RECORDS  OUTPUT_RECORDS',
+            'INFO  :    Map 1       2,010.00         4,520          110'
+            '        1,891,715              12',
+            'INFO  : Reducer 2        531.00           780           10'
+            '               12               1',
+            'INFO  : FileSystem Counters Summary',
+            'INFO  : Scheme: FILE',
+            'INFO  :    Map 1         0B      0      0      0B      0',
+            'INFO  : Scheme: HDFS',
+            'INFO  : VERTICES  BYTES_READ  READ_OPS  LARGE_READ_OPS  '
+            'BYTES_WRITTEN  WRITE_OPS',
+            'INFO  :    Map 1    195.74MB      6      0      0B      0',
+            'INFO  : Reducer 2        0B      0      0   1.5KB      2',
+            'Time taken: 4.0 seconds',
+        ])
+        result = counters.as_dict()
+        self.assertEqual(result['stages'], 2)
+        self.assertEqual(result['mappers'], 3)
+        self.assertEqual(result['reducers'], 1)
+        self.assertEqual(result['cpu_ms'], 5300)
+        self.assertEqual(result['hdfs_read'],
+                         int(round(195.74 * 1024 ** 2)))
+        self.assertEqual(result['hdfs_write'], 1536)
+        self.assertEqual(result['uncounted'], 0)
+
+    def test_tez_inplace_status(self):
+        counters = self.feed([
+            'Status: Running (Executing on YARN cluster with App id '
+            'application_1_0002)',
+            'Map 1 .......... container     SUCCEEDED      4          4'
+            '        0        0       0       0',
+            'Reducer 2 ...... container        FAILED      2          0'
+            '        0        2       1       0',
+        ])
+        stages = counters.as_dict()['stage_counters']
+        self.assertEqual([x['stage'] for x in stages], ['Map 1', 'Reducer 2'])
+        self.assertEqual([x['status'] for x in stages], ['SUCCESS', 'FAIL'])
+        self.assertEqual(stages[0]['mappers'], 4)
+        self.assertEqual(stages[1]['reducers'], 2)
+
+    def test_missing_counters_are_counted(self):
+        counters = self.feed([
+            'Launching Job 1 out of 1',
+            'Time taken: 4.0 seconds',
+        ])
+        self.assertTrue(counters.missing_stages())
+        self.assertEqual(counters.as_dict()['uncounted'], 1)
+        self.assertFalse(self.feed(['OK', 'Time taken: 0.1 seconds'])
+                         .missing_stages())
+        merged = merge_counters([counters.as_dict(),
+                                 self.feed(['OK']).as_dict()])
+        self.assertEqual(merged['queries'], 2)
+        self.assertEqual(merged['uncounted'], 1)
+
+    def test_parse_byte_count(self):
+        self.assertEqual(parse_byte_count('0B'), 0)
+        self.assertEqual(parse_byte_count('512B'), 512)
+        self.assertEqual(parse_byte_count('2KB'), 2048)
+        self.assertEqual(parse_byte_count('1.5GB'), 3 * 1024 ** 3 // 2)
+
+
+class HiveStringTest(unittest.TestCase):
+
+    def test_quotes_and_backslashes(self):
+        self.assertEqual(hive_string("it's"), "'it\\'s'")
+        self.assertEqual(hive_string('end\\'), "'end\\\\'")
+        self.assertEqual(hive_string(r'\s+'), r"'\\s+'")
+
+
+if __name__ == '__main__':
+    unittest.main()
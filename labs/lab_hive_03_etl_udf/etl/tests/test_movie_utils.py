@@ -0,0 +1,88 @@
+"""
+Tests of the incremental movie rating aggregates.
+"""
+
+# System imports.
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+# Libs.
+from libs.movie_utils import MovieRatings, hive_round
+
+HEADER = 'userId,movieId,rating,timestamp\n'
+
+
+class MovieRatingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.batch = os.path.join(self.tmp_dir, 'ratings.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def append(self, text, file_name=None):
+        with open(file_name or self.batch, 'a') as handle:
+            handle.write(text)
+
+    def test_appended_lines_are_folded_once(self):
+        ratings = MovieRatings()
+        self.append(HEADER + '1,10,4.0,0\n1,20,3.0,0\n')
+        self.assertEqual(ratings.add_file(self.batch), 2)
+        self.assertIsNone(ratings.add_file(self.batch))
+        self.append('2,10,5.0,0\n')
+        self.assertEqual(ratings.add_file(self.batch), 1)
+        self.assertEqual(ratings.counts, {10: 2, 20: 1})
+        self.assertEqual(ratings.sums[10], 9.0)
+
+    def test_partial_line_waits(self):
+        ratings = MovieRatings()
+        self.append(HEADER + '1,10,4.0,0\n2,10,3')
+        self.assertEqual(ratings.add_file(self.batch), 1)
+        self.append('.5,0\n')
+        self.assertEqual(ratings.add_file(self.batch), 1)
+        self.assertEqual(ratings.sums[10], 7.5)
+
+    def test_snapshot_resumes(self):
+        ratings = MovieRatings()
+        self.append(HEADER + '1,10,4.0,0\n')
+        ratings.add_file(self.batch)
+        snapshot = os.path.join(self.tmp_dir, 'state', 'movies.json')
+        ratings.save(snapshot)
+        self.append('1,20,2.0,0\n')
+        ratings = MovieRatings.load(snapshot)
+        self.assertEqual(ratings.add_file(self.batch), 1)
+        self.assertEqual(ratings.counts, {10: 1, 20: 1})
+
+    def test_gzip_batch(self):
+        ratings = MovieRatings()
+        batch = os.path.join(self.tmp_dir, 'ratings.csv.gz')
+        with gzip.open(batch, 'wb') as handle:
+            handle.write((HEADER + '1,10,4.0,0\n').encode('utf-8'))
+        self.assertEqual(ratings.add_file(batch), 1)
+        self.assertIsNone(ratings.add_file(batch))
+
+    def test_rewritten_batch(self):
+        ratings = MovieRatings()
+        self.append(HEADER + '1,10,4.0,0\n')
+        ratings.add_file(self.batch)
+        with open(self.batch, 'w') as handle:
+            handle.write('1,10,4.0,0\n')
+        self.assertRaises(ValueError, ratings.add_file, self.batch)
+
+    def test_top(self):
+        ratings = MovieRatings()
+        for movie_id, rating in [(1, 4.0), (1, 5.0), (2, 5.0), (3, 1.0),
+                                 (3, 2.0), (3, 2.0)]:
+            ratings.add(movie_id, rating)
+        self.assertEqual([x[0] for x in ratings.top(2, 'count')], [3, 1])
+        self.assertEqual([x[0] for x in ratings.top(2, 'avg')], [2, 1])
+        self.assertEqual(ratings.top(1, 'avg', min_ratings=3)[0][3], 1.6667)
+        self.assertEqual(hive_round(0.00005), 0.0001)
+
+
+if __name__ == '__main__':
+    unittest.main()
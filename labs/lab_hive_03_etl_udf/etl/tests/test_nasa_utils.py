@@ -0,0 +1,129 @@
+"""
+Tests of the nasa log parsing.
+"""
+
+# System imports.
+import os
+import re
+import shutil
+import tempfile
+import unittest
+
+# Libs.
+from libs.nasa_utils import DailyRollups, LineSampler, NASA_SERDE_REGEX
+from libs.nasa_utils import page_bytes
+from libs.nasa_utils import daily_value, page_sub_dir
+from libs.nasa_utils import parse_nasa_line
+
+LINE = ('199.72.81.55 - - [01/Jul/1995:00:00:01 -0400] '
+        '"GET /history/apollo/ HTTP/1.0" 200 6245')
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_valid_line(self):
+        record = parse_nasa_line(LINE)
+        self.assertEqual(tuple(record), (
+            '199.72.81.55', '01/Jul/1995:00:00:01', 'GET',
+            '/history/apollo/', '200', '6245'))
+
+    def test_malformed_lines(self):
+        for line in ['', 'garbage', LINE.replace('[', ''),
+                     LINE.replace(' 6245', '')]:
+            self.assertIsNone(parse_nasa_line(line))
+
+    def test_request_without_url(self):
+        record = parse_nasa_line(LINE.replace('GET /history/apollo/ '
+                                              'HTTP/1.0', 'GET'))
+        self.assertEqual((record.method, record.page_url), ('GET', ''))
+
+    def test_page_fields(self):
+        self.assertEqual(page_bytes('6245'), 6245)
+        self.assertEqual(page_bytes('-'), 0)
+        self.assertEqual(page_sub_dir('/history/apollo/'), 'history')
+        self.assertIsNone(page_sub_dir(''))
+
+    def test_daily_value(self):
+        record = parse_nasa_line(LINE.replace('"GET', '"POST'))
+        self.assertEqual(daily_value(record, 'page_url'), '')
+        self.assertEqual(daily_value(record, 'host'), '199.72.81.55')
+        self.assertEqual(daily_value(parse_nasa_line(LINE), 'page_url'),
+                         '/history/apollo/')
+
+
+class SerdeRegexTest(unittest.TestCase):
+
+    def groups(self, line):
+        # RegexSerDe requires the pattern to match the whole line.
+        match = re.match(NASA_SERDE_REGEX, line)
+        self.assertIsNotNone(match)
+        self.assertEqual(match.end(), len(line))
+        return match.groups()
+
+    def test_matches_the_parser(self):
+        self.assertEqual(self.groups(LINE), tuple(parse_nasa_line(LINE)))
+
+    def test_request_without_url(self):
+        self.assertEqual(self.groups(LINE.replace(
+            'GET /history/apollo/ HTTP/1.0', 'GET')), (
+                '199.72.81.55', '01/Jul/1995:00:00:01', None, None, '200',
+                '6245'))
+
+
+class RollupsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_write(self):
+        rollups = DailyRollups()
+        for line in [LINE, LINE.replace('200 6245', '404 -'), 'broken']:
+            rollups.add(line, parse_nasa_line(line))
+        files = rollups.write(os.path.join(self.tmp_dir, 'rollups'))
+        self.assertEqual(sorted(files), sorted(DailyRollups.TABLES))
+        with open(files['nasa_rollup_status']) as handle:
+            self.assertEqual(handle.read(), '200\t1\n404\t1\n')
+        with open(files['nasa_rollup_host_bytes']) as handle:
+            self.assertEqual(handle.read(), '199.72.81.55\t2\t6245\n')
+        self.assertEqual((rollups.rows, rollups.malformed), (2, 1))
+
+
+class SamplerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def sample(self, fraction, lines):
+        sampler = LineSampler(os.path.join(self.tmp_dir, 'sample', 'nasa'),
+                              fraction)
+        for line in lines:
+            sampler.add(line, None)
+        sampler.close()
+        with open(sampler.output_file) as handle:
+            return sampler, handle.read().splitlines()
+
+    def test_deterministic_sample(self):
+        lines = ['line {0}'.format(x) for x in range(2000)]
+        sampler, kept = self.sample(0.1, lines)
+        self.assertEqual(self.sample(0.1, lines)[1], kept)
+        self.assertEqual(sampler.kept, len(kept))
+        self.assertTrue(100 < sampler.kept < 300)
+        self.assertTrue(set(kept) <= set(lines))
+
+    def test_scale_ratio_uses_the_exact_row_count(self):
+        lines = ['line {0}'.format(x) for x in range(2000)]
+        sampler = self.sample(0.1, lines)[0]
+        self.assertEqual(sampler.rows, 2000)
+        self.assertAlmostEqual(sampler.scale_ratio(), 2000.0 / sampler.kept)
+        self.assertEqual(sampler.estimated_count(sampler.kept), 2000)
+        self.assertIsNone(self.sample(0.1, [])[0].scale_ratio())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,81 @@
+"""
+Tests of the file lock based run queue.
+"""
+
+# System imports.
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+# Libs.
+from libs.queue_utils import RunQueue
+
+
+class RunQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_returns_the_exit_code(self):
+        queue = RunQueue(self.tmp_dir, poll_seconds=0.01)
+        self.assertEqual(queue.run('nasa_1995-07-01', lambda: 3), 3)
+        self.assertEqual(queue._read_result('nasa_1995-07-01')['exit_code'],
+                         3)
+
+    def test_identical_keys_coalesce(self):
+        queue = RunQueue(self.tmp_dir, poll_seconds=0.01)
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def slow():
+            calls.append('slow')
+            started.set()
+            release.wait(10)
+            return 0
+
+        def fast():
+            calls.append('fast')
+            return 1
+
+        first = threading.Thread(
+            target=lambda: results.append(queue.run('key', slow)))
+        first.start()
+        started.wait(10)
+        second = threading.Thread(
+            target=lambda: results.append(queue.run('key', fast)))
+        second.start()
+        time.sleep(0.1)
+        release.set()
+        first.join(10)
+        second.join(10)
+        self.assertEqual(calls, ['slow'])
+        self.assertEqual(results, [0, 0])
+
+    def test_concurrency_limit(self):
+        queue = RunQueue(self.tmp_dir, max_concurrency=1, poll_seconds=0.01)
+        running, peak = [], []
+
+        def func():
+            running.append(1)
+            peak.append(len(running))
+            time.sleep(0.05)
+            running.pop()
+            return 0
+
+        threads = [threading.Thread(target=queue.run,
+                                    args=('key{0}'.format(x), func))
+                   for x in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(10)
+        self.assertEqual(peak, [1, 1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+"""
+Tests of the local line readers.
+"""
+
+# System imports.
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+# Libs.
+from libs import reader_utils
+from libs.reader_utils import iter_lines, iter_range_lines, map_file_lines
+from libs.reader_utils import split_ranges
+
+LINES = [u'line {0} {1}'.format(x, u'\u00e9' * (x % 7)) for x in range(500)]
+
+
+class ReaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.tmp_dir, 'nasa_0701')
+        # The last line has no line feed.
+        with io.open(self.file_name, 'w', encoding='utf-8') as handle:
+            handle.write(u'\n'.join(LINES))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_iter_lines(self):
+        self.assertEqual(list(iter_lines(self.file_name)), LINES)
+        gz_file = self.file_name + '.gz'
+        with gzip.open(gz_file, 'wb') as handle:
+            handle.write(u'\n'.join(LINES).encode('utf-8'))
+        self.assertEqual(list(iter_lines(gz_file)), LINES)
+
+    def test_ranges_cover_every_line_once(self):
+        size = os.path.getsize(self.file_name)
+        for num_ranges in (1, 2, 3, 7, 5000):
+            ranges = split_ranges(self.file_name, num_ranges)
+            self.assertEqual(ranges[0][0], 0)
+            self.assertEqual(ranges[-1][1], size)
+            self.assertTrue(all(x[1] == y[0]
+                                for x, y in zip(ranges, ranges[1:])))
+            lines = []
+            for start, end in ranges:
+                lines.extend(iter_range_lines(self.file_name, start, end))
+            self.assertEqual(lines, LINES)
+
+    def test_small_blocks_keep_multi_byte_characters(self):
+        block_bytes = reader_utils.READ_BLOCK_BYTES
+        reader_utils.READ_BLOCK_BYTES = 5
+        try:
+            self.assertEqual(list(iter_range_lines(
+                self.file_name, 0, os.path.getsize(self.file_name))), LINES)
+        finally:
+            reader_utils.READ_BLOCK_BYTES = block_bytes
+
+    def test_map_file_lines(self):
+        results = map_file_lines(self.file_name, list, processes=3)
+        self.assertEqual(len(results), 3)
+        self.assertEqual(sum(results, []), LINES)
+
+    def test_empty_file(self):
+        empty_file = os.path.join(self.tmp_dir, 'empty')
+        open(empty_file, 'w').close()
+        self.assertEqual(split_ranges(empty_file, 2), [])
+        self.assertEqual(list(iter_lines(empty_file)), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+"""
+Tests of the streaming sessionization.
+"""
+
+# System imports.
+import os
+import shutil
+import tempfile
+import unittest
+
+# Libs.
+from libs.nasa_utils import parse_nasa_line
+from libs.session_utils import RequestClock, Sessionizer, format_epoch
+
+LINE_TPL = ('{0} - - [01/Jul/1995:{1} -0400] "GET {2} HTTP/1.0" {3} {4}')
+
+
+class ClockTest(unittest.TestCase):
+
+    def test_epoch(self):
+        clock = RequestClock()
+        seconds = clock.epoch('01/Jul/1995:01:02:03')
+        self.assertEqual(format_epoch(seconds), '1995-07-01 01:02:03')
+        self.assertEqual(clock.epoch('01/Jul/1995:01:02:04'), seconds + 1)
+        self.assertIsNone(clock.epoch('01/Foo/1995:01:02:03'))
+        self.assertIsNone(clock.epoch('garbage'))
+
+
+class SessionizerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.output_file = os.path.join(self.tmp_dir, 'out', 'sessions.tsv')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def sessionize(self, requests, **kwargs):
+        sessionizer = Sessionizer(self.output_file, **kwargs)
+        for request in requests:
+            line = LINE_TPL.format(*request)
+            sessionizer.add(line, parse_nasa_line(line))
+        sessionizer.add('broken', None)
+        report = sessionizer.close()
+        with open(self.output_file) as handle:
+            rows = [x.rstrip('\n').split('\t') for x in handle]
+        return report, sorted(rows)
+
+    def test_gap_splits_sessions(self):
+        report, rows = self.sessionize([
+            ('a', '00:00:00', '/1', 200, 100),
+            ('b', '00:10:00', '/x', 404, '-'),
+            ('a', '00:20:00', '/2', 200, 50),
+            ('a', '01:00:00', '/3', 500, 10),
+        ], gap_seconds=1800)
+        self.assertEqual((report['rows'], report['malformed']), (4, 1))
+        self.assertEqual(report['sessions'], 3)
+        self.assertEqual(rows, [
+            ['a', '1995-07-01 00:00:00', '1995-07-01 00:20:00', '1200', '2',
+             '150', '/1', '/2', '0'],
+            ['a', '1995-07-01 01:00:00', '1995-07-01 01:00:00', '0', '1',
+             '10', '/3', '/3', '1'],
+            ['b', '1995-07-01 00:10:00', '1995-07-01 00:10:00', '0', '1',
+             '0', '/x', '/x', '1'],
+        ])
+
+    def test_max_open_forces_evictions(self):
+        requests = [('h{0}'.format(x), '00:00:{0:02d}'.format(x), '/', 200,
+                     1) for x in range(10)]
+        report, rows = self.sessionize(requests, max_open=4)
+        self.assertEqual(report['peak_open_sessions'], 4)
+        self.assertEqual(report['forced_evictions'], 6)
+        self.assertEqual(len(rows), 10)
+
+
+if __name__ == '__main__':
+    unittest.main()
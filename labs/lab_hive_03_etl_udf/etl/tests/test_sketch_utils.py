@@ -0,0 +1,148 @@
+"""
+Tests of the streaming sketches.
+"""
+
+# System imports.
+import unittest
+
+# Libs.
+from libs.nasa_utils import parse_nasa_line
+from libs.sketch_utils import BloomFilter, CountMinSketch, HostUrlBloom
+from libs.sketch_utils import HyperLogLog, MisraGries, SkewProfile
+from libs.sketch_utils import bloom_candidate_dates, host_url_key
+from libs.sketch_utils import ColumnSketches, merge_sketch_lines
+
+LINE = ('199.72.81.55 - - [01/Jul/1995:00:00:01 -0400] '
+        '"GET /history/apollo/ HTTP/1.0" 200 6245')
+
+
+class HeavyHittersTest(unittest.TestCase):
+
+    def keys(self):
+        # 'hot' is 40% of the rows, the rest is spread over 600 keys.
+        return ['hot' if idx % 5 < 2 else 'k{0}'.format(idx % 600)
+                for idx in range(6000)]
+
+    def test_misra_gries_keeps_heavy_keys(self):
+        summary = MisraGries(10)
+        for key in self.keys():
+            summary.add(key)
+        self.assertIn('hot', summary.candidates())
+        self.assertLessEqual(len(summary.candidates()), 10)
+        self.assertGreaterEqual(summary.counters['hot'],
+                                2400 - 6000 // 11)
+
+    def test_count_min_never_under_counts(self):
+        sketch = CountMinSketch(width=64, depth=4)
+        counts = dict()
+        for key in self.keys():
+            sketch.add(key)
+            counts[key] = counts.get(key, 0) + 1
+        for key, count in counts.items():
+            self.assertGreaterEqual(sketch.estimate(key), count)
+        self.assertLessEqual(sketch.estimate('hot'),
+                             2400 + 2 * 6000 // 64)
+
+    def test_skew_profile(self):
+        profile = SkewProfile(num_counters=16, width=512)
+        for key in self.keys():
+            profile.add(key)
+        key, count, share = profile.top_keys(1)[0]
+        self.assertEqual(key, 'hot')
+        self.assertAlmostEqual(share, 0.4, places=1)
+        self.assertAlmostEqual(profile.skew_ratio(10), 4.0, places=0)
+
+
+class HyperLogLogTest(unittest.TestCase):
+
+    def test_count_within_error(self):
+        sketch = HyperLogLog(10)
+        for idx in range(40000):
+            sketch.add('host{0}'.format(idx % 20000))
+        self.assertLess(abs(sketch.count() - 20000),
+                        3 * sketch.error_bound() * 20000)
+
+    def test_small_cardinality(self):
+        sketch = HyperLogLog()
+        self.assertEqual(sketch.count(), 0)
+        for key in ('a', 'b', 'c', 'a'):
+            sketch.add(key)
+        self.assertEqual(sketch.count(), 3)
+
+    def test_merge_is_union(self):
+        first, second = HyperLogLog(10), HyperLogLog(10)
+        union = HyperLogLog(10)
+        for idx in range(3000):
+            (first if idx < 2000 else second).add(str(idx))
+            union.add(str(idx))
+        second.add('0')
+        first.merge(second)
+        self.assertEqual(first.registers, union.registers)
+        self.assertRaises(ValueError, first.merge, HyperLogLog(11))
+
+    def test_text_round_trip(self):
+        sketch = HyperLogLog(8)
+        sketch.add('x')
+        copy = HyperLogLog.from_text(8, sketch.to_text())
+        self.assertEqual(copy.registers, sketch.registers)
+
+    def test_merge_sketch_lines(self):
+        lines = []
+        for dt_date, hosts in (('1995-07-01', 'abc'), ('1995-07-02', 'cde'),
+                               ('1995-07-03', 'xyz')):
+            sketches = ColumnSketches(['host', 'page_url'], 10)
+            for host in hosts:
+                sketches.add(None, parse_nasa_line(
+                    LINE.replace('199.72.81.55', host)))
+            lines.extend(sketches.to_lines(dt_date))
+        merged, dates = merge_sketch_lines(lines, 'host', '1995-07-01',
+                                           '1995-07-02')
+        self.assertEqual(dates, ['1995-07-01', '1995-07-02'])
+        self.assertEqual(merged.count(), 5)
+        self.assertEqual(merge_sketch_lines(lines, 'page_url', '1995-07-01',
+                                            '1995-07-03')[0].count(), 1)
+
+class BloomFilterTest(unittest.TestCase):
+
+    def test_no_false_negatives(self):
+        bloom = BloomFilter.for_capacity(1000, 0.01)
+        keys = ['key{0}'.format(x) for x in range(1000)]
+        for key in keys:
+            bloom.add(key)
+        self.assertTrue(all(x in bloom for x in keys))
+        false_positives = sum('other{0}'.format(x) in bloom
+                              for x in range(10000))
+        self.assertLess(false_positives, 300)
+
+    def test_fold_keeps_the_keys(self):
+        bloom = BloomFilter(1 << 16, 7)
+        for idx in range(500):
+            bloom.add(str(idx))
+        folded = bloom.fold(1 << 13)
+        self.assertEqual(folded.num_bits, 1 << 13)
+        self.assertTrue(all(str(x) in folded for x in range(500)))
+        self.assertRaises(ValueError, bloom.fold, 3000)
+
+    def test_text_round_trip(self):
+        bloom = BloomFilter(64, 3)
+        bloom.add('a')
+        copy = BloomFilter.from_text(64, 3, bloom.to_text())
+        self.assertIn('a', copy)
+        self.assertEqual(copy.bits, bloom.bits)
+
+    def test_host_url_bloom(self):
+        bloom = HostUrlBloom(max_keys=100000, fp_rate=0.01)
+        record = parse_nasa_line(LINE)
+        bloom.add(LINE, record)
+        bloom.add('broken', None)
+        lines = [bloom.to_line('1995-07-01')]
+        self.assertLess(int(lines[0].split('\t')[1]), bloom.bloom.num_bits)
+        self.assertEqual(bloom_candidate_dates(
+            lines, host_url_key('199.72.81.55', '/history/apollo/')),
+            ['1995-07-01'])
+        self.assertEqual(bloom_candidate_dates(
+            lines, host_url_key(host='unknown.host')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
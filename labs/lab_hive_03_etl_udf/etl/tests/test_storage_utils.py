@@ -0,0 +1,72 @@
+"""
+Tests of the typed ORC storage statements and migration state.
+"""
+
+# System imports.
+import os
+import shutil
+import tempfile
+import unittest
+
+# Libs.
+from libs.storage_utils import TYPED_COLUMNS, has_typed_columns
+from libs.storage_utils import load_migration_state, save_migration_state
+from libs.storage_utils import migrate_partition_hql, rename_table_hql
+from libs.storage_utils import typed_table_hql
+
+
+class TypedHqlTest(unittest.TestCase):
+
+    def test_typed_table(self):
+        hql = typed_table_hql('nasa_daily_typed', 'SNAPPY')
+        self.assertIn('CREATE TABLE IF NOT EXISTS nasa_daily_typed', hql)
+        self.assertIn('request_time TIMESTAMP', hql)
+        self.assertIn('STORED AS ORC', hql)
+        self.assertIn("'orc.compress' = 'SNAPPY'", hql)
+
+    def test_migrate_partition(self):
+        hql = migrate_partition_hql(
+            'nasa_daily', 'nasa_daily_typed',
+            ['host', 'request_time', 'page_url', 'error_code', 'page_size'],
+            '1995-07-01')
+        self.assertIn('INSERT OVERWRITE TABLE nasa_daily_typed', hql)
+        self.assertIn('PARTITION(dt_date = "1995-07-01")', hql)
+        self.assertIn("unix_timestamp(request_time, 'dd/MMM/yyyy:HH:mm:ss')",
+                      hql)
+        self.assertIn('CAST(page_size AS BIGINT) as page_size', hql)
+        self.assertIn('WHERE dt_date = "1995-07-01";', hql)
+
+    def test_rename_and_typed_columns(self):
+        self.assertEqual(rename_table_hql('nasa_daily', 'nasa_daily_text')
+                         .strip(),
+                         'ALTER TABLE nasa_daily RENAME TO nasa_daily_text;')
+        self.assertTrue(has_typed_columns(
+            [(x, y.lower()) for x, y in TYPED_COLUMNS]))
+        self.assertFalse(has_typed_columns(
+            [(x, 'string') for x, _ in TYPED_COLUMNS]))
+
+
+class MigrationStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.tmp_dir, 'migration',
+                                       'state.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        state = load_migration_state(self.state_file)
+        self.assertEqual(state, {'converted': [], 'legacy_renamed': False,
+                                 'swapped': False})
+        state['converted'].append('1995-07-01')
+        state['legacy_renamed'] = True
+        save_migration_state(self.state_file, state)
+        self.assertEqual(load_migration_state(self.state_file), state)
+        self.assertEqual(os.listdir(os.path.dirname(self.state_file)),
+                         ['state.json'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,78 @@
+"""
+Tests of the incrementally maintained summary tables.
+"""
+
+# System imports.
+import os
+import shutil
+import tempfile
+import unittest
+
+# Libs.
+from libs.summary_utils import HASH_PROPERTY, definition_hash
+from libs.summary_utils import load_summary_state, save_summary_state
+from libs.summary_utils import summary_backfill_hql, summary_rebuild_hql
+from libs.summary_utils import summary_update_hql
+
+VIEW = {'name': 'nasa_summary_hosts',
+        'columns': 'host STRING, requests BIGINT',
+        'query': "SELECT host, count(*) FROM nasa_daily "
+                 "WHERE dt_date = '{dt_date}' GROUP BY host"}
+
+
+class SummaryHqlTest(unittest.TestCase):
+
+    def test_definition_hash(self):
+        changed = dict(VIEW, query=VIEW['query'].replace('*', '1'))
+        self.assertEqual(definition_hash(VIEW), definition_hash(dict(VIEW)))
+        self.assertNotEqual(definition_hash(VIEW), definition_hash(changed))
+        self.assertEqual(definition_hash(dict(VIEW, name='other')),
+                         definition_hash(VIEW))
+
+    def test_update_hql(self):
+        hql = summary_update_hql(VIEW, '1995-07-02')
+        self.assertIn("TBLPROPERTIES ('{0}' = '{1}')".format(
+            HASH_PROPERTY, definition_hash(VIEW)), hql)
+        self.assertIn('PARTITION(dt_date = "1995-07-02")', hql)
+        self.assertIn("WHERE dt_date = '1995-07-02' GROUP BY host;", hql)
+        self.assertNotIn('DROP TABLE', hql)
+
+    def test_backfill_and_rebuild_hql(self):
+        dates = ['1995-07-01', '1995-07-02']
+        hql = summary_backfill_hql(VIEW, dates)
+        self.assertEqual(hql.count('CREATE TABLE IF NOT EXISTS'), 1)
+        self.assertEqual(hql.count('INSERT OVERWRITE TABLE'), 2)
+        self.assertNotIn('DROP TABLE', hql)
+        hql = summary_rebuild_hql(VIEW, dates)
+        self.assertTrue(hql.strip().startswith(
+            'DROP TABLE IF EXISTS nasa_summary_hosts;'))
+        self.assertEqual(hql.count('INSERT OVERWRITE TABLE'), 2)
+
+
+class SummaryStateTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.state_file = os.path.join(self.tmp_dir, 'summaries',
+                                       'state.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_round_trip(self):
+        self.assertEqual(load_summary_state(self.state_file), {})
+        save_summary_state(self.state_file, {'nasa_summary_hosts': 'abc'})
+        self.assertEqual(load_summary_state(self.state_file),
+                         {'nasa_summary_hosts': 'abc'})
+        self.assertEqual(os.listdir(os.path.dirname(self.state_file)),
+                         ['state.json'])
+
+    def test_unreadable_state_is_empty(self):
+        save_summary_state(self.state_file, {})
+        with open(self.state_file, 'w') as handle:
+            handle.write('{"nasa_summ')
+        self.assertEqual(load_summary_state(self.state_file), {})
+
+
+if __name__ == '__main__':
+    unittest.main()
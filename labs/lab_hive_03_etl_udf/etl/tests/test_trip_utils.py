@@ -0,0 +1,89 @@
+"""
+Tests of the trip csv re-encoding.
+"""
+
+# System imports.
+import os
+import shutil
+import tempfile
+import unittest
+
+# Libs.
+from libs.nasa_utils import HIVE_NULL
+from libs.trip_utils import escape_value, reencode_trip_file
+from libs.trip_utils import trip_table_ddl
+
+CRLF_ESCAPES = {'r': '\r', 'n': '\n'}
+
+
+def split_serde_fields(line):
+    """Returns the fields of a line as LazySimpleSerDe reads them with
+    ESCAPED BY '\\' and 'serialization.escape.crlf' = 'true'."""
+    fields, raw, current, idx = [], [], [], 0
+    while idx < len(line):
+        char = line[idx]
+        if char == '\\' and idx + 1 < len(line):
+            raw.append(line[idx:idx + 2])
+            current.append(CRLF_ESCAPES.get(line[idx + 1], line[idx + 1]))
+            idx += 2
+            continue
+        if char == '\t':
+            # The null marker is compared before unescaping.
+            fields.append(None if ''.join(raw) == HIVE_NULL
+                          else ''.join(current))
+            raw, current = [], []
+        else:
+            raw.append(char)
+            current.append(char)
+        idx += 1
+    fields.append(None if ''.join(raw) == HIVE_NULL else ''.join(current))
+    return fields
+
+
+class EscapeTest(unittest.TestCase):
+
+    def test_round_trip(self):
+        for value in ['plain', 'a\tb', 'a\\tb', 'back\\', 'x\ny', 'x\r\ny',
+                      '\\N', '', '\t\\\t']:
+            line = '\t'.join([escape_value(value), escape_value(None)])
+            self.assertNotIn('\n', line)
+            self.assertEqual(split_serde_fields(line), [value, None])
+
+    def test_ddl_decodes_crlf(self):
+        ddl = trip_table_ddl('trips', '/data/trips')
+        self.assertIn("ESCAPED BY '\\\\'", ddl)
+        self.assertIn("'serialization.escape.crlf' = 'true'", ddl)
+
+
+class ReencodeTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_quoted_fields(self):
+        input_file = os.path.join(self.tmp_dir, 'trips.csv')
+        output_file = os.path.join(self.tmp_dir, 'trips.tsv')
+        with open(input_file, 'w') as handle:
+            handle.write(
+                'Duration,Start date,End date,Start station number,'
+                'Start station,End station number,End station,'
+                'Bike number,Member type\n'
+                '300,2017-01-01 00:00:41,2017-01-01 00:05:41,31000,'
+                '"Eads St\tand\n15th St",31001,"Back\\slash",W01,Member\n')
+        _, rows, rejected = reencode_trip_file((input_file, output_file))
+        self.assertEqual((rows, rejected), (1, 1))
+        with open(output_file) as handle:
+            lines = handle.read().split('\n')
+        self.assertEqual(lines[1:], [''])
+        fields = split_serde_fields(lines[0])
+        self.assertEqual(fields[4], 'Eads St\tand\n15th St')
+        self.assertEqual(fields[6], 'Back\\slash')
+        self.assertEqual(fields[9:], ['1483228841', '1483229141', '0',
+                                      '2017-01-01'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,84 @@
+"""
+Tests of the input size aware session tuning.
+"""
+
+# System imports.
+import unittest
+
+# Libs.
+from libs.tuning_utils import DEFAULT_OUTPUT_CODEC, MB, select_tier
+from libs.tuning_utils import compute_tuning_settings, settings_to_hql
+
+RULES = {
+    'target_maps': 40,
+    'min_split_mb': 32,
+    'max_split_mb': 512,
+    'target_reducers': 20,
+    'min_bytes_per_reducer_mb': 64,
+    'max_bytes_per_reducer_mb': 1024,
+    'output_codec': 'org.apache.hadoop.io.compress.BZip2Codec',
+    'tiers': [
+        {'max_input_mb': 1024, 'map_memory_mb': 1024,
+         'reduce_memory_mb': 2048, 'compress_output': False},
+        {'max_input_mb': 0, 'map_memory_mb': 2048,
+         'reduce_memory_mb': 4096, 'compress_output': True},
+    ],
+}
+
+
+class TuningTest(unittest.TestCase):
+
+    def test_small_input_is_clamped_to_the_minimum(self):
+        settings = dict(compute_tuning_settings(10 * MB, RULES))
+        self.assertEqual(
+            settings['mapreduce.input.fileinputformat.split.minsize'],
+            32 * MB)
+        self.assertEqual(
+            settings['mapreduce.input.fileinputformat.split.maxsize'],
+            32 * MB)
+        self.assertEqual(settings['hive.exec.reducers.bytes.per.reducer'],
+                         64 * MB)
+        self.assertEqual(settings['mapreduce.map.memory.mb'], 1024)
+        self.assertEqual(settings['mapreduce.reduce.java.opts'], '-Xmx1638m')
+        self.assertEqual(settings['hive.exec.compress.output'], 'false')
+        self.assertNotIn('mapreduce.output.fileoutputformat.compress.codec',
+                         settings)
+
+    def test_large_input(self):
+        settings = dict(compute_tuning_settings(8000 * MB, RULES))
+        self.assertEqual(
+            settings['mapreduce.input.fileinputformat.split.minsize'],
+            200 * MB)
+        self.assertEqual(settings['hive.exec.reducers.bytes.per.reducer'],
+                         400 * MB)
+        self.assertEqual(settings['mapreduce.map.memory.mb'], 2048)
+        self.assertEqual(settings['hive.exec.compress.output'], 'true')
+        self.assertEqual(
+            settings['mapreduce.output.fileoutputformat.compress.codec'],
+            RULES['output_codec'])
+        rules = dict(RULES)
+        del rules['output_codec']
+        settings = dict(compute_tuning_settings(10 ** 6 * MB, rules))
+        self.assertEqual(
+            settings['mapreduce.output.fileoutputformat.compress.codec'],
+            DEFAULT_OUTPUT_CODEC)
+        self.assertEqual(
+            settings['mapreduce.input.fileinputformat.split.maxsize'],
+            512 * MB)
+
+    def test_select_tier(self):
+        self.assertIs(select_tier(1024 * MB, RULES['tiers']),
+                      RULES['tiers'][0])
+        self.assertIs(select_tier(1024 * MB + 1, RULES['tiers']),
+                      RULES['tiers'][1])
+        self.assertIs(select_tier(MB, RULES['tiers'][1:]),
+                      RULES['tiers'][1])
+        self.assertEqual(select_tier(MB, []), {})
+
+    def test_settings_to_hql(self):
+        self.assertEqual(settings_to_hql([('a.b', 1), ('c', 'true')]),
+                         ['SET a.b=1;', 'SET c=true;'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,115 @@
+"""
+Tests of the pooled WebHDFS client against the local stand-in server.
+"""
+
+# System imports.
+import os
+import shutil
+import socket
+import sys
+import tempfile
+import threading
+import unittest
+
+# Libs.
+from libs.cli_utils import EXIT_CODE_FAILURE, EXIT_CODE_SUCCESS
+from libs.webhdfs_utils import WebHdfsClient, permission_string
+
+BENCH_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'bench')
+if BENCH_DIR not in sys.path:
+    sys.path.insert(0, BENCH_DIR)
+
+# pylint: disable=wrong-import-position
+from webhdfs_server import WebHdfsHandler, WebHdfsServer
+
+
+class NoRedirectHandler(WebHdfsHandler):
+    """Answers CREATE like a proxy swallowing the datanode redirect."""
+
+    def do_PUT(self):
+        self._read_body()
+        self._send(200)
+
+
+class RecordingClient(object):
+    """CLI client stand-in recording the fallback calls."""
+
+    def __init__(self):
+        self.calls = []
+
+    def ls(self, path):
+        self.calls.append(('ls', path))
+        return ['listed'], EXIT_CODE_SUCCESS
+
+
+class WebHdfsClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.root_dir = os.path.join(self.tmp_dir, 'hdfs')
+        os.makedirs(self.root_dir)
+        self.server = WebHdfsServer(self.root_dir, 0)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       args=(0.05,))
+        self.thread.daemon = True
+        self.thread.start()
+        self.client = WebHdfsClient('http://127.0.0.1:{0}'.format(
+            self.server.server_address[1]), 'hdfs')
+        self.local_file = os.path.join(self.tmp_dir, 'nasa_0701')
+        with open(self.local_file, 'w') as handle:
+            handle.write('line 1\nline 2\n')
+
+    def tearDown(self):
+        self.client.close()
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_put_and_ls(self):
+        _, code = self.client.mkdirs(['/data/temp_nasa/0701'])
+        self.assertEqual(code, EXIT_CODE_SUCCESS)
+        self.assertEqual(self.client.ls('/data/temp_nasa/0701'),
+                         ([], EXIT_CODE_SUCCESS))
+        _, code = self.client.put([self.local_file], '/data/temp_nasa/0701')
+        self.assertEqual(code, EXIT_CODE_SUCCESS)
+        with open(os.path.join(self.root_dir, 'data', 'temp_nasa', '0701',
+                               'nasa_0701')) as handle:
+            self.assertEqual(handle.read(), 'line 1\nline 2\n')
+        # The put invalidated the cached listing.
+        lines, _ = self.client.ls('/data/temp_nasa/0701')
+        self.assertEqual(len(lines), 1)
+        self.assertTrue(lines[0].startswith('-rw-r--r--'))
+        self.assertTrue(lines[0].endswith(' /data/temp_nasa/0701/nasa_0701'))
+        requests = self.client.requests
+        self.client.ls('/data/temp_nasa/0701')
+        self.assertEqual(self.client.requests, requests)
+
+    def test_put_fails_without_redirect(self):
+        self.server.RequestHandlerClass = NoRedirectHandler
+        _, code = self.client.put([self.local_file], '/data')
+        self.assertEqual(code, EXIT_CODE_FAILURE)
+
+    def test_put_fails_on_missing_local_file(self):
+        _, code = self.client.put([self.local_file + '.gz'], '/data')
+        self.assertEqual(code, EXIT_CODE_FAILURE)
+
+    def test_unreachable_falls_back_to_the_cli(self):
+        probe = socket.socket()
+        probe.bind(('127.0.0.1', 0))
+        port = probe.getsockname()[1]
+        probe.close()
+        fallback = RecordingClient()
+        client = WebHdfsClient('http://127.0.0.1:{0}'.format(port),
+                               fallback=fallback)
+        self.assertEqual(client.ls('/data'), (['listed'], EXIT_CODE_SUCCESS))
+        client.ls('/other')
+        self.assertEqual(fallback.calls, [('ls', '/data'), ('ls', '/other')])
+
+    def test_permission_string(self):
+        self.assertEqual(permission_string('755'), 'rwxr-xr-x')
+        self.assertEqual(permission_string('640'), 'rw-r-----')
+
+
+if __name__ == '__main__':
+    unittest.main()
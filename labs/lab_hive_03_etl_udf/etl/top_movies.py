@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+"""
+Top Movies - Incremental top-N movie rankings over appended ratings.
+Version : {version}
+
+Description:
+    Keeps the number of ratings and the rating sum per movie in a local
+    snapshot. New rating batches, and lines appended to the batches
+    already added, are folded into the snapshot instead of rescanning all
+    the ratings, and the rankings are computed with a bounded heap.
+    Results match the lab_hive_01 queries:
+
+      count(*) AS number_of_ratings, round(avg(rating), 4) AS avg_rating
+      ... GROUP BY movie_id ORDER BY <ranking> DESC LIMIT N
+
+
+Usage:
+  top_movies.py init --state=F --ratings=R [--movies=M]
+  top_movies.py add --state=F BATCH...
+  top_movies.py top --state=F [--by=BY] [--num=N] [--min_ratings=N] [--titles]
+
+
+Options:
+  -h --help                Shows this help.
+  --state=F                Snapshot file of the running aggregates.
+  --ratings=R              Initial ratings file (ratings.csv layout).
+  --movies=M               Movies file used for the titles.
+  --by=BY                  Ranking: count (most rated) or avg [default: count].
+  --num=N                  Number of movies [default: 10].
+  --min_ratings=N          Only rank movies with N ratings [default: 1].
+  --titles                 Show titles instead of movie ids.
+
+Examples:
+
+  python top_movies.py init --state=/tmp/movies.json --ratings=../../lab_hive_01_hive/data/data_movies/ratings.csv --movies=../../lab_hive_01_hive/data/data_movies/movies.csv
+
+  python top_movies.py add --state=/tmp/movies.json /tmp/ratings_batch_01.csv
+
+  python top_movies.py top --state=/tmp/movies.json --by=avg --min_ratings=50 --num=20 --titles
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+from libs.cli_utils import EXIT_CODE_FAILURE, EXIT_CODE_SUCCESS
+from libs.cli_utils import docopt_parse, write_info, write_plain, write_error
+from libs.movie_utils import MovieRatings, RANKINGS, read_movie_titles
+
+PROG_VERSION = '1.0.0'
+
+
+def init_state(arguments):
+    """Builds the snapshot from the initial ratings file."""
+    ratings = MovieRatings()
+    if arguments['--movies']:
+        ratings.titles = read_movie_titles(arguments['--movies'])
+    start = time.time()
+    added = ratings.add_file(arguments['--ratings'])
+    ratings.save(arguments['--state'])
+    write_info('Loaded {0} ratings of {1} movies in {2:.2f}s'.format(
+        added, len(ratings.counts), time.time() - start))
+    return EXIT_CODE_SUCCESS
+
+
+def add_batches(arguments):
+    """Folds the new rating batches into the snapshot."""
+    ratings = MovieRatings.load(arguments['--state'])
+    for file_name in arguments['BATCH']:
+        try:
+            added = ratings.add_file(file_name)
+        except ValueError as error:
+            write_error('{0}, run init again'.format(error))
+            return EXIT_CODE_FAILURE
+        if added is None:
+            write_info('{0} has no new lines, skipping'.format(file_name))
+        else:
+            write_info('{0}: {1} ratings added'.format(file_name, added))
+    ratings.save(arguments['--state'])
+    return EXIT_CODE_SUCCESS
+
+
+def show_top(arguments):
+    """Prints the ranking like the Hive query output."""
+    ranking = arguments['--by']
+    if ranking not in RANKINGS:
+        write_error('--by must be one of {0}'.format(', '.join(RANKINGS)))
+        return EXIT_CODE_FAILURE
+    ratings = MovieRatings.load(arguments['--state'])
+    for movie_id, title, count, avg in ratings.top(
+            int(arguments['--num']), ranking,
+            int(arguments['--min_ratings'])):
+        if arguments['--titles']:
+            write_plain('{0}\t{1}\t{2}\n'.format(title, count, avg))
+        else:
+            write_plain('{0}\t{1}\t{2}\n'.format(movie_id, count, avg))
+    return EXIT_CODE_SUCCESS
+
+
+def main():
+    """Dispatches the commands."""
+    _, arguments = docopt_parse(__doc__, PROG_VERSION)
+    for key in ('--ratings', '--movies'):
+        if arguments[key] and not os.path.exists(arguments[key]):
+            write_error('File not found: {0}'.format(arguments[key]))
+            return EXIT_CODE_FAILURE
+    if not arguments['init'] and not os.path.exists(arguments['--state']):
+        write_error('No snapshot {0}, run init first'.format(
+            arguments['--state']))
+        return EXIT_CODE_FAILURE
+    if arguments['init']:
+        return init_state(arguments)
+    if arguments['add']:
+        missing = [x for x in arguments['BATCH'] if not os.path.exists(x)]
+        if missing:
+            write_error('File not found: {0}'.format(', '.join(missing)))
+            return EXIT_CODE_FAILURE
+        return add_batches(arguments)
+    return show_top(arguments)
+
+
+if __name__ == '__main__':
+    sys.exit(main())